@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+
+# Admission control for the scoring endpoints.
+#
+# Under overload, accepting every request only makes every request late: the
+# backlog grows until clients time out, and the server keeps doing work for
+# requests nobody is waiting for any more. Rejecting early and cheaply keeps
+# the latency of the requests that are admitted flat.
+#
+# - AdmissionController bounds the requests scoring at once in a process and
+#   those waiting for a slot. A request that finds the queue full is rejected
+#   at once with 429. One that waits longer than queue_timeout gets 503.
+# - A request's age is taken from X-Request-Start when a router or proxy in
+#   front sets it (Heroku's router does, and nginx can). That measures the time
+#   spent queued before the worker saw the request, which is the only queue a
+#   gunicorn sync worker has. A request that has already waited longer than
+#   max_queue_seconds there is rejected with 503 before any work is done.
+# - A Deadline is the request's time budget counted from that arrival time.
+#   It is checked between pipeline stages, so a late request stops before the
+#   next stage instead of finishing work nobody will read.
+#
+# AdmissionMiddleware applies the first two as WSGI middleware, ahead of the
+# web framework: a rejection there costs a fraction of a scored request, which
+# is what lets a saturated worker shed load faster than it arrives.
+
+DEADLINE_KEY = 'spam_detector.deadline'
+
+
+class Rejected(Exception):
+    # A request turned away; rendered as a JSON error with Retry-After
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class Deadline:
+    def __init__(self, expires):
+        # A time.perf_counter() value
+        self.expires = expires
+
+    def remaining(self):
+        return self.expires - time.perf_counter()
+
+    def expired(self):
+        return time.perf_counter() >= self.expires
+
+    def check(self, stage):
+        if time.perf_counter() >= self.expires:
+            raise Rejected(503, 'deadline', f'Request deadline exceeded before {stage}')
+
+
+def parse_request_start(value):
+    # X-Request-Start as epoch seconds, milliseconds (Heroku) or microseconds,
+    # optionally prefixed with "t=" (nginx); None if missing or malformed
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        return started / 1e6
+    if started > 1e11:
+        return started / 1e3
+    return started
+
+
+def request_deadline(request_start, deadline_seconds=0, max_queue_seconds=0):
+    # The Deadline of a request arriving now (None without a budget). Raises
+    # Rejected if X-Request-Start shows it already waited too long upstream.
+    started = parse_request_start(request_start)
+    waited = max(0.0, time.time() - started) if started is not None else 0.0
+    if max_queue_seconds and waited > max_queue_seconds:
+        raise Rejected(503, 'stale', f'Request waited {waited * 1000:.0f}ms in the queue')
+    if deadline_seconds:
+        return Deadline(time.perf_counter() + deadline_seconds - waited)
+    return None
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=0, max_queue=0, queue_timeout=1.0):
+        # max_concurrent=0 admits everything; max_queue is how many requests
+        # may wait for a slot beyond that
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline=None):
+        if not self.max_concurrent:
+            return
+        with self._condition:
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Rejected(429, 'queue_full', 'Too many requests in progress')
+            timeout = self.queue_timeout
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline.remaining()))
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self.active < self.max_concurrent, timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                raise Rejected(503, 'queue_timeout', 'Timed out waiting for a free slot')
+            self.active += 1
+            self.admitted += 1
+
+    def release(self):
+        if not self.max_concurrent:
+            return
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller, endpoints, deadline_seconds=0, max_queue_seconds=0, on_reject=None):
+        # endpoints maps the PATH_INFO of each admitted endpoint to its name;
+        # on_reject(name, Rejected) is called for each rejection
+        self.app = app
+        self.controller = controller
+        self.endpoints = endpoints
+        self.deadline_seconds = deadline_seconds
+        self.max_queue_seconds = max_queue_seconds
+        self.on_reject = on_reject
+
+    def __call__(self, environ, start_response):
+        endpoint = self.endpoints.get(environ.get('PATH_INFO'))
+        if endpoint is None or environ.get('REQUEST_METHOD') != 'POST':
+            return self.app(environ, start_response)
+        try:
+            deadline = request_deadline(environ.get('HTTP_X_REQUEST_START'), self.deadline_seconds,
+                                        self.max_queue_seconds)
+            self.controller.acquire(deadline)
+        except Rejected as e:
+            if self.on_reject is not None:
+                self.on_reject(endpoint, e)
+            body = json.dumps({'error': str(e)}).encode()
+            start_response(f"{e.status} {'Too Many Requests' if e.status == 429 else 'Service Unavailable'}",
+                           [('Content-Type', 'application/json'), ('Content-Length', str(len(body))),
+                            ('Retry-After', '1')])
+            return [body]
+        environ[DEADLINE_KEY] = deadline
+        try:
+            # Flask builds the whole response here
+            return self.app(environ, start_response)
+        finally:
+            self.controller.release()
@@ -1,695 +1,695 @@
-from flask import Flask, request, jsonify, send_from_directory
-import pickle
-import re
-import nltk
-from nltk.corpus import stopwords
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
 import os
+import tempfile
+import time
+from admission import DEADLINE_KEY, AdmissionController, AdmissionMiddleware, Rejected
+from cache import cache_key, create_cache
+from campaigns import CampaignIndex
+import codec
+from feedback import DEFAULT_MAX_BYTES, FeedbackLearner, JournalFull
+from indicators import ModelIndicators, find_spam_indicators
+from metrics import SIZE_BUCKETS, Metrics
+from parallel import ProcessPoolScorer
+from preprocessing import tokenize
+from profiling import Profiler, positive_number
+from registry import (COMPILED_MODEL_FILE, ModelRegistry, ModelVersion, load_canary, load_engine, make_engine,
+                      model_version)
+from requestlog import RequestLogger
+from scoring import ScoringEngine
+from warmup import SAMPLE_MESSAGES, Warmup, load_samples
 
 
-# Download necessary NLTK data
-try:
-    nltk.download('stopwords', quiet=True)
-except:
-    pass
-
 app = Flask(__name__, static_folder='static')
 
-# Define stopwords set
-STOP_WORDS = set(stopwords.words('english'))
+# Scoring mode: "sklearn" runs the pickled vectorizer and model, "compiled"
+# scores against a precomputed token-weight table built from them, "mapped"
+# scores against memory-mapped artifacts (see artifacts.py) without loading
+# the pickles at all
+SCORING_MODE = os.environ.get('SCORING_MODE', 'sklearn')
+
+# Directory holding the model files: nb_model.pkl and tfidf_vectorizer.pkl
+# (plus an optional compiled_model.npz), or the mapped artifacts
+MODEL_DIR = os.environ.get('MODEL_DIR', '.')
+MODEL_ARTIFACT_DIR = os.environ.get('MODEL_ARTIFACT_DIR', 'model_artifacts')
+MODEL_SOURCE = MODEL_ARTIFACT_DIR if SCORING_MODE == 'mapped' else MODEL_DIR
+if SCORING_MODE == 'mapped':
+    MODEL_FILES = ['meta.json', 'idf.npy', 'log_prob.npy', 'class_log_prior.npy', 'vocab_hashes.npy', 'vocab_rows.npy']
+else:
+    MODEL_FILES = ['nb_model.pkl', 'tfidf_vectorizer.pkl']
+# Hashed into the version and watched when present
+OPTIONAL_MODEL_FILES = [COMPILED_MODEL_FILE] if SCORING_MODE == 'compiled' else []
+
+# Poll the model files every MODEL_WATCH_INTERVAL seconds and hot-swap the
+# model when they change (0 disables). Admin endpoints need ADMIN_TOKEN.
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '0'))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# PROFILING_ENABLED=1 adds the /admin/profile endpoints (stack sampling and
+# cProfile of the next requests), writing results to PROFILE_DIR
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'spam-profiles'))
+
+# Indicator mode: "words" reports matches from a fixed list of spam words,
+# "model" reports the INDICATOR_TOP_K tokens that contributed most to the score
+INDICATOR_MODE = os.environ.get('INDICATOR_MODE', 'words')
+INDICATOR_TOP_K = int(os.environ.get('INDICATOR_TOP_K', '5'))
+
+# Score batches of at least SCORING_PARALLEL_MIN_BATCH messages across
+# SCORING_WORKERS forked processes per worker (0 or 1 disables it)
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', '0'))
+SCORING_PARALLEL_MIN_BATCH = int(os.environ.get('SCORING_PARALLEL_MIN_BATCH', '256'))
+
+# /feedback appends labelled corrections to the FEEDBACK_PATH journal, and each
+# worker applies them to its model every FEEDBACK_INTERVAL seconds (see
+# feedback.py). FEEDBACK_TOKEN, when set, is required in X-Feedback-Token.
+FEEDBACK_PATH = os.environ.get('FEEDBACK_PATH')
+FEEDBACK_TOKEN = os.environ.get('FEEDBACK_TOKEN')
+FEEDBACK_INTERVAL = float(os.environ.get('FEEDBACK_INTERVAL', '30'))
+FEEDBACK_BATCH_SIZE = int(os.environ.get('FEEDBACK_BATCH_SIZE', '1000'))
+FEEDBACK_WEIGHT = float(os.environ.get('FEEDBACK_WEIGHT', '1'))
+FEEDBACK_UPDATE_PRIOR = os.environ.get('FEEDBACK_UPDATE_PRIOR', '0') == '1'
+FEEDBACK_MAX_BYTES = int(os.environ.get('FEEDBACK_MAX_BYTES', str(DEFAULT_MAX_BYTES)))
+
+# Wrap a scoring engine with the parallel scorer and indicator finder
+def build_model_version(version, source, engine, vectorizer, model):
+    if SCORING_WORKERS > 1:
+        engine = ProcessPoolScorer(engine, SCORING_WORKERS, SCORING_PARALLEL_MIN_BATCH)
+    if INDICATOR_MODE == 'model' and model is None:
+        find_indicators = ModelIndicators.from_scorer(engine, INDICATOR_TOP_K).find
+    elif INDICATOR_MODE == 'model':
+        find_indicators = ModelIndicators.from_sklearn(vectorizer, model, INDICATOR_TOP_K).find
+    else:
+        find_indicators = find_spam_indicators
+    return ModelVersion(version, source, engine, find_indicators, vectorizer=vectorizer, model=model)
+
+# Load the model and vectorizer from a model directory
+def load_model(directory):
+    engine, vectorizer, model = load_engine(SCORING_MODE, directory)
+    version = model_version(directory, MODEL_FILES, OPTIONAL_MODEL_FILES)
+    return build_model_version(version, directory, engine, vectorizer, model)
+
+# A model updated from feedback, scored the same way as loaded ones
+def build_feedback_model(version, vectorizer, model):
+    return build_model_version(version, 'feedback', make_engine(SCORING_MODE, vectorizer, model), vectorizer, model)
+
+# Maximum number of messages accepted by a single /predict/batch call
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '1000'))
+
+# Longest message scored, in characters (0 for no limit), checked before it is
+# preprocessed: /predict answers longer ones with 413, /predict/batch with an
+# error result. MAX_REQUEST_BYTES caps the request body before it is parsed.
+MAX_MESSAGE_LENGTH = int(os.environ.get('MAX_MESSAGE_LENGTH', '10000'))
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', '0'))
+if MAX_REQUEST_BYTES:
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Include each scored message in its result (RESPONSE_ECHO_MESSAGE=0 leaves
+# it out); a request's ?echo=0 or ?echo=1 overrides this
+RESPONSE_ECHO_MESSAGE = os.environ.get('RESPONSE_ECHO_MESSAGE', '1') != '0'
+
+# Admission control for /predict and /predict/batch (see admission.py). At most
+# ADMISSION_MAX_CONCURRENT requests score at once per process (0 for no limit;
+# it matters with threaded workers), ADMISSION_MAX_QUEUE more wait up to
+# ADMISSION_QUEUE_TIMEOUT_MS for a slot (then 503), and the rest get 429.
+# Requests that waited over ADMISSION_MAX_QUEUE_MS before reaching the worker,
+# according to X-Request-Start, and those still running REQUEST_DEADLINE_MS
+# after it get 503 (0 disables either).
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '0'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '0'))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', '1000'))
+ADMISSION_MAX_QUEUE_MS = float(os.environ.get('ADMISSION_MAX_QUEUE_MS', '0'))
+REQUEST_DEADLINE_MS = float(os.environ.get('REQUEST_DEADLINE_MS', '0'))
+admission = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_MS / 1000)
+
+# Cache of prediction results keyed on the preprocessed message text
+# (PREDICTION_CACHE_SIZE=0 disables it, PREDICTION_CACHE_TTL is in seconds).
+# The "memory" backend is per process; "shared" (mmap'd table) and "redis"
+# are shared by all gunicorn workers.
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '10000'))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '0')) or None
+PREDICTION_CACHE_BACKEND = os.environ.get('PREDICTION_CACHE_BACKEND', 'memory')
+if PREDICTION_CACHE_SIZE > 0:
+    cache = create_cache(PREDICTION_CACHE_BACKEND, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL,
+                         path=os.environ.get('PREDICTION_CACHE_PATH'),
+                         redis_url=os.environ.get('REDIS_URL'))
+else:
+    cache = None
+
+# Near-duplicate campaign tracking over the messages of the last
+# CAMPAIGN_WINDOW seconds (at most CAMPAIGN_MAX_MESSAGES of them, per process).
+# Responses for messages that joined a campaign carry its id and size; with
+# CAMPAIGN_REUSE_VERDICT=1, later members reuse the verdict of one already
+# scored by the same model instead of being scored again.
+CAMPAIGN_INDEX = os.environ.get('CAMPAIGN_INDEX', '0') == '1'
+CAMPAIGN_REUSE_VERDICT = os.environ.get('CAMPAIGN_REUSE_VERDICT', '0') == '1'
+if CAMPAIGN_INDEX:
+    campaign_index = CampaignIndex(threshold=float(os.environ.get('CAMPAIGN_THRESHOLD', '0.5')),
+                                   window=float(os.environ.get('CAMPAIGN_WINDOW', '3600')),
+                                   max_messages=int(os.environ.get('CAMPAIGN_MAX_MESSAGES', '100000')))
+else:
+    campaign_index = None
 
-# Define preprocessing function
-def preprocess_text(text):
-    text = text.lower()
-    text = re.sub(r'[^a-z\s]', '', text)  # Remove special characters, numbers
-    text = re.sub(r'\s+', ' ', text).strip()  # Remove extra spaces
-    tokens = [w for w in text.split() if w not in STOP_WORDS]
-    return " ".join(tokens)
+# Log every scored message and its verdict as JSON lines to REQUEST_LOG_PATH
+# ("{pid}" becomes the worker's pid; required unless rotation is off), written
+# in the background (see requestlog.py). REQUEST_LOG_POLICY=block makes
+# requests wait for the writer instead of dropping records when its queue is
+# full.
+REQUEST_LOG_PATH = os.environ.get('REQUEST_LOG_PATH')
+if REQUEST_LOG_PATH:
+    request_log = RequestLogger(REQUEST_LOG_PATH,
+                                max_queue=int(os.environ.get('REQUEST_LOG_QUEUE', '10000')),
+                                policy=os.environ.get('REQUEST_LOG_POLICY', 'drop'),
+                                max_bytes=int(os.environ.get('REQUEST_LOG_MAX_BYTES', str(100 * 1024 * 1024))),
+                                rotate_seconds=float(os.environ.get('REQUEST_LOG_ROTATE_SECONDS', '0')),
+                                compress=os.environ.get('REQUEST_LOG_COMPRESS', '0') == '1',
+                                backups=int(os.environ.get('REQUEST_LOG_BACKUPS', '10')),
+                                fsync=os.environ.get('REQUEST_LOG_FSYNC', '0') == '1')
+else:
+    request_log = None
 
-# Load the model and vectorizer
+# Per-stage timings and request, error and cache counters, served at /metrics
+# in the Prometheus text format. METRICS_ENABLED=0 turns the hooks into no-ops.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+metrics = Metrics(METRICS_ENABLED)
+REQUESTS = metrics.counter('spam_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'status'))
+REQUEST_SECONDS = metrics.histogram('spam_request_duration_seconds', 'Request latency by endpoint', ('endpoint',))
+ERRORS = metrics.counter('spam_errors_total', 'Error results, including those returned with HTTP 200, by endpoint and reason',
+                         ('endpoint', 'reason'))
+STAGE_SECONDS = metrics.histogram('spam_stage_duration_seconds', 'Time spent in each prediction stage', ('stage',))
+BATCH_SIZE = metrics.histogram('spam_batch_size', 'Messages per /predict/batch request', buckets=SIZE_BUCKETS)
+REJECTIONS = metrics.counter('spam_admission_rejections_total', 'Requests rejected by admission control by endpoint and reason',
+                             ('endpoint', 'reason'))
+CACHE_LOOKUPS = metrics.counter('spam_cache_lookups_total', 'Prediction cache lookups by result', ('result',))
+metrics.gauge('spam_cache_hit_ratio', 'Prediction cache hit ratio since startup',
+              func=lambda: cache.stats()['hit_rate'] if cache is not None else None)
+metrics.gauge('spam_cache_entries', 'Entries in the prediction cache',
+              func=lambda: cache.stats().get('size') if cache is not None else None)
+metrics.gauge('spam_request_log_records_total', 'Request log records by outcome', ('result',),
+              func=lambda: {('written',): request_log.written, ('dropped',): request_log.dropped}
+              if request_log is not None else None, type='counter')
+metrics.gauge('spam_request_log_queue', 'Request log records waiting to be written',
+              func=lambda: request_log.queue.qsize() if request_log is not None and request_log.queue else None)
+metrics.gauge('spam_admission_active', 'Requests holding an admission slot', func=lambda: admission.active)
+metrics.gauge('spam_admission_waiting', 'Requests waiting for an admission slot', func=lambda: admission.waiting)
+metrics.gauge('spam_campaigns_active', 'Campaigns with messages in the campaign window',
+              func=lambda: len(campaign_index.campaigns) if campaign_index is not None else None)
+metrics.gauge('spam_warmup_seconds', 'Time taken to warm this worker up',
+              func=lambda: warmup.seconds)
+metrics.gauge('spam_model_load_seconds', 'Time taken to load the active model', ('version',),
+              func=lambda: {(registry.current.version,): registry.current.load_seconds} if registry.current else None)
+
+# Per-process caches are dropped when the model changes; shared ones rely on
+# cache keys that include the model version
+def on_model_swap(version):
+    if cache is not None and PREDICTION_CACHE_BACKEND == 'memory':
+        cache.invalidate()
+    # Stop the previous model's scoring processes once batches already using
+    # them finish; a rollback restarts them
+    if registry.previous is not None and hasattr(registry.previous.engine, 'close'):
+        registry.previous.engine.close()
+
+# Each worker warms its model up before it takes traffic (see warmup.py):
+# WARMUP_ROUNDS passes (default 3, 0 disables it) over built-in sample
+# messages, or the {"message": ...} lines of WARMUP_PATH. Reloaded models are
+# warmed up before they are activated. /readyz answers 503 until it is done.
+WARMUP_ROUNDS = int(os.environ.get('WARMUP_ROUNDS', '3'))
+warmup = Warmup(load_samples(os.environ['WARMUP_PATH']) if os.environ.get('WARMUP_PATH') else SAMPLE_MESSAGES,
+                WARMUP_ROUNDS)
+
+canary = load_canary(os.environ['MODEL_CANARY_PATH']) if os.environ.get('MODEL_CANARY_PATH') else None
+registry = ModelRegistry(load_model, canary=canary, on_swap=on_model_swap,
+                         warm=warmup.warm if WARMUP_ROUNDS else None)
 try:
-    model = pickle.load(open('nb_model.pkl', 'rb'))
-    vectorizer = pickle.load(open('tfidf_vectorizer.pkl', 'rb'))
-    model_loaded = True
+    registry.activate(registry.load(MODEL_SOURCE, check=False))
 except Exception as e:
     print(f"Error loading model: {e}")
-    model_loaded = False
-
-# Create static directory if it doesn't exist
-os.makedirs('static', exist_ok=True)
-
-# Write the HTML file to match the design in the image
-with open('static/index.html', 'w') as f:
-    f.write("""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Spam Detector</title>
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-    <style>
-        :root {
-            --primary-color: #5C5FEF;
-            --secondary-color: #6c757d;
-            --success-color: #28a745;
-            --danger-color: #dc3545;
-            --warning-color: #ffc107;
-            --light-color: #f8f9fa;
-            --dark-color: #343a40;
-            --card-bg: #ffffff;
-            --main-bg: #5C5FEF;
-            --border-radius: 12px;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        }
-        
-        body {
-            background-color: var(--main-bg);
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            min-height: 100vh;
-            padding: 20px;
-        }
-        
-        .card {
-            background-color: var(--card-bg);
-            width: 100%;
-            max-width: 600px;
-            border-radius: var(--border-radius);
-            padding: 30px;
-            box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-        }
-        
-        .header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 20px;
-        }
-        
-        .logo {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        
-        .shield-icon {
-            color: var(--primary-color);
-            font-size: 24px;
-        }
-        
-        h1 {
-            color: #333;
-            font-size: 28px;
-            font-weight: 600;
-        }
-        
-        .theme-toggle {
-            position: relative;
-            width: 50px;
-            height: 24px;
-        }
-        
-        .theme-toggle input {
-            opacity: 0;
-            width: 0;
-            height: 0;
-        }
-        
-        .slider {
-            position: absolute;
-            cursor: pointer;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background-color: #ccc;
-            transition: .4s;
-            border-radius: 24px;
-        }
-        
-        .slider:before {
-            position: absolute;
-            content: "";
-            height: 18px;
-            width: 18px;
-            left: 3px;
-            bottom: 3px;
-            background-color: white;
-            transition: .4s;
-            border-radius: 50%;
-        }
-        
-        input:checked + .slider {
-            background-color: #333;
-        }
-        
-        input:checked + .slider:before {
-            transform: translateX(26px);
-        }
-        
-        .subtitle {
-            text-align: center;
-            color: #666;
-            margin-bottom: 30px;
-            font-size: 16px;
-        }
-        
-        .subtitle::after {
-            content: '';
-            display: block;
-            width: 80px;
-            height: 4px;
-            background-color: var(--primary-color);
-            margin: 15px auto 0;
-            border-radius: 2px;
-        }
-        
-        label {
-            display: block;
-            margin-bottom: 10px;
-            color: #444;
-            font-weight: 500;
-        }
-        
-        textarea {
-            width: 100%;
-            height: 150px;
-            padding: 15px;
-            border: 1px solid #ddd;
-            border-radius: var(--border-radius);
-            resize: none;
-            font-size: 16px;
-            margin-bottom: 20px;
-        }
-        
-        textarea:focus {
-            outline: none;
-            border-color: var(--primary-color);
-        }
-        
-        .char-count {
-            text-align: right;
-            font-size: 14px;
-            color: #999;
-            margin-top: -15px;
-            margin-bottom: 20px;
-        }
-        
-        .button-group {
-            display: flex;
-            gap: 10px;
-            margin-bottom: 30px;
-        }
-        
-        .btn {
-            padding: 12px 20px;
-            border-radius: var(--border-radius);
-            font-size: 16px;
-            font-weight: 500;
-            cursor: pointer;
-            border: none;
-            transition: all 0.3s;
-            flex: 1;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
-        }
-        
-        .btn-primary {
-            background-color: var(--primary-color);
-            color: white;
-        }
-        
-        .btn-primary:hover {
-            background-color: #4a4ddd;
-        }
-        
-        .btn-secondary {
-            background-color: #f1f1f1;
-            color: #666;
-        }
-        
-        .btn-secondary:hover {
-            background-color: #e0e0e0;
-        }
-        
-        .tips-container {
-            background-color: #fff5e6;
-            border-radius: var(--border-radius);
-            padding: 20px;
-        }
-        
-        .tips-title {
-            color: #ff9900;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            margin-bottom: 15px;
-            font-weight: 600;
-        }
-        
-        .tips-title i {
-            color: #ff9900;
-        }
-        
-        .tips-list {
-            list-style-type: none;
-        }
-        
-        .tips-list li {
-            margin-bottom: 10px;
-            display: flex;
-            align-items: baseline;
-            gap: 10px;
-            color: #555;
-        }
-        
-        .tips-list li:before {
-            content: "•";
-            color: #ff9900;
-            font-weight: bold;
-        }
-        
-        .results {
-            margin-top: 30px;
-            display: none;
-        }
-        
-        .result-card {
-            background-color: #f8f9fa;
-            border-radius: var(--border-radius);
-            padding: 20px;
-            margin-bottom: 20px;
-        }
-        
-        .result-title {
-            font-size: 18px;
-            margin-bottom: 15px;
-            color: #333;
-            font-weight: 600;
-        }
-        
-        .status {
-            display: inline-block;
-            padding: 6px 12px;
-            border-radius: 20px;
-            font-size: 14px;
-            font-weight: 500;
-            margin-bottom: 15px;
-        }
-        
-        .status-safe {
-            background-color: rgba(40, 167, 69, 0.1);
-            color: #28a745;
-        }
-        
-        .status-spam {
-            background-color: rgba(220, 53, 69, 0.1);
-            color: #dc3545;
-        }
-        
-        .confidence-meter {
-            margin-top: 15px;
-        }
-        
-        .meter-label {
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 5px;
-        }
-        
-        .meter-title {
-            font-weight: 500;
-            color: #555;
-        }
-        
-        .meter-value {
-            font-weight: 600;
-        }
-        
-        .meter-value.low {
-            color: #28a745;
-        }
-        
-        .meter-value.medium {
-            color: #ffc107;
-        }
-        
-        .meter-value.high {
-            color: #dc3545;
-        }
-        
-        .meter-bar {
-            height: 8px;
-            background-color: #e9ecef;
-            border-radius: 4px;
-            overflow: hidden;
-        }
-        
-        .meter-fill {
-            height: 100%;
-            background-color: #28a745;
-            transition: width 0.5s ease;
-        }
-        
-        .meter-fill.medium {
-            background-color: #ffc107;
-        }
-        
-        .meter-fill.high {
-            background-color: #dc3545;
-        }
-        
-        .indicators {
-            margin-top: 20px;
-        }
-        
-        .indicators-title {
-            font-weight: 500;
-            margin-bottom: 10px;
-            color: #555;
-        }
-        
-        .indicators-list {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 8px;
-        }
-        
-        .indicator-tag {
-            background-color: #e9ecef;
-            padding: 5px 10px;
-            border-radius: 15px;
-            font-size: 14px;
-            color: #555;
-        }
-        
-        .spinner {
-            display: none;
-            text-align: center;
-            margin: 20px 0;
-        }
-        
-        .spinner i {
-            font-size: 2rem;
-            color: var(--primary-color);
-            animation: spin 1s linear infinite;
-        }
-        
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        
-        .error-message {
-            background-color: rgba(220, 53, 69, 0.1);
-            color: #dc3545;
-            padding: 12px;
-            border-radius: var(--border-radius);
-            margin-bottom: 20px;
-            display: none;
-        }
-        
-        @media (max-width: 576px) {
-            .card {
-                padding: 20px;
-            }
-            
-            .button-group {
-                flex-direction: column;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="card">
-        <div class="header">
-            <div class="logo">
-                <h1>Spam Detector</h1>
-            </div>
-            <label class="theme-toggle">
-                <input type="checkbox" id="themeToggle">
-                <span class="slider"></span>
-            </label>
-        </div>
-                
-        <div id="errorMessage" class="error-message"></div>
-        
-        <label for="messageInput">Enter your message</label>
-        <textarea id="messageInput" placeholder="Type or paste your message here..."></textarea>
-        <div class="char-count"><span id="charCount">0</span>/2000</div>
-        
-        <div class="button-group">
-            <button id="checkBtn" class="btn btn-primary">
-                <i class="fas fa-search"></i> Check Message
-            </button>
-            <button id="clearBtn" class="btn btn-secondary">
-                <i class="fas fa-redo"></i> Clear
-            </button>
-        </div>
-        
-        <div id="spinner" class="spinner">
-            <i class="fas fa-circle-notch"></i>
-        </div>
-        
-        <div id="results" class="results">
-            <div class="result-card">
-                <h3 class="result-title">Analysis Results</h3>
-                <div id="statusBadge" class="status">Unknown</div>
-                
-                <div class="confidence-meter">
-                    <div class="meter-label">
-                        <span class="meter-title">Spam Probability</span>
-                        <span id="confidenceValue" class="meter-value">0%</span>
-                    </div>
-                    <div class="meter-bar">
-                        <div id="confidenceFill" class="meter-fill" style="width: 0%"></div>
-                    </div>
-                </div>
-                
-                <div id="indicatorsSection" class="indicators">
-                    <h4 class="indicators-title">Spam indicators found:</h4>
-                    <div id="indicatorsList" class="indicators-list">
-                        <!-- Indicators will be added here -->
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="tips-container">
-            <div class="tips-title">
-                <i class="fas fa-lightbulb"></i> Tips  to avoid spam
-            </div>
-            <ul class="tips-list">
-                <li>Avoid using ALL CAPS in your message</li>
-                <li>Don't overuse exclamation marks!!!!!</li>
-                <li>Be cautious with phrases like "Free", "Act Now", etc.</li>
-                <li>Check for spelling and grammar errors</li>
-            </ul>
-        </div>
-    </div>
-    
-    <script>
-        document.addEventListener('DOMContentLoaded', function() {
-            const messageInput = document.getElementById('messageInput');
-            const charCount = document.getElementById('charCount');
-            const checkBtn = document.getElementById('checkBtn');
-            const clearBtn = document.getElementById('clearBtn');
-            const results = document.getElementById('results');
-            const statusBadge = document.getElementById('statusBadge');
-            const confidenceValue = document.getElementById('confidenceValue');
-            const confidenceFill = document.getElementById('confidenceFill');
-            const indicatorsSection = document.getElementById('indicatorsSection');
-            const indicatorsList = document.getElementById('indicatorsList');
-            const errorMessage = document.getElementById('errorMessage');
-            const spinner = document.getElementById('spinner');
-            const themeToggle = document.getElementById('themeToggle');
-            
-            // Character counter
-            messageInput.addEventListener('input', function() {
-                const count = this.value.length;
-                charCount.textContent = count;
-                
-                if (count > 2000) {
-                    this.value = this.value.substring(0, 2000);
-                    charCount.textContent = 2000;
-                }
-            });
-            
-            // Theme toggle
-            themeToggle.addEventListener('change', function() {
-                document.body.classList.toggle('dark-mode');
-            });
-            
-            // Clear button
-            clearBtn.addEventListener('click', function() {
-                messageInput.value = '';
-                charCount.textContent = '0';
-                results.style.display = 'none';
-                errorMessage.style.display = 'none';
-            });
-            
-            // Check message
-            checkBtn.addEventListener('click', function() {
-                const message = messageInput.value.trim();
-                
-                if (!message) {
-                    errorMessage.textContent = 'Please enter a message to analyze';
-                    errorMessage.style.display = 'block';
-                    return;
-                }
-                
-                // Hide error and results
-                errorMessage.style.display = 'none';
-                results.style.display = 'none';
-                
-                // Show spinner
-                spinner.style.display = 'block';
-                checkBtn.disabled = true;
-                
-                // Send request to server
-                fetch('/predict', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ message: message }),
-                })
-                .then(response => response.json())
-                .then(data => {
-                    // Hide spinner
-                    spinner.style.display = 'none';
-                    checkBtn.disabled = false;
-                    
-                    if (data.error) {
-                        errorMessage.textContent = data.error;
-                        errorMessage.style.display = 'block';
-                        return;
-                    }
-                    
-                    // Display results
-                    displayResults(data);
-                })
-                .catch(error => {
-                    // Hide spinner
-                    spinner.style.display = 'none';
-                    checkBtn.disabled = false;
-                    
-                    errorMessage.textContent = 'An error occurred. Please try again.';
-                    errorMessage.style.display = 'block';
-                    console.error('Error:', error);
-                });
-            });
-            
-            function displayResults(data) {
-                // Show results section
-                results.style.display = 'block';
-                
-                // Update status badge
-                statusBadge.textContent = data.prediction === 'spam' ? 'Spam Detected' : 'Not Spam';
-                statusBadge.className = data.prediction === 'spam' ? 'status status-spam' : 'status status-safe';
-                
-                // Update confidence meter
-                const probability = data.spam_probability;
-                confidenceValue.textContent = `${probability}%`;
-                confidenceFill.style.width = `${probability}%`;
-                
-                if (probability < 30) {
-                    confidenceValue.className = 'meter-value low';
-                    confidenceFill.className = 'meter-fill';
-                } else if (probability < 70) {
-                    confidenceValue.className = 'meter-value medium';
-                    confidenceFill.className = 'meter-fill medium';
-                } else {
-                    confidenceValue.className = 'meter-value high';
-                    confidenceFill.className = 'meter-fill high';
-                }
-                
-                // Show/hide indicators section
-                if (data.spam_indicators && data.spam_indicators.length > 0) {
-                    indicatorsSection.style.display = 'block';
-                    indicatorsList.innerHTML = '';
-                    
-                    data.spam_indicators.forEach(indicator => {
-                        const tag = document.createElement('span');
-                        tag.className = 'indicator-tag';
-                        tag.textContent = indicator;
-                        indicatorsList.appendChild(tag);
-                    });
-                } else {
-                    indicatorsSection.style.display = 'none';
-                }
-                
-                // Scroll to results
-                results.scrollIntoView({ behavior: 'smooth' });
-            }
-        });
-    </script>
-</body>
-</html>""")
+
+if FEEDBACK_PATH:
+    feedback = FeedbackLearner(registry, FEEDBACK_PATH, build_feedback_model, FEEDBACK_BATCH_SIZE,
+                               FEEDBACK_INTERVAL, FEEDBACK_WEIGHT, FEEDBACK_UPDATE_PRIOR, FEEDBACK_MAX_BYTES)
+    if SCORING_MODE == 'mapped':
+        print("Feedback is journaled but not applied: SCORING_MODE=mapped has no model to update")
+    metrics.gauge('spam_feedback_items_total', 'Feedback items read from the journal by outcome', ('result',),
+                  func=lambda: {(result,): count for result, count in feedback.counts.items()}, type='counter')
+else:
+    feedback = None
+
+# Start the model file watcher and feedback learner in each worker process
+@app.before_request
+def start_model_watcher():
+    if MODEL_WATCH_INTERVAL > 0:
+        registry.watch(MODEL_SOURCE, MODEL_FILES, MODEL_WATCH_INTERVAL, OPTIONAL_MODEL_FILES)
+    if feedback is not None:
+        feedback.start()
+
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.endpoint or 'unmatched'
+        if 'request_start' in g:
+            REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+        REQUESTS.inc(endpoint, response.status_code)
+        if response.status_code >= 400:
+            ERRORS.inc(endpoint, str(response.status_code))
+        return response
+
+# Admit or reject scoring requests before Flask sees them. Rejections there
+# bypass the hooks above, so they are counted here.
+def count_rejection(endpoint, e):
+    metrics.inc(REJECTIONS, endpoint, e.reason)
+    metrics.inc(REQUESTS, endpoint, e.status)
+    metrics.inc(ERRORS, endpoint, str(e.status))
+
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, admission, {'/predict': 'predict', '/predict/batch': 'predict_batch'},
+                                   REQUEST_DEADLINE_MS / 1000, ADMISSION_MAX_QUEUE_MS / 1000, count_rejection)
+
+# Requests past their deadline between stages
+@app.errorhandler(Rejected)
+def rejected(e):
+    metrics.inc(REJECTIONS, request.endpoint or 'unmatched', e.reason)
+    return jsonify({'error': str(e)}), e.status, {'Retry-After': '1'}
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Request body too large (max {MAX_REQUEST_BYTES} bytes)'}), 413
 
 @app.route('/')
 def home():
-    return send_from_directory('static', 'index.html')
+    return send_from_directory(app.root_path, 'index.html')
+
+# Warm this worker up; gunicorn's post_worker_init hook and the ASGI startup
+# call it before the worker accepts connections
+def warm_up():
+    warmup.run(registry.current, warm_request_path)
+
+def warm_request_path():
+    # Flask builds its routing and request machinery on the first request,
+    # and the encoders have their own first-call costs
+    app.test_client().get('/healthz')
+    sample = {'prediction': 'spam', 'spam_probability': 99.5, 'spam_indicators': ['free'], 'model_version': 'warmup'}
+    codec.encode(sample, codec.JSON)
+    if codec.msgpack is not None:
+        codec.encode(sample, codec.MSGPACK)
+
+def model_status():
+    current = registry.current
+    return {
+        'model_loaded': current is not None,
+        'model_version': current.version if current else None,
+        'load_seconds': round(current.load_seconds, 4) if current else None,
+        'loaded_at': current.loaded_at if current else None,
+        'warmup': warmup.status(),
+    }
+
+# Liveness: the process is up and serving requests
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok', 'pid': os.getpid(), **model_status()})
+
+# Readiness: a model is loaded and this worker has warmed it up. Servers
+# without a startup hook warm up on the first probe.
+@app.route('/readyz')
+def readyz():
+    warmup.start(registry.current, warm_request_path)
+    ready = registry.current is not None and warmup.ready
+    return jsonify({'ready': ready, **model_status()}), 200 if ready else 503
+
+# Score tokenized messages with the given model version, answering repeated
+# ones from the cache. Raises Rejected once the deadline has passed.
+def score_token_lists(current, token_lists, deadline=None):
+    campaigns = None
+    if campaign_index is not None:
+        with metrics.timer(STAGE_SECONDS, 'campaign'):
+            campaigns = campaign_index.observe_many(token_lists)
+    
+    if deadline is not None:
+        deadline.check('cache')
+    results = [None] * len(token_lists)
+    keys = [None] * len(token_lists)
+    missing = []
+    with metrics.timer(STAGE_SECONDS, 'cache'):
+        for i, tokens in enumerate(token_lists):
+            if cache is not None:
+                keys[i] = cache_key(tokens, current.version)
+                results[i] = cache.get(keys[i])
+            if results[i] is None:
+                missing.append(i)
+    if cache is not None:
+        metrics.inc(CACHE_LOOKUPS, 'hit', amount=len(token_lists) - len(missing))
+        metrics.inc(CACHE_LOOKUPS, 'miss', amount=len(missing))
+    
+    if campaigns is not None and CAMPAIGN_REUSE_VERDICT:
+        unscored = []
+        for i in missing:
+            verdict = campaigns[i].verdict if campaigns[i] is not None else None
+            if verdict is not None and verdict[0] == current.version:
+                results[i] = {**verdict[1], 'spam_indicators': current.find_indicators(token_lists[i])}
+            else:
+                unscored.append(i)
+        missing = unscored
+    
+    if missing and deadline is not None:
+        deadline.check('score')
+    if missing:
+        engine = current.engine
+        missing_tokens = [token_lists[i] for i in missing]
+        if isinstance(engine, ScoringEngine):
+            # Vectorizer and model timed separately
+            with metrics.timer(STAGE_SECONDS, 'vectorize'):
+                vectors = engine.vectorize(missing_tokens)
+            with metrics.timer(STAGE_SECONDS, 'model'):
+                scores = engine.score_vectors(vectors)
+        else:
+            with metrics.timer(STAGE_SECONDS, 'score'):
+                scores = engine.score(missing_tokens)
+        with metrics.timer(STAGE_SECONDS, 'indicators'):
+            for i, score in zip(missing, scores):
+                results[i] = {
+                    'prediction': str(score.label),
+                    'spam_probability': round(float(score.spam_probability) * 100, 2),
+                    'spam_indicators': current.find_indicators(token_lists[i])
+                }
+                if cache is not None:
+                    cache.set(keys[i], results[i])
+                campaign = campaigns[i] if campaigns is not None else None
+                if campaign is not None and (campaign.verdict is None or campaign.verdict[0] != current.version):
+                    campaign.verdict = (current.version, {'prediction': results[i]['prediction'],
+                                                          'spam_probability': results[i]['spam_probability']})
+    
+    if campaigns is not None:
+        for i, campaign in enumerate(campaigns):
+            if campaign is not None:
+                # A copy, so cached results stay free of campaign data
+                results[i] = {**results[i], 'campaign': {'id': campaign.id, 'size': campaign.size}}
+    
+    return results
+
+# Queue scored messages for the request log; block=False for callers on an
+# event loop, which must not wait for room in the queue
+def log_results(endpoint, version, messages, results, block=True):
+    if request_log is None:
+        return
+    now = round(time.time(), 3)
+    for message, result in zip(messages, results):
+        request_log.log({
+            'time': now,
+            'endpoint': endpoint,
+            'model_version': version,
+            'message': message,
+            'prediction': result['prediction'],
+            'spam_probability': result['spam_probability']
+        }, block)
+
+# Parse a JSON or msgpack request body
+def read_request_data():
+    if not request.is_json and not codec.is_msgpack(request.mimetype):
+        raise UnsupportedMediaType('Expected a JSON or msgpack request body')
+    try:
+        return codec.decode(request.mimetype, request.get_data())
+    except ValueError:
+        raise BadRequest('Failed to decode the request body')
+
+# Encode a scoring response in the format the client asked for (see codec.py)
+def respond(data, status=200):
+    mimetype = codec.negotiate(request.headers.get('Accept'), request.mimetype)
+    return Response(codec.encode(data, mimetype), status, mimetype=mimetype)
+
+def echo_message():
+    echo = request.args.get('echo')
+    return RESPONSE_ECHO_MESSAGE if echo is None else echo not in ('0', 'false')
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if not model_loaded:
-        return jsonify({
+    current = registry.current
+    if current is None:
+        metrics.inc(ERRORS, 'predict', 'model_unavailable')
+        return respond({
             'error': 'Model not available. Please check server logs.'
         })
     
     # Get message from request
-    data = request.get_json()
-    message = data.get('message', '')
+    data = read_request_data()
+    message = data.get('message', '') if isinstance(data, dict) else None
+    
+    if not isinstance(message, str):
+        metrics.inc(ERRORS, 'predict', 'invalid_message')
+        return respond({
+            'error': 'Invalid message'
+        }, 400)
     
     if not message:
-        return jsonify({
+        metrics.inc(ERRORS, 'predict', 'no_message')
+        return respond({
             'error': 'No message provided'
         })
     
-    # Preprocess the message
-    preprocessed = preprocess_text(message)
+    if MAX_MESSAGE_LENGTH and len(message) > MAX_MESSAGE_LENGTH:
+        return respond({
+            'error': f'Message too long: {len(message)} characters (max {MAX_MESSAGE_LENGTH})'
+        }, 413)
+    
+    # Preprocess the message into tokens
+    deadline = request.environ.get(DEADLINE_KEY)
+    if deadline is not None:
+        deadline.check('preprocess')
+    with metrics.timer(STAGE_SECONDS, 'preprocess'):
+        tokens = tokenize(message)
+    
+    # Vectorize and predict in a single pass, unless the message is cached
+    result = score_token_lists(current, [tokens], deadline)[0]
+    log_results('predict', current.version, [message], [result])
+    
+    with metrics.timer(STAGE_SECONDS, 'serialize'):
+        response = {**result, 'model_version': current.version}
+        if echo_message():
+            response['message'] = message
+        return respond(response)
+
+# Read the messages of a batch request: a JSON or msgpack array, or NDJSON lines
+def read_batch_items():
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(codec.loads_json(line))
+            except ValueError:
+                items.append(None)
+        return items
     
-    # Vectorize
-    message_vector = vectorizer.transform([preprocessed])
+    data = None
+    if request.is_json or codec.is_msgpack(request.mimetype):
+        try:
+            data = codec.decode(request.mimetype, request.get_data())
+        except ValueError:
+            pass
+    if isinstance(data, dict):
+        data = data.get('messages')
+    return data if isinstance(data, list) else None
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    current = registry.current
+    if current is None:
+        return respond({
+            'error': 'Model not available. Please check server logs.'
+        }, 503)
     
-    # Predict
-    prediction = model.predict(message_vector)[0]
+    items = read_batch_items()
+    if items:
+        metrics.observe(BATCH_SIZE, len(items))
+    if not items:
+        return respond({
+            'error': 'Expected a JSON or msgpack array, or NDJSON list of messages'
+        }, 400)
     
-    # Get probability scores (for better UI feedback)
-    proba = model.predict_proba(message_vector)[0]
+    if len(items) > MAX_BATCH_SIZE:
+        return respond({
+            'error': f'Batch too large: {len(items)} messages (max {MAX_BATCH_SIZE})'
+        }, 413)
     
-    # Determine spam probability based on class ordering
-    spam_idx = list(model.classes_).index('spam') if 'spam' in model.classes_ else 1
-    spam_probability = proba[spam_idx] * 100
+    # Items are either plain strings or objects with a "message" field
+    results = [None] * len(items)
+    messages = []
+    positions = []
+    for i, item in enumerate(items):
+        message = item.get('message', '') if isinstance(item, dict) else item
+        if not isinstance(message, str):
+            results[i] = {'error': 'Invalid message'}
+        elif not message:
+            results[i] = {'error': 'No message provided'}
+        elif MAX_MESSAGE_LENGTH and len(message) > MAX_MESSAGE_LENGTH:
+            results[i] = {'error': f'Message too long (max {MAX_MESSAGE_LENGTH} characters)'}
+        else:
+            messages.append(message)
+            positions.append(i)
     
-    # Find common spam indicators
-    common_spam_words = [
-        "free", "call", "text", "prize", "win", "claim", "urgent",
-        "cash", "offer", "mobile", "service", "customer", "please",
-        "contact", "msg", "reply", "stop", "send", "credit", "gift", "iphone", "phone", "money","congratulation" , "insurance", "congrats"
-    ]
+    if len(messages) < len(items):
+        metrics.inc(ERRORS, 'predict_batch', 'invalid_item', amount=len(items) - len(messages))
     
-    found_indicators = [word for word in common_spam_words if word in preprocessed.split()]
+    if messages:
+        # Vectorize and score the whole batch at once
+        deadline = request.environ.get(DEADLINE_KEY)
+        if deadline is not None:
+            deadline.check('preprocess')
+        with metrics.timer(STAGE_SECONDS, 'preprocess'):
+            token_lists = [tokenize(message) for message in messages]
+        scored = score_token_lists(current, token_lists, deadline)
+        log_results('predict_batch', current.version, messages, scored)
+        
+        echo = echo_message()
+        for j, i in enumerate(positions):
+            results[i] = {'message': messages[j], **scored[j]} if echo else scored[j]
     
-    return jsonify({
-        'message': message,
-        'prediction': prediction,
-        'spam_probability': round(spam_probability, 2),
-        'spam_indicators': found_indicators
-    })
+    with metrics.timer(STAGE_SECONDS, 'serialize'):
+        return respond({
+            'count': len(results),
+            'model_version': current.version,
+            'results': results
+        })
+
+@app.route('/feedback', methods=['POST'])
+def submit_feedback():
+    if feedback is None:
+        return jsonify({'error': 'Feedback is disabled'}), 404
+    if FEEDBACK_TOKEN is not None and request.headers.get('X-Feedback-Token') != FEEDBACK_TOKEN:
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    message = data.get('message')
+    if not isinstance(message, str) or not message:
+        return jsonify({'error': 'No message provided'}), 400
+    try:
+        label = feedback.submit(message, data.get('label', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except JournalFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'status': 'queued', 'label': label}), 202
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@app.route('/campaigns/stats')
+def campaign_stats():
+    if campaign_index is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **campaign_index.stats()})
+
+# Admin endpoints are only enabled when ADMIN_TOKEN is set
+def admin_authorized():
+    return ADMIN_TOKEN is not None and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@app.route('/admin/models')
+def admin_models():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(registry.status())
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    source = data.get('path', MODEL_SOURCE)
+    if not registry.reload(source):
+        return jsonify({'error': 'A reload is already in progress'}), 409
+    return jsonify({'status': 'loading', 'source': source}), 202
+
+@app.route('/admin/feedback')
+def admin_feedback():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    if feedback is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **feedback.status()})
+
+@app.route('/admin/rollback', methods=['POST'])
+def admin_rollback():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    if not registry.rollback():
+        return jsonify({'error': 'No previous model to roll back to'}), 409
+    return jsonify(registry.status())
+
+if PROFILING_ENABLED:
+    profiler = Profiler(PROFILE_DIR)
+
+    @app.before_request
+    def start_request_profile():
+        if request.endpoint in ('predict', 'predict_batch'):
+            profiler.before_request()
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        profiler.after_request()
+
+    @app.route('/admin/profile')
+    def admin_profile():
+        if not admin_authorized():
+            return jsonify({'error': 'Forbidden'}), 403
+        return jsonify(profiler.status())
+
+    @app.route('/admin/profile/sample', methods=['POST'])
+    def admin_profile_sample():
+        if not admin_authorized():
+            return jsonify({'error': 'Forbidden'}), 403
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+        try:
+            interval = positive_number(data.get('interval_ms', 5), 'interval_ms') / 1000
+            name = profiler.start_sampling(data.get('seconds', 10), interval, data.get('match', 'predict'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify({'status': 'sampling', 'result': name, 'pid': os.getpid()}), 202
+
+    @app.route('/admin/profile/requests', methods=['POST'])
+    def admin_profile_requests():
+        if not admin_authorized():
+            return jsonify({'error': 'Forbidden'}), 403
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+        try:
+            name = profiler.profile_requests(data.get('count', 10))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify({'status': 'armed', 'result': name, 'pid': os.getpid()}), 202
+
+    @app.route('/admin/profile/<name>')
+    def admin_profile_result(name):
+        if not admin_authorized():
+            return jsonify({'error': 'Forbidden'}), 403
+        path = profiler.result_path(name)
+        if path is None:
+            return jsonify({'error': 'No such profile (it may still be running)'}), 404
+        if name.endswith('.pstats'):
+            return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+        return send_file(path, mimetype='text/plain')
 
 if __name__ == '__main__':
     print("Starting the spam detection app...")
-    print(f"Model loaded: {model_loaded}")
+    print(f"Model loaded: {registry.current is not None}")
+    warm_up()
     
     # Start the Flask server
     app.run(debug=True)
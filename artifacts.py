@@ -0,0 +1,254 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+from scoring import CompiledScorer, is_plain_word_vectorizer
+
+# Memory-mappable model artifacts.
+#
+# A model directory holds the numeric arrays as .npy files, which every worker
+# maps read-only so they are backed by one shared copy in the page cache:
+#
+#   idf.npy              (n_terms,) float64
+#   log_prob.npy         (n_terms, n_classes) float64, feature_log_prob_.T
+#   class_log_prior.npy  (n_classes,) float64
+#   vocab_hashes.npy     (n_terms,) uint64, sorted 64-bit term hashes
+#   vocab_rows.npy       (n_terms,) int32, row of each hash in the arrays above
+#   terms.txt            the terms, one per line in row order (not read when scoring)
+#   meta.json            classes and vectorizer options
+#
+# The vocabulary is looked up by hash with a binary search over
+# vocab_hashes.npy, so it costs 12 bytes per term and no Python objects.
+#
+# idf.npy and log_prob.npy can be stored at a lower precision: float32,
+# float16, or int8 scaled per column (value = stored * scale + offset, with
+# the scales and offsets in meta.json). A spam verdict needs nowhere near
+# float64's precision, and int8 makes those two arrays eight times smaller.
+# Only the rows a message uses are converted back to float64 when scoring.
+# Quantized artifacts are written as version 2, which older readers refuse
+# instead of misreading.
+#
+# Each file is renamed into place on its own, so a worker loading while an
+# export is under way could pair new metadata with old arrays, or the other
+# way round. meta.json, written last, records a CRC-32 of every array, and
+# loading checks them and refuses a mixed set; the model watcher then loads
+# it again once the export has finished changing the files.
+
+ARTIFACT_VERSION = 1
+QUANTIZED_ARTIFACT_VERSION = 2
+PRECISIONS = ('float64', 'float32', 'float16', 'int8')
+
+
+# Stable 64-bit term hash: CRC-32 and Adler-32 side by side are several times
+# cheaper than a cryptographic digest, and export_artifacts rejects any
+# vocabulary with a collision
+def term_hash(term):
+    data = term.encode()
+    return (zlib.crc32(data) << 32) | zlib.adler32(data)
+
+
+def quantize(array, precision):
+    # Stored array, plus the per-column scale and offset for int8 (None otherwise)
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r} (use one of {', '.join(PRECISIONS)})")
+    array = np.asarray(array, dtype=np.float64)
+    if precision != 'int8':
+        return np.ascontiguousarray(array, dtype=precision), None, None
+    low = array.min(axis=0)
+    scale = (array.max(axis=0) - low) / 254
+    scale = np.where(scale > 0, scale, 1.0)
+    stored = np.round((array - low) / scale) - 127
+    return np.ascontiguousarray(stored, dtype=np.int8), scale, low + 127 * scale
+
+
+def array_checksum(array):
+    return zlib.crc32(np.ascontiguousarray(array))
+
+
+def export_artifacts(vectorizer, model, directory, metadata=None, precision='float64'):
+    if not hasattr(vectorizer, 'vocabulary_'):
+        raise ValueError('Hashing vectorizers have no vocabulary to export; use SCORING_MODE=sklearn')
+    if not is_plain_word_vectorizer(vectorizer):
+        raise ValueError('Only unigram word vectorizers with the default token pattern can be exported')
+    os.makedirs(directory, exist_ok=True)
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+    hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+    order = np.argsort(hashes, kind='stable')
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError('Vocabulary hash collision; cannot build the hashed lookup table')
+
+    checksums = {}
+
+    def save(name, array):
+        # Write beside the target and rename over it, so workers that have
+        # the old file mapped keep reading the old inode
+        path = os.path.join(directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+        checksums[name] = array_checksum(array)
+
+    def write(name, text):
+        path = os.path.join(directory, name)
+        with open(path + '.tmp', 'w') as f:
+            f.write(text)
+        os.replace(path + '.tmp', path)
+
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms))
+    idf, idf_scale, idf_offset = quantize(idf, precision)
+    log_prob, log_prob_scale, log_prob_offset = quantize(model.feature_log_prob_.T, precision)
+    scales = {}
+    if precision == 'int8':
+        scales = {'idf_scale': float(idf_scale), 'idf_offset': float(idf_offset),
+                  'log_prob_scale': log_prob_scale.tolist(), 'log_prob_offset': log_prob_offset.tolist()}
+    save('idf.npy', idf)
+    save('log_prob.npy', log_prob)
+    save('class_log_prior.npy', np.asarray(model.class_log_prior_, dtype=np.float64))
+    save('vocab_hashes.npy', hashes[order])
+    save('vocab_rows.npy', order.astype(np.int32))
+    write('terms.txt', '\n'.join(terms))
+    # meta.json goes last so a reader never sees new metadata with old arrays
+    write('meta.json', json.dumps({
+        'artifact_version': ARTIFACT_VERSION if precision == 'float64' else QUANTIZED_ARTIFACT_VERSION,
+        'precision': precision,
+        **scales,
+        'classes': [str(label) for label in model.classes_],
+        'norm': vectorizer.norm,
+        'sublinear_tf': vectorizer.sublinear_tf,
+        'binary': vectorizer.binary,
+        'n_terms': len(terms),
+        'checksums': checksums,
+        **(metadata or {}),
+    }, indent=2))
+
+
+class MappedScorer(CompiledScorer):
+    """Scores tokens against memory-mapped model artifacts.
+
+    Gives the same results as ``CompiledScorer`` (up to rounding, for
+    quantized artifacts). The arrays stay in the shared page cache instead
+    of being copied into per-worker Python objects.
+    """
+
+    def __init__(self, directory, spam_label='spam'):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('artifact_version') not in (ARTIFACT_VERSION, QUANTIZED_ARTIFACT_VERSION):
+            raise ValueError(f"Unsupported model artifact version in {directory}")
+
+        def load(name):
+            # Plain ndarray views of the mapping skip np.memmap's per-operation overhead
+            return np.asarray(np.load(os.path.join(directory, name), mmap_mode='r'))
+
+        self.idf = load('idf.npy')
+        self.log_prob = load('log_prob.npy')
+        self.class_log_prior = np.load(os.path.join(directory, 'class_log_prior.npy'))
+        self.hashes = load('vocab_hashes.npy')
+        self.rows = load('vocab_rows.npy')
+        arrays = {'idf.npy': self.idf, 'log_prob.npy': self.log_prob, 'class_log_prior.npy': self.class_log_prior,
+                  'vocab_hashes.npy': self.hashes, 'vocab_rows.npy': self.rows}
+        # Artifacts exported before checksums were recorded load unchecked
+        for name, checksum in self.meta.get('checksums', {}).items():
+            if array_checksum(arrays[name]) != checksum:
+                raise ValueError(f"{name} in {directory} does not match meta.json (export in progress?)")
+        self.classes = np.array(self.meta['classes'])
+        self.labels = list(self.meta['classes'])
+        self.norm = self.meta['norm']
+        self.sublinear_tf = self.meta['sublinear_tf']
+        self.binary = self.meta['binary']
+        self.precision = self.meta.get('precision', 'float64')
+        if self.precision == 'int8':
+            self.idf_scale = self.meta['idf_scale']
+            self.idf_offset = self.meta['idf_offset']
+            self.log_prob_scale = np.array(self.meta['log_prob_scale'])
+            self.log_prob_offset = np.array(self.meta['log_prob_offset'])
+        self.spam_idx = self.labels.index(spam_label) if spam_label in self.labels else 1
+        self.other_idx = [i for i in range(len(self.labels)) if i != self.spam_idx]
+        self.prior = self.class_log_prior.tolist()
+        self._terms = None
+
+    @property
+    def terms(self):
+        # Only needed for export and model-derived indicators
+        if self._terms is None:
+            with open(os.path.join(self.directory, 'terms.txt')) as f:
+                self._terms = f.read().split('\n')
+        return self._terms
+
+    def float_arrays(self):
+        # idf and log_prob as float64, e.g. for export and indicators
+        if self.precision != 'int8':
+            return self.idf.astype(np.float64), self.log_prob.astype(np.float64)
+        return (self.idf * self.idf_scale + self.idf_offset,
+                self.log_prob * self.log_prob_scale + self.log_prob_offset)
+
+    def lookup(self, tokens):
+        # Table rows of the in-vocabulary tokens
+        if not tokens:
+            return self.rows[:0]
+        keys = np.fromiter((term_hash(token) for token in tokens), np.uint64, len(tokens))
+        positions = np.searchsorted(self.hashes, keys)
+        positions[positions == len(self.hashes)] = 0
+        found = self.hashes[positions] == keys
+        return self.rows[positions[found]]
+
+    def joint_log_likelihood(self, tokens):
+        counts = {}
+        for row in self.lookup(tokens).tolist():
+            counts[row] = counts.get(row, 0) + 1
+        if not counts:
+            return list(self.prior)
+
+        rows = list(counts)
+        if self.binary:
+            weights = np.ones(len(rows))
+        else:
+            weights = np.array(list(counts.values()), dtype=np.float64)
+            if self.sublinear_tf:
+                weights = np.log(weights) + 1.0
+        if self.precision == 'int8':
+            weights *= self.idf[rows] * self.idf_scale + self.idf_offset
+        else:
+            weights *= self.idf[rows]
+        if self.norm == 'l2':
+            weights /= np.sqrt(np.dot(weights, weights))
+        elif self.norm == 'l1':
+            weights /= np.abs(weights).sum()
+        if self.precision == 'int8':
+            # sum(w * (q * scale + offset)) without converting the rows
+            sums = (weights @ self.log_prob[rows]) * self.log_prob_scale + weights.sum() * self.log_prob_offset
+        else:
+            sums = weights @ self.log_prob[rows]
+        return (sums + self.class_log_prior).tolist()
+
+    def export(self, path):
+        idf, log_prob = self.float_arrays()
+        CompiledScorer(self.terms, idf, log_prob, self.class_log_prior, self.classes,
+                       norm=self.norm, sublinear_tf=self.sublinear_tf, binary=self.binary).export(path)
+
+
+def load_artifacts(directory, spam_label='spam'):
+    return MappedScorer(directory, spam_label)
+
+
+if __name__ == '__main__':
+    # Export the pickled model: python artifacts.py [model_artifacts] [--precision int8]
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', nargs='?', default='model_artifacts')
+    parser.add_argument('--precision', choices=PRECISIONS, default='float64')
+    args = parser.parse_args()
+    with open('nb_model.pkl', 'rb') as f:
+        model = pickle.load(f)
+    with open('tfidf_vectorizer.pkl', 'rb') as f:
+        vectorizer = pickle.load(f)
+    export_artifacts(vectorizer, model, args.directory, precision=args.precision)
+    print(f"Wrote {args.precision} model artifacts to {args.directory}")
@@ -0,0 +1,274 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+
+import codec
+from admission import Rejected, request_deadline
+from app import (ADMISSION_MAX_QUEUE_MS, ERRORS, MAX_MESSAGE_LENGTH, MAX_REQUEST_BYTES, REJECTIONS, REQUEST_DEADLINE_MS,
+                 REQUEST_SECONDS, REQUESTS, RESPONSE_ECHO_MESSAGE, STAGE_SECONDS, log_results, metrics, registry,
+                 score_token_lists, start_model_watcher, warm_up)
+from app import app as wsgi_app
+from preprocessing import tokenize
+
+# ASGI serving mode: `uvicorn asgi:app`.
+#
+# Concurrent /predict calls are queued and scored together, so the vectorizer
+# and model run once per batch instead of once per request. A batch is flushed
+# when ASYNC_BATCH_SIZE calls are waiting or ASYNC_BATCH_WAIT_MS after the
+# first one arrived; calls that arrive while a batch is being scored form the
+# next one. Every other route (and any /predict body that is not a plain
+# {"message": "..."} object in JSON or msgpack) is passed through to the Flask
+# app unchanged.
+ASYNC_BATCH_SIZE = int(os.environ.get('ASYNC_BATCH_SIZE', '64'))
+ASYNC_BATCH_WAIT_MS = float(os.environ.get('ASYNC_BATCH_WAIT_MS', '2'))
+# At most ASYNC_MAX_PENDING calls wait for a batch (0 for no limit); more are
+# rejected with 429. Calls whose REQUEST_DEADLINE_MS passes while they wait
+# are dropped from their batch with 503.
+ASYNC_MAX_PENDING = int(os.environ.get('ASYNC_MAX_PENDING', '0'))
+
+
+class MicroBatcher:
+    """Collects concurrent ``submit`` calls into batches for ``func``.
+
+    ``func`` takes a list of items and returns a list of results in the same
+    order. It runs on a single worker thread, so the event loop keeps
+    accepting requests while a batch is being scored. Items submitted with a
+    deadline that has passed by the time their batch is formed are not
+    scored; their calls raise ``Rejected``.
+    """
+
+    def __init__(self, func, max_batch_size=64, max_wait=0.002):
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='micro-batch')
+        self.pending = []
+        self.batches = 0
+        self.items = 0
+        self.expired = 0
+        self._ready = None
+        self._full = None
+        self._task = None
+
+    async def submit(self, item, deadline=None):
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future, deadline))
+        self._ready.set()
+        if len(self.pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            if self.max_wait > 0 and len(self.pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self.pending[:self.max_batch_size]
+            self.pending = self.pending[self.max_batch_size:]
+            if not self.pending:
+                self._ready.clear()
+            if len(self.pending) < self.max_batch_size:
+                self._full.clear()
+
+            live = []
+            for item, future, deadline in batch:
+                try:
+                    if deadline is not None:
+                        deadline.check('score')
+                except Rejected as e:
+                    self.expired += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    live.append((item, future))
+            batch = live
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await loop.run_in_executor(self.executor, self.func, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+            'pending': len(self.pending),
+            'expired': self.expired,
+        }
+
+
+# Score a batch of token lists with one model version
+def score_batch(token_lists):
+    current = registry.current
+    return [dict(result, model_version=current.version) for result in score_token_lists(current, token_lists)]
+
+
+batcher = MicroBatcher(score_batch, ASYNC_BATCH_SIZE, ASYNC_BATCH_WAIT_MS / 1000)
+
+# Requests passed through to Flask run here, off the event loop
+wsgi_executor = ThreadPoolExecutor(int(os.environ.get('ASYNC_WSGI_THREADS', '4')), thread_name_prefix='wsgi')
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_body(send, body, mimetype, status=200, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', mimetype.encode()), (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200, headers=()):
+    await send_body(send, codec.dumps_json(data), codec.JSON, status, headers)
+
+
+def echo_message(query_string):
+    echo = parse_qs(query_string.decode('latin-1')).get('echo') if query_string else None
+    return RESPONSE_ECHO_MESSAGE if echo is None else echo[-1] not in ('0', 'false')
+
+
+def call_wsgi(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        response['body'] = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response
+
+
+async def pass_to_wsgi(scope, body, send):
+    response = await asyncio.get_running_loop().run_in_executor(wsgi_executor, call_wsgi, scope, body)
+    await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+    await send({'type': 'http.response.body', 'body': response['body']})
+
+
+async def predict(scope, body, send, start):
+    headers = dict(scope['headers'])
+    mimetype = headers.get(b'content-type', b'').split(b';')[0].strip().decode('latin-1')
+    try:
+        data = codec.decode(mimetype, body) if mimetype == codec.JSON or codec.is_msgpack(mimetype) else None
+    except ValueError:
+        data = None
+    message = data.get('message') if isinstance(data, dict) else None
+    if (registry.current is None or not isinstance(message, str) or not message
+            or MAX_MESSAGE_LENGTH and len(message) > MAX_MESSAGE_LENGTH
+            or MAX_REQUEST_BYTES and len(body) > MAX_REQUEST_BYTES):
+        # Errors get exactly the responses the Flask app gives
+        return await pass_to_wsgi(scope, body, send)
+
+    response_type = codec.negotiate(headers.get(b'accept', b'').decode('latin-1'), mimetype)
+    try:
+        request_start = headers.get(b'x-request-start', b'').decode('latin-1')
+        deadline = request_deadline(request_start, REQUEST_DEADLINE_MS / 1000, ADMISSION_MAX_QUEUE_MS / 1000)
+        if ASYNC_MAX_PENDING and len(batcher.pending) >= ASYNC_MAX_PENDING:
+            raise Rejected(429, 'queue_full', 'Too many requests in progress')
+        with metrics.timer(STAGE_SECONDS, 'preprocess'):
+            tokens = tokenize(message)
+        result = await batcher.submit(tokens, deadline)
+    except Rejected as e:
+        metrics.inc(REJECTIONS, 'predict', e.reason)
+        await send_body(send, codec.encode({'error': str(e)}, response_type), response_type, e.status,
+                        [(b'retry-after', b'1')])
+        metrics.observe(REQUEST_SECONDS, time.perf_counter() - start, 'predict')
+        metrics.inc(REQUESTS, 'predict', e.status)
+        metrics.inc(ERRORS, 'predict', str(e.status))
+        return
+    response = dict(result)
+    if echo_message(scope['query_string']):
+        response['message'] = message
+    await send_body(send, codec.encode(response, response_type), response_type)
+    # Never waits for the writer here: a blocking put would stall the event loop
+    log_results('predict', result['model_version'], [message], [result], block=False)
+    # Requests scored here bypass Flask, so they are counted here too
+    metrics.observe(REQUEST_SECONDS, time.perf_counter() - start, 'predict')
+    metrics.inc(REQUESTS, 'predict', 200)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_model_watcher()
+                warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    start = time.perf_counter()
+    body = await read_body(receive)
+    if scope['path'] == '/predict' and scope['method'] == 'POST':
+        await predict(scope, body, send, start)
+    elif scope['path'] == '/batcher/stats' and scope['method'] == 'GET':
+        await send_json(send, batcher.stats())
+    else:
+        await pass_to_wsgi(scope, body, send)
@@ -0,0 +1,131 @@
+"""Load test: sync gunicorn workers versus the micro-batching ASGI mode.
+
+    python benchmarks/bench_async.py [--concurrency 32] [--duration 10] [--workers 1]
+
+Starts each server on a free local port with the prediction cache disabled,
+then keeps --concurrency clients posting /predict for --duration seconds and
+reports throughput and latency percentiles. The ASGI mode is run with the
+configured batching and with batching disabled (ASYNC_BATCH_SIZE=1), which
+separates the effect of batching from that of the server. Needs uvicorn.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from common import ROOT, corpus, load_pickles, percentiles
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start listening on port {port}')
+
+
+async def post(connection, port, body):
+    # One keep-alive HTTP/1.1 request; reconnects if the server closed the
+    # connection (gunicorn's sync workers close after every response)
+    if connection is None:
+        connection = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = connection
+    writer.write(b'POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+    await writer.drain()
+    headers = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower().split('\r\n')
+    status = int(headers[0].split()[1])
+    length = next(int(line.split(':', 1)[1]) for line in headers if line.startswith('content-length:'))
+    await reader.readexactly(length)
+    if 'connection: close' in headers:
+        writer.close()
+        connection = None
+    return status, connection
+
+
+async def load(port, bodies, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        connection = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, connection = await post(connection, port, rng.choice(bodies))
+            except (OSError, asyncio.IncompleteReadError):
+                errors += 1
+                connection = None
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def run(name, command, env, bodies, args):
+    port = free_port()
+    process = subprocess.Popen([part.format(port=port) for part in command], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        asyncio.run(load(port, bodies, args.concurrency, 1))  # warm up
+        latencies, errors, elapsed = asyncio.run(load(port, bodies, args.concurrency, args.duration))
+    finally:
+        process.terminate()
+        process.wait()
+    stats = percentiles(latencies)
+    print(f"{name:<24} {len(latencies) / elapsed:>8,.0f} req/s"
+          f"  p50 {stats['p50']:7.2f}ms  p95 {stats['p95']:7.2f}ms  p99 {stats['p99']:7.2f}ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--count', type=int, default=2000, help='distinct messages to send')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--batch-wait-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    bodies = [json.dumps({'message': message}).encode() for message in corpus(vectorizer, args.count)]
+    env = dict(os.environ, PREDICTION_CACHE_SIZE='0')
+    workers = str(args.workers)
+
+    print(f"{args.concurrency} concurrent clients, {args.workers} worker(s), {args.duration:g}s per server")
+    gunicorn = [sys.executable, '-m', 'gunicorn', 'app:app', '--workers', workers, '--bind', '127.0.0.1:{port}']
+    run('sync (gunicorn)', gunicorn, env, bodies, args)
+    uvicorn = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', workers, '--log-level', 'warning',
+               '--port', '{port}']
+    run('asgi, no batching', uvicorn, dict(env, ASYNC_BATCH_SIZE='1', ASYNC_BATCH_WAIT_MS='0'), bodies, args)
+    run(f'asgi, batch {args.batch_size}/{args.batch_wait_ms:g}ms', uvicorn,
+        dict(env, ASYNC_BATCH_SIZE=str(args.batch_size), ASYNC_BATCH_WAIT_MS=str(args.batch_wait_ms)), bodies, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
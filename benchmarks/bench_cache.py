@@ -0,0 +1,117 @@
+"""Cache hit latency for each backend versus recomputing the prediction.
+
+    python benchmarks/bench_cache.py [--count 2000] [--redis-url redis://...]
+
+Without ``--redis-url`` the Redis backend runs against an in-process dict
+stand-in, which measures the wrapper and JSON cost but not the network.
+The shared backend is also checked across processes: a forked child stores
+results and the parent must see them as hits.
+"""
+import argparse
+import fnmatch
+import os
+import sys
+import tempfile
+
+from common import corpus, load_pickles, report, time_each
+
+from cache import PredictionCache, RedisCache, SharedMemoryCache, cache_key
+from indicators import find_spam_indicators
+from preprocessing import tokenize
+from scoring import CompiledScorer, ScoringEngine
+
+
+class LocalRedis:
+    # Minimal stand-in for the subset of the redis client RedisCache uses
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value.encode() if isinstance(value, str) else value
+
+    def scan_iter(self, match='*'):
+        return [name for name in list(self.data) if fnmatch.fnmatch(name, match)]
+
+    def delete(self, *names):
+        for name in names:
+            self.data.pop(name, None)
+
+
+def predict(engine, message):
+    tokens = tokenize(message)
+    score = engine.score_one(tokens)
+    return {
+        'prediction': str(score.label),
+        'spam_probability': round(float(score.spam_probability) * 100, 2),
+        'spam_indicators': find_spam_indicators(tokens),
+    }
+
+
+def cached_predict(cache, engine, message):
+    tokens = tokenize(message)
+    key = cache_key(tokens)
+    result = cache.get(key)
+    if result is None:
+        result = predict(engine, message)
+        cache.set(key, result)
+    return result
+
+
+def check_cross_process(path, engine, messages):
+    cache = SharedMemoryCache(path, len(messages))
+    cache.invalidate()
+    pid = os.fork()
+    if pid == 0:
+        for message in messages:
+            cached_predict(cache, engine, message)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    before = cache.stats()['hits']
+    for message in messages:
+        cached_predict(cache, engine, message)
+    hits = cache.stats()['hits'] - before
+    print(f"shared cache across processes: {hits}/{len(messages)} hits in the parent")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    vectorizer, model = load_pickles()
+    messages = corpus(vectorizer, args.count)
+    engines = {
+        'sklearn': ScoringEngine(vectorizer, model),
+        'compiled': CompiledScorer.from_sklearn(vectorizer, model),
+    }
+
+    for name, engine in engines.items():
+        report(f'recompute ({name})', time_each(lambda m: predict(engine, m), messages[:500]))
+
+    with tempfile.TemporaryDirectory(dir='/dev/shm' if os.path.isdir('/dev/shm') else None) as tmp:
+        if args.redis_url:
+            redis_cache = RedisCache.from_url(args.redis_url, prefix='spam-detector-bench:')
+        else:
+            redis_cache = RedisCache(LocalRedis())
+        caches = {
+            'memory': PredictionCache(args.count * 2),
+            'shared': SharedMemoryCache(os.path.join(tmp, 'cache'), args.count),
+            'redis' if args.redis_url else 'redis (local stand-in)': redis_cache,
+        }
+        for name, cache in caches.items():
+            # Warm the cache, then time pure hits
+            for message in messages:
+                cached_predict(cache, engines['sklearn'], message)
+            report(f'hit ({name})', time_each(lambda m: cached_predict(cache, engines['sklearn'], m), messages))
+        redis_cache.invalidate()
+
+        check_cross_process(os.path.join(tmp, 'cross'), engines['compiled'], messages[:500])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Campaign index (MinHash/LSH) at scale: insert rate, lookup latency, memory, accuracy.
+
+    python benchmarks/bench_campaigns.py [--messages 1000000] [--campaign-fraction 0.3]
+
+Builds a stream of token lists in which --campaign-fraction of the messages
+are mutations of --templates spam templates (each mutation replaces, inserts
+or drops one or two words) and the rest are unrelated messages drawn from the
+model vocabulary. It then:
+
+- adds the stream to a CampaignIndex sized to hold all of it, in chunks as
+  /predict/batch would, reporting messages per second as the index grows;
+- times single-message lookups (CampaignIndex.observe, the /predict path)
+  against the full index;
+- reports the memory the index holds (RSS growth while filling it);
+- reports how many mutations joined their template's largest campaign
+  (recall) and how many unrelated messages were put in a campaign;
+- streams the messages again through a small index with a time window to
+  measure the cost of eviction.
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import load_pickles, percentiles
+
+from campaigns import CampaignIndex
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * 4096 / 1024 / 1024
+
+
+def mutate(rng, tokens):
+    tokens = list(tokens)
+    for _ in range(rng.choice((1, 2))):
+        op = rng.random()
+        if op < 0.5:
+            tokens[rng.randrange(len(tokens))] = f"x{rng.randrange(1 << 20)}"
+        elif op < 0.8:
+            tokens.insert(rng.randrange(len(tokens) + 1), f"y{rng.randrange(1 << 20)}")
+        elif len(tokens) > 3:
+            tokens.pop(rng.randrange(len(tokens)))
+    return tokens
+
+
+def message_stream(vocabulary, count, templates, campaign_fraction, seed):
+    # (tokens, template index or None) pairs
+    rng = random.Random(seed)
+    template_tokens = [[rng.choice(vocabulary) for _ in range(rng.randint(8, 20))] for _ in range(templates)]
+    stream = []
+    for _ in range(count):
+        if rng.random() < campaign_fraction:
+            template = rng.randrange(templates)
+            stream.append((mutate(rng, template_tokens[template]), template))
+        else:
+            stream.append(([rng.choice(vocabulary) for _ in range(rng.randint(3, 25))], None))
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--templates', type=int, default=1000)
+    parser.add_argument('--campaign-fraction', type=float, default=0.3)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--num-perm', type=int, default=64)
+    parser.add_argument('--bands', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=2)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    vocabulary = sorted(vectorizer.vocabulary_)
+    print(f"Generating {args.messages:,} messages ({args.campaign_fraction:.0%} from {args.templates} templates)")
+    stream = message_stream(vocabulary, args.messages, args.templates, args.campaign_fraction, args.seed)
+    token_lists = [tokens for tokens, _ in stream]
+
+    rss_before = rss_mb()
+    index = CampaignIndex(args.num_perm, args.bands, args.rows, args.threshold, window=float('inf'),
+                          max_messages=args.messages + args.lookups)
+    report_every = max(args.messages // 5, args.chunk_size)
+    start = time.perf_counter()
+    mark, marked = start, 0
+    for offset in range(0, len(token_lists), args.chunk_size):
+        index.observe_many(token_lists[offset:offset + args.chunk_size])
+        done = offset + args.chunk_size
+        if done % report_every < args.chunk_size or done >= len(token_lists):
+            now = time.perf_counter()
+            done = min(done, len(token_lists))
+            print(f"  {done:>10,} indexed  {(done - marked) / (now - mark):>9,.0f} msg/s"
+                  f"  {len(index.campaigns):>9,} campaigns  RSS +{rss_mb() - rss_before:,.0f}MB")
+            mark, marked = now, done
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(token_lists):,} messages in {elapsed:.1f}s ({len(token_lists) / elapsed:,.0f} msg/s); "
+          f"index holds {rss_mb() - rss_before:,.0f}MB, "
+          f"{(rss_mb() - rss_before) * 1024 * 1024 / len(token_lists):,.0f} bytes per message")
+
+    # Recall: mutations in their template's largest campaign. Membership is
+    # read back from the index, since a message's campaign only exists once
+    # a second one joins it (and before the lookups below add duplicates).
+    campaigns = index.campaign_of[:len(stream)]
+    by_template = {}
+    for (_, template), campaign in zip(stream, campaigns):
+        if template is not None and campaign is not None:
+            counts = by_template.setdefault(template, {})
+            counts[campaign.id] = counts.get(campaign.id, 0) + 1
+    mutations = sum(template is not None for _, template in stream)
+    grouped = sum(max(counts.values()) for counts in by_template.values())
+    # Unrelated messages that joined a campaign
+    unrelated = len(stream) - mutations
+    merged = sum(template is None and campaign is not None for (_, template), campaign in zip(stream, campaigns))
+    print(f"Mutations in their template's main campaign: {grouped / mutations:.1%}; "
+          f"unrelated messages merged into a campaign: {merged / unrelated:.2%}")
+
+    rng = random.Random(args.seed + 1)
+    probes = [stream[rng.randrange(len(stream))][0] for _ in range(args.lookups)]
+    timings = []
+    for tokens in probes:
+        begin = time.perf_counter()
+        index.observe(tokens)
+        timings.append((time.perf_counter() - begin) * 1e6)
+    stats = percentiles(timings)
+    print(f"Lookup+insert into the full index: p50 {stats['p50']:.1f}us  p95 {stats['p95']:.1f}us  p99 {stats['p99']:.1f}us")
+
+    window = 10000
+    small = CampaignIndex(args.num_perm, args.bands, args.rows, args.threshold, window=1.0, max_messages=window)
+    start = time.perf_counter()
+    for offset in range(0, len(token_lists), args.chunk_size):
+        # Each chunk one simulated second later, so the time window evicts too
+        small.observe_many(token_lists[offset:offset + args.chunk_size], now=offset / args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Streaming through a {window:,}-message, 1s window: {len(token_lists) / elapsed:,.0f} msg/s, "
+          f"{small.evicted:,} evicted, {small.stats()['messages']:,} held")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Parity check and model-time benchmark for the compiled scoring table.
+
+    python benchmarks/bench_compiled.py [--count 5000]
+
+Exits non-zero if the compiled scorer disagrees with the sklearn path on any
+message of the corpus.
+"""
+import argparse
+import sys
+
+from common import corpus, load_pickles, report, time_each
+
+from preprocessing import tokenize
+from scoring import CompiledScorer, ScoringEngine
+
+
+def check_parity(engine, compiled, texts, tolerance=1e-9):
+    failures = 0
+    for text, expected, actual in zip(texts, engine.score(texts), compiled.score(texts)):
+        if (expected.label != actual.label
+                or abs(expected.spam_probability - actual.spam_probability) > tolerance
+                or abs(expected.log_odds - actual.log_odds) > tolerance * max(1, abs(expected.log_odds))):
+            failures += 1
+            if failures <= 5:
+                print(f"MISMATCH {text!r}: {expected} != {actual}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    args = parser.parse_args()
+
+    vectorizer, model = load_pickles()
+    engine = ScoringEngine(vectorizer, model)
+    compiled = CompiledScorer.from_sklearn(vectorizer, model)
+    texts = [tokenize(message) for message in corpus(vectorizer, args.count)]
+
+    failures = check_parity(engine, compiled, texts)
+    print(f"parity: {len(texts) - failures}/{len(texts)} messages match")
+
+    report('sklearn score_one', time_each(engine.score_one, texts[:1000]))
+    report('compiled score_one', time_each(compiled.score_one, texts, repeat=3))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Hashing vectorizer versus the vocabulary TfidfVectorizer: accuracy, latency, memory.
+
+    python benchmarks/bench_hashing.py [--data SMSSpamCollection] [--n-features 14 16 18 20]
+
+Trains MultinomialNB on the same training split with TfidfVectorizer (the
+current pipeline) and with HashingTfidfVectorizer at each width (2**N
+columns), then reports on the held-out split:
+
+- accuracy, spam precision and recall, and agreement with the shipped
+  tfidf_vectorizer.pkl/nb_model.pkl;
+- ScoringEngine.score_one latency;
+- the pickled size of the vectorizer and model, and the memory they take
+  once loaded (measured with tracemalloc while unpickling).
+
+Without --data, the labelled messages are sampled from the shipped model's
+per-class word distributions (see common.labeled_corpus). That exercises the
+pipeline but not real-world accuracy, so pass the SMS Spam Collection (or a
+label/message CSV) for accuracy numbers that mean something.
+"""
+import argparse
+import pickle
+import random
+import sys
+import tracemalloc
+
+from common import labeled_corpus, load_pickles, percentiles, time_each
+
+from dataset import read_labeled_messages
+from hashing import hashing_alpha, make_hashing_vectorizer
+from preprocessing import preprocess_text, tokenize
+from scoring import ScoringEngine
+
+
+def loaded_size(obj):
+    # Bytes allocated to unpickle obj, i.e. its in-memory footprint
+    data = pickle.dumps(obj)
+    tracemalloc.start()
+    loaded = pickle.loads(data)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    return len(data), size
+
+
+def evaluate(name, vectorizer, model, test, reference_labels):
+    engine = ScoringEngine(vectorizer, model)
+    token_lists = [tokens for tokens, _ in test]
+    predicted = [str(score.label) for score in engine.score(token_lists)]
+    truth = [label for _, label in test]
+    true_spam = sum(p == t == 'spam' for p, t in zip(predicted, truth))
+    predicted_spam = predicted.count('spam')
+    actual_spam = truth.count('spam')
+    timings = time_each(engine.score_one, token_lists[:2000])
+    stats = percentiles(timings, (50, 99))
+    vectorizer_bytes, vectorizer_loaded = loaded_size(vectorizer)
+    model_bytes, model_loaded = loaded_size(model)
+    print(f"{name:<22} {sum(p == t for p, t in zip(predicted, truth)) / len(test):>8.2%}"
+          f" {true_spam / predicted_spam if predicted_spam else 0:>8.2%}"
+          f" {true_spam / actual_spam if actual_spam else 0:>8.2%}"
+          f" {sum(p == r for p, r in zip(predicted, reference_labels)) / len(test):>8.2%}"
+          f" {stats['p50']:>7.1f}us {stats['p99']:>7.1f}us"
+          f" {vectorizer_bytes / 1024:>8.0f}K {vectorizer_loaded / 1024:>8.0f}K"
+          f" {model_bytes / 1024:>8.0f}K {model_loaded / 1024:>8.0f}K")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', help='labelled messages (SMS Spam Collection TSV or label/message CSV)')
+    parser.add_argument('--count', type=int, default=20000, help='synthetic messages when --data is not given')
+    parser.add_argument('--n-features', type=int, nargs='+', default=[14, 16, 18, 20], help='hashing widths as powers of two')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+
+    shipped_vectorizer, shipped_model = load_pickles()
+    if args.data:
+        pairs = list(read_labeled_messages(args.data))
+        source = args.data
+    else:
+        pairs = labeled_corpus(shipped_vectorizer, shipped_model, args.count, args.seed)
+        source = 'synthetic messages sampled from the shipped model'
+    random.Random(args.seed).shuffle(pairs)
+    split = int(len(pairs) * (1 - args.test_fraction))
+    train_texts = [preprocess_text(message) for message, _ in pairs[:split]]
+    train_labels = [label for _, label in pairs[:split]]
+    test = [(tokenize(message), label) for message, label in pairs[split:]]
+
+    shipped = ScoringEngine(shipped_vectorizer, shipped_model)
+    reference_labels = [str(score.label) for score in shipped.score([tokens for tokens, _ in test])]
+
+    print(f"{len(pairs):,} messages from {source}; {split:,} train / {len(test):,} test")
+    print(f"{'vectorizer':<22} {'accuracy':>8} {'spam P':>8} {'spam R':>8} {'agree':>8} {'p50':>9} {'p99':>9}"
+          f" {'vec pkl':>9} {'vec mem':>9} {'nb pkl':>9} {'nb mem':>9}")
+    evaluate('shipped pickles', shipped_vectorizer, shipped_model, test, reference_labels)
+
+    vectorizer = TfidfVectorizer()
+    model = MultinomialNB().fit(vectorizer.fit_transform(train_texts), train_labels)
+    evaluate(f'tfidf ({len(vectorizer.vocabulary_)} terms)', vectorizer, model, test, reference_labels)
+
+    for bits in args.n_features:
+        vectorizer = make_hashing_vectorizer(2 ** bits)
+        features = vectorizer.fit_transform(train_texts)
+        model = MultinomialNB().fit(features, train_labels)
+        evaluate(f'hashing 2**{bits}', vectorizer, model, test, reference_labels)
+        # Laplace smoothing adds alpha to every column, used or not, so at
+        # the same alpha wide tables drown the observed counts
+        alpha = hashing_alpha(features)
+        model = MultinomialNB(alpha=alpha).fit(features, train_labels)
+        evaluate(f'  alpha={alpha:.3g}', vectorizer, model, test, reference_labels)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Cold boot time of `import app` in a fresh interpreter.
+
+    python benchmarks/bench_import.py [--runs 5] [--artifacts model_artifacts]
+
+Times the import for the pickled model (SCORING_MODE=sklearn, which has to
+import sklearn to unpickle it) and for mapped artifacts (SCORING_MODE=mapped,
+no sklearn), then lists the slowest top-level imports from -X importtime.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, load_pickles
+
+CODE = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "assert app.registry.current is not None\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def boot_times(env, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', CODE], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]) * 1000)
+    return timings
+
+
+def slowest_imports(env, count=10):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    # -X importtime lists children before their parent, indented two spaces
+    # per level, so app's direct imports are the depth-1 rows just before it
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'app':
+                break
+            rows = []
+        elif depth == 1:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--artifacts', help='model artifact directory (exported to a temp dir if omitted)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.artifacts
+        if directory is None:
+            from artifacts import export_artifacts
+            directory = os.path.join(tmp, 'model_artifacts')
+            export_artifacts(*load_pickles(), directory)
+
+        modes = {
+            'sklearn': dict(os.environ, SCORING_MODE='sklearn'),
+            'mapped': dict(os.environ, SCORING_MODE='mapped', MODEL_ARTIFACT_DIR=directory),
+        }
+        for mode, env in modes.items():
+            timings = boot_times(env, args.runs)
+            print(f"import app ({mode:<7}) median {statistics.median(timings):7.1f}ms"
+                  f"  min {min(timings):7.1f}ms")
+
+        print("\nslowest imports of app.py (mapped, cumulative ms):")
+        for cumulative, name in slowest_imports(modes['mapped']):
+            print(f"  {cumulative:8.1f}  {name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
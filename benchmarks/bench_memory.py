@@ -0,0 +1,125 @@
+"""Per-worker memory and cold-start time: pickled model versus mapped artifacts.
+
+    python benchmarks/bench_memory.py [--workers 4] [--artifacts model_artifacts]
+
+For each model format, N worker processes are forked the way gunicorn does
+it. With preload the model is loaded in the parent before forking; without
+it, each worker loads its own copy. Every worker scores a few hundred
+messages and then reports RSS and PSS (proportional set size, which splits
+shared pages between the processes that map them), read from
+/proc/<pid>/smaps_rollup while all workers are alive. Cold start is the time
+to import and load a model in a fresh interpreter.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, SAMPLE_MESSAGES, load_pickles
+
+LOADERS = {
+    'pickle': (
+        "import pickle\n"
+        "from scoring import ScoringEngine\n"
+        "engine = ScoringEngine(pickle.load(open('tfidf_vectorizer.pkl', 'rb')),"
+        " pickle.load(open('nb_model.pkl', 'rb')))\n"
+    ),
+    'mapped': (
+        "from artifacts import load_artifacts\n"
+        "engine = load_artifacts({directory!r})\n"
+    ),
+}
+
+
+def load_engine(kind, directory):
+    namespace = {}
+    exec(LOADERS[kind].format(directory=directory), namespace)
+    return namespace['engine']
+
+
+def cold_start(kind, directory, runs=3):
+    code = ("import time\nstart = time.perf_counter()\n" + LOADERS[kind].format(directory=directory)
+            + "print(time.perf_counter() - start)\n")
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def fork_workers(kind, directory, workers, preload):
+    # Runs in a fresh interpreter, so only what this configuration needs is
+    # imported before forking
+    from preprocessing import tokenize
+    token_lists = [tokenize(message) for message in SAMPLE_MESSAGES * 10]
+    engine = load_engine(kind, directory) if preload else None
+    pids = []
+    ready_read, ready_write = os.pipe()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            worker_engine = engine or load_engine(kind, directory)
+            worker_engine.score(token_lists)
+            os.write(ready_write, b'.')
+            signal.pause()
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_write)
+    received = 0
+    while received < workers:
+        received += len(os.read(ready_read, workers))
+    os.close(ready_read)
+    usage = [memory_kb(pid) for pid in pids]
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    rss = sum(u['Rss'] for u in usage) / len(usage) / 1024
+    pss = sum(u['Pss'] for u in usage) / len(usage) / 1024
+    label = f"{kind}{' + preload' if preload else ''}"
+    print(f"{label:<17} {workers} workers: RSS {rss:6.1f}MB  PSS {pss:6.1f}MB per worker")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--artifacts', help='model artifact directory (exported to a temp dir if omitted)')
+    parser.add_argument('--run', nargs=2, metavar=('KIND', 'PRELOAD'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    if args.run:
+        fork_workers(args.run[0], args.artifacts, args.workers, args.run[1] == 'preload')
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.artifacts
+        if directory is None:
+            from artifacts import export_artifacts
+            directory = os.path.join(tmp, 'model_artifacts')
+            export_artifacts(*load_pickles(), directory)
+
+        for kind in LOADERS:
+            print(f"{kind:<7} cold start {cold_start(kind, directory) * 1000:7.1f}ms")
+        for kind in LOADERS:
+            for preload in ('fork', 'preload'):
+                subprocess.run([sys.executable, __file__, '--run', kind, preload, '--workers', str(args.workers),
+                                '--artifacts', directory], check=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
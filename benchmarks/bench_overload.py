@@ -0,0 +1,230 @@
+"""Overload test: latency of admitted requests with and without admission control.
+
+    python benchmarks/bench_overload.py [--overload 5] [--duration 10] [--server sync|asgi]
+    python benchmarks/bench_overload.py --simulate [--overload 5] [--backlog 64] [--overhead-us 150]
+
+Starts the server (gunicorn sync workers as in the Procfile, or uvicorn in
+the ASGI mode) on a free local port with the prediction cache disabled, and
+measures its capacity with --concurrency closed-loop clients. It then offers
+--overload times that rate open-loop for --duration seconds: requests go out
+on schedule whether or not earlier ones have been answered, as independent
+clients send them, each stamped with X-Request-Start as a router would.
+
+That runs once with admission control off and once with
+ADMISSION_MAX_QUEUE_MS and REQUEST_DEADLINE_MS set (plus ASYNC_MAX_PENDING
+for asgi). Each run reports:
+
+- the latency percentiles of answered requests;
+- how many requests were answered, rejected (429/503) or abandoned by the
+  client after --timeout seconds.
+
+Server and load generator share the machine, so run it with spare cores.
+
+With --simulate, no server is started: the app is called in-process the way
+one gunicorn sync worker serves its accept queue, one request at a time in
+arrival order. Each call takes its real time, and arrivals run on a virtual
+clock, so the load generator costs nothing. --overhead-us adds gunicorn's own
+per-request cost. --backlog bounds the queue as gunicorn's backlog setting
+does: arrivals that find it full are refused by the kernel, never reaching
+the worker. Requests still queued --timeout seconds after arriving are
+counted as abandoned, but the worker serves them anyway, as a sync worker
+does.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+from werkzeug.test import EnvironBuilder
+
+from bench_async import free_port, load, wait_for_port
+from common import ROOT, corpus, load_pickles, percentiles
+
+
+def service(app, body, waited, statuses):
+    # Serve one request that waited `waited` seconds; returns its status and
+    # the time it took
+    environ = EnvironBuilder(path='/predict', method='POST', data=body, content_type='application/json',
+                             headers={'X-Request-Start': f't={time.time() - waited:.6f}'}).get_environ()
+    begin = time.perf_counter()
+    b''.join(app(environ, lambda status, headers: statuses.append(int(status.split()[0]))))
+    return statuses.pop(), time.perf_counter() - begin
+
+
+def simulate(name, bodies, rate, args, limited):
+    # Drive the app in-process as a single sync worker with a FIFO backlog
+    import app
+
+    app.app.wsgi_app.max_queue_seconds = args.max_queue_ms / 1000 if limited else 0
+    app.app.wsgi_app.deadline_seconds = args.deadline_ms / 1000 if limited else 0
+    rng = random.Random(0)
+    count = int(rate * args.duration)
+    statuses = []
+    clock = 0.0
+    arrived = 0
+    backlog = deque()
+    answered, rejected, abandoned = [], 0, 0
+    while arrived < count or backlog:
+        while arrived < count and arrived / rate <= clock:
+            if args.backlog and len(backlog) >= args.backlog:
+                rejected += 1  # refused by the kernel
+            else:
+                backlog.append(arrived / rate)
+            arrived += 1
+        if not backlog:
+            clock = arrived / rate
+            continue
+        started = backlog.popleft()
+        status, seconds = service(app.app, rng.choice(bodies), clock - started, statuses)
+        clock += seconds + args.overhead_us / 1e6
+        if clock - started > args.timeout:
+            abandoned += 1
+        elif status == 200:
+            answered.append((clock - started) * 1000)
+        else:
+            rejected += 1
+    report(name, rate, answered, rejected, abandoned, count, max(clock, args.duration))
+
+
+def simulated_capacity(bodies, args):
+    import app
+
+    rng = random.Random(1)
+    statuses = []
+    total = sum(service(app.app, rng.choice(bodies), 0, statuses)[1] for _ in range(2000))
+    return 2000 / (total + 2000 * args.overhead_us / 1e6)
+
+
+def report(name, offered, answered, rejected, abandoned, total, elapsed):
+    stats = percentiles(answered) if answered else {'p50': 0, 'p99': 0}
+    print(f"{name:<22} {offered:>7,.0f} req/s offered  {len(answered) / elapsed:>7,.0f} answered"
+          f"  p50 {stats['p50']:8.1f}ms  p99 {stats['p99']:8.1f}ms"
+          f"  rejected {rejected / total:6.1%}  abandoned {abandoned / total:6.1%}")
+
+
+async def send(port, body, timeout):
+    # One request on its own connection; returns (status, seconds), with
+    # status None if the client gave up
+    start = time.perf_counter()
+    connection = []
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        connection.append(writer)
+        writer.write(b'POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                     b'Connection: close\r\nX-Request-Start: t=%.6f\r\nContent-Length: %d\r\n\r\n%s'
+                     % (time.time(), len(body), body))
+        await writer.drain()
+        headers = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower().split('\r\n')
+        length = next(int(line.split(':', 1)[1]) for line in headers if line.startswith('content-length:'))
+        await reader.readexactly(length)
+        return int(headers[0].split()[1])
+
+    try:
+        status = await asyncio.wait_for(exchange(), timeout)
+    except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError):
+        status = None
+    finally:
+        for writer in connection:
+            writer.close()
+    return status, time.perf_counter() - start
+
+
+async def open_loop(port, bodies, rate, duration, timeout, seed=0):
+    rng = random.Random(seed)
+    tasks = []
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        due = start + sent / rate
+        if due - start >= duration:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(port, rng.choice(bodies), timeout)))
+        sent += 1
+    results = await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def run(name, command, env, bodies, rate, args):
+    port = free_port()
+    process = subprocess.Popen([part.format(port=port) for part in command], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        asyncio.run(load(port, bodies, args.concurrency, 1))  # warm up
+        if rate is None:
+            latencies, _, elapsed = asyncio.run(load(port, bodies, args.concurrency, args.duration))
+            return len(latencies) / elapsed
+        results, elapsed = asyncio.run(open_loop(port, bodies, rate, args.duration, args.timeout))
+    finally:
+        process.terminate()
+        process.wait()
+
+    answered = [seconds * 1000 for status, seconds in results if status == 200]
+    rejected = sum(status in (429, 503) for status, _ in results)
+    abandoned = sum(status is None for status, _ in results)
+    report(name, len(results) / elapsed, answered, rejected, abandoned, len(results), elapsed)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', choices=['sync', 'asgi'], default='sync')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--overload', type=float, default=5, help='offered load as a multiple of capacity')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=8, help='closed-loop clients measuring capacity')
+    parser.add_argument('--timeout', type=float, default=5, help='seconds before a client gives up')
+    parser.add_argument('--max-queue-ms', type=float, default=100)
+    parser.add_argument('--deadline-ms', type=float, default=250)
+    parser.add_argument('--max-pending', type=int, default=256, help='ASYNC_MAX_PENDING for asgi')
+    parser.add_argument('--count', type=int, default=2000, help='distinct messages to send')
+    parser.add_argument('--simulate', action='store_true', help='run one simulated sync worker in-process')
+    parser.add_argument('--backlog', type=int, default=2048, help='simulated accept queue (0 for no limit)')
+    parser.add_argument('--overhead-us', type=float, default=0, help="simulated gunicorn cost per request")
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    bodies = [json.dumps({'message': message}).encode() for message in corpus(vectorizer, args.count)]
+    if args.simulate:
+        os.environ['PREDICTION_CACHE_SIZE'] = '0'
+        os.chdir(ROOT)  # where app.py finds the model
+        capacity = simulated_capacity(bodies, args)
+        rate = capacity * args.overload
+        print(f"Simulated sync worker, backlog {args.backlog or 'unbounded'}: capacity {capacity:,.0f} req/s; "
+              f"offering {args.overload:g}x ({rate:,.0f} req/s) for {args.duration:g}s")
+        simulate('0.8x, no limits', bodies, capacity * 0.8, args, False)
+        simulate(f'{args.overload:g}x, no limits', bodies, rate, args, False)
+        simulate(f'{args.overload:g}x, admission', bodies, rate, args, True)
+        return 0
+
+    env = dict(os.environ, PREDICTION_CACHE_SIZE='0')
+    if args.server == 'sync':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--workers', str(args.workers),
+                   '--bind', '127.0.0.1:{port}']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', str(args.workers),
+                   '--log-level', 'warning', '--port', '{port}']
+    limited = dict(env, ADMISSION_MAX_QUEUE_MS=str(args.max_queue_ms), REQUEST_DEADLINE_MS=str(args.deadline_ms),
+                   ASYNC_MAX_PENDING=str(args.max_pending))
+
+    capacity = run('capacity', command, env, bodies, None, args)
+    rate = capacity * args.overload
+    print(f"{args.server} server, {args.workers} worker(s): capacity {capacity:,.0f} req/s; "
+          f"offering {args.overload:g}x ({rate:,.0f} req/s) for {args.duration:g}s")
+    run('0.8x, no limits', command, env, bodies, capacity * 0.8, args)
+    run(f'{args.overload:g}x, no limits', command, env, bodies, rate, args)
+    run(f'{args.overload:g}x, admission', command, limited, bodies, rate, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
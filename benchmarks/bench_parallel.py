@@ -0,0 +1,78 @@
+"""Scaling of ProcessPoolScorer with the number of worker processes.
+
+    python benchmarks/bench_parallel.py [--batch 10000] [--cores 1 2 4 8] [--mode sklearn]
+
+Scores one large batch of token lists in the calling process (1 worker),
+then with pools of each size, and reports throughput and speedup. The second
+column times the whole offline path (tokenizing in the workers too), as
+bulk_score.py runs it.
+Results depend on the cores actually available: with fewer cores than
+workers, the extra processes only add scheduling and IPC overhead.
+"""
+import argparse
+import os
+import sys
+import time
+
+from common import corpus, load_pickles
+
+from parallel import ProcessPoolScorer
+from preprocessing import tokenize
+from registry import load_engine
+
+engine = None
+
+
+def tokenize_and_score(messages):
+    return engine.score([tokenize(message) for message in messages])
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    global engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--mode', choices=['sklearn', 'compiled'], default='sklearn')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='messages per task in the offline path')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    messages = corpus(vectorizer, args.batch)
+    token_lists = [tokenize(message) for message in messages]
+    chunks = [messages[i:i + args.chunk_size] for i in range(0, len(messages), args.chunk_size)]
+    engine = load_engine(args.mode, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))[0]
+    expected = engine.score(token_lists)
+
+    print(f"{args.batch:,} messages, {args.mode} engine, {os.cpu_count()} CPU(s) available")
+    print(f"{'workers':>8} {'score msg/s':>12} {'speedup':>8} {'offline msg/s':>14} {'speedup':>8}")
+    base_score = base_offline = None
+    for workers in args.cores:
+        scorer = ProcessPoolScorer(engine, workers, min_batch_size=1)
+        try:
+            assert scorer.score(token_lists) == expected  # also starts the pool
+            score_time = best_of(lambda: scorer.score(token_lists), args.repeat)
+            offline_time = best_of(lambda: list(scorer.imap(tokenize_and_score, chunks)), args.repeat)
+        finally:
+            scorer.close()
+        score_rate = args.batch / score_time
+        offline_rate = args.batch / offline_time
+        base_score = base_score or score_rate
+        base_offline = base_offline or offline_rate
+        print(f"{workers:>8} {score_rate:>12,.0f} {score_rate / base_score:>7.2f}x"
+              f" {offline_rate:>14,.0f} {offline_rate / base_offline:>7.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Micro-benchmark of the tokenizer against the original preprocess_text.
+
+    python benchmarks/bench_preprocess.py [--count 5000]
+
+Checks that ``tokenize`` produces the same output as the original regex
+implementation, then times preprocessing alone and preprocessing plus
+vectorization (string re-tokenized by the vectorizer versus token lists fed
+through the pre-tokenized analyzer).
+"""
+import argparse
+import re
+import sys
+
+from common import corpus, load_pickles, report, time_each
+
+from preprocessing import STOP_WORDS, preprocess_text, tokenize
+from scoring import ScoringEngine
+
+
+def legacy_preprocess_text(text):
+    text = text.lower()
+    text = re.sub(r'[^a-z\s]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    tokens = [w for w in text.split() if w not in STOP_WORDS]
+    return " ".join(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    args = parser.parse_args()
+
+    vectorizer, model = load_pickles()
+    engine = ScoringEngine(vectorizer, model)
+    messages = corpus(vectorizer, args.count)
+
+    mismatches = [m for m in messages if legacy_preprocess_text(m) != preprocess_text(m)]
+    print(f"identical output: {len(messages) - len(mismatches)}/{len(messages)} messages")
+
+    report('legacy preprocess_text', time_each(legacy_preprocess_text, messages, repeat=3))
+    report('tokenize', time_each(tokenize, messages, repeat=3))
+    report('legacy + transform', time_each(
+        lambda m: vectorizer.transform([legacy_preprocess_text(m)]), messages[:1000]))
+    report('tokenize + vectorize', time_each(
+        lambda m: engine.vectorize([tokenize(m)]), messages[:1000]))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Quantized model artifacts: agreement with the float64 model, size and latency.
+
+    python benchmarks/bench_quantized.py [--count 50000] [--precisions float64 float16 int8]
+
+Exports the pickled model as mapped artifacts at each precision into a
+temporary directory and scores --count messages (sampled from the model's
+own word distributions, so they exercise the whole vocabulary) with each.
+Results are compared with the sklearn engine on the float64 pickles:
+
+- how often the predicted label agrees;
+- the largest change in spam probability;
+- accuracy against the sampled labels;
+- the bytes of the idf and log-probability arrays and of the whole directory;
+- single-message latency.
+
+The arrays the pickles hold in every worker, training-only feature_count_
+included, are listed for comparison.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from common import labeled_corpus, load_pickles, report, time_each
+
+from artifacts import PRECISIONS, export_artifacts, load_artifacts
+from preprocessing import tokenize
+from scoring import ScoringEngine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=50000)
+    parser.add_argument('--precisions', nargs='+', choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument('--latency-count', type=int, default=5000)
+    args = parser.parse_args()
+
+    vectorizer, model = load_pickles()
+    pairs = labeled_corpus(vectorizer, model, args.count)
+    token_lists = [tokenize(message) for message, _ in pairs]
+    truth = [label for _, label in pairs]
+    reference = ScoringEngine(vectorizer, model).score(token_lists)
+    reference_labels = [str(score.label) for score in reference]
+    accuracy = sum(p == t for p, t in zip(reference_labels, truth)) / len(truth)
+
+    arrays = {'feature_count_': model.feature_count_.nbytes, 'feature_log_prob_': model.feature_log_prob_.nbytes,
+              'idf_': vectorizer.idf_.nbytes}
+    print(f"Pickled float64 arrays: " + ', '.join(f"{name} {size / 1024:,.0f}KB" for name, size in arrays.items())
+          + f" ({len(vectorizer.idf_):,} terms)")
+    print(f"sklearn float64 accuracy on {len(pairs):,} sampled messages: {accuracy:.2%}")
+
+    with tempfile.TemporaryDirectory() as root:
+        for precision in args.precisions:
+            directory = os.path.join(root, precision)
+            export_artifacts(vectorizer, model, directory, precision=precision)
+            scorer = load_artifacts(directory)
+            scores = scorer.score(token_lists)
+            labels = [str(score.label) for score in scores]
+            agree = sum(a == b for a, b in zip(labels, reference_labels)) / len(labels)
+            drift = max(abs(a.spam_probability - b.spam_probability) for a, b in zip(scores, reference))
+            correct = sum(p == t for p, t in zip(labels, truth)) / len(truth)
+            weights = sum(os.path.getsize(os.path.join(directory, name)) for name in ('idf.npy', 'log_prob.npy'))
+            total = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print(f"{precision:<8} agreement {agree:8.4%}  max probability change {drift:.2e}  accuracy {correct:.2%}"
+                  f"  idf+log_prob {weights / 1024:6,.1f}KB  directory {total / 1024:6,.1f}KB")
+            report(f'  {precision} score_one', time_each(scorer.score_one, token_lists[:args.latency_count]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
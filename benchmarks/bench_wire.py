@@ -0,0 +1,106 @@
+"""Wire encodings for /predict and /predict/batch: bytes and CPU per request.
+
+    python benchmarks/bench_wire.py [--count 2000] [--batch-size 100]
+
+Calls the Flask app in-process (no sockets) with each encoding:
+
+- json: the json module (what jsonify and get_json use);
+- orjson: used by codec.py when it is installed;
+- msgpack: Content-Type and Accept application/msgpack.
+
+Each runs with the message echoed in the response and without it (?echo=0).
+For single messages and for batches of --batch-size it reports:
+
+- request and response bytes;
+- the CPU time of decoding the request body and encoding the response;
+- the CPU time of the whole request through Flask.
+
+The prediction cache is warmed first, so scoring is a cache hit and the
+numbers isolate the request path. Variants whose package is not installed
+are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from werkzeug.test import EnvironBuilder
+
+from common import ROOT, corpus, load_pickles
+
+import codec
+
+VARIANTS = [
+    ('json', 'json', True),
+    ('json, no echo', 'json', False),
+    ('orjson', 'orjson', True),
+    ('orjson, no echo', 'orjson', False),
+    ('msgpack', 'msgpack', True),
+    ('msgpack, no echo', 'msgpack', False),
+]
+
+
+def cpu_per_call(func, items):
+    # Mean process CPU time per call, in microseconds
+    start = time.process_time()
+    for item in items:
+        func(item)
+    return (time.process_time() - start) / len(items) * 1e6
+
+
+def run(app, name, encoding, echo, path, payloads):
+    if encoding == 'msgpack':
+        mimetype = codec.MSGPACK
+        bodies = [codec.msgpack.packb(payload) for payload in payloads]
+    else:
+        mimetype = codec.JSON
+        bodies = [json.dumps(payload).encode() for payload in payloads]
+    query = '' if echo else '?echo=0'
+
+    def environ(body):
+        return EnvironBuilder(path=path + query, method='POST', data=body, content_type=mimetype,
+                              headers={'Accept': mimetype}).get_environ()
+
+    responses = []
+    for body in bodies:
+        responses.append(b''.join(app(environ(body), lambda status, headers: None)))
+    environs = [environ(body) for body in bodies]
+    request_us = cpu_per_call(lambda e: b''.join(app(e, lambda status, headers: None)), environs)
+    decoded = [codec.decode(mimetype, response) for response in responses]
+    codec_us = (cpu_per_call(lambda body: codec.decode(mimetype, body), bodies)
+                + cpu_per_call(lambda data: codec.encode(data, mimetype), decoded))
+    request_bytes = sum(map(len, bodies)) / len(bodies)
+    response_bytes = sum(map(len, responses)) / len(responses)
+    print(f"  {name:<18} request {request_bytes:>8,.0f}B  response {response_bytes:>8,.0f}B"
+          f"  decode+encode {codec_us:8.1f}us  whole request {request_us:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    messages = corpus(vectorizer, args.count)
+    os.chdir(ROOT)  # where app.py finds the model
+    import app
+
+    orjson = codec.orjson
+    singles = [{'message': message} for message in messages]
+    batches = [{'messages': messages[i:i + args.batch_size]} for i in range(0, len(messages), args.batch_size)]
+    for path, payloads in (('/predict', singles), ('/predict/batch', batches)):
+        print(f"{path} ({len(payloads):,} requests)")
+        for name, encoding, echo in VARIANTS:
+            if encoding == 'msgpack' and codec.msgpack is None or encoding == 'orjson' and orjson is None:
+                print(f"  {name:<18} skipped: {encoding} is not installed")
+                continue
+            codec.orjson = orjson if encoding == 'orjson' else None
+            run(app.app, name, encoding, echo, path, payloads)
+    codec.orjson = orjson
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+import pickle
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Hand-written SMS-style messages, roughly half spam and half ham
+SAMPLE_MESSAGES = [
+    "WINNER!! As a valued network customer you have been selected to receive a £900 prize reward! To claim call 09061701461.",
+    "Free entry in 2 a wkly comp to win FA Cup final tkts 21st May 2005. Text FA to 87121 to receive entry question",
+    "URGENT! You have won a 1 week FREE membership in our £100,000 Prize Jackpot! Txt the word: CLAIM to No: 81010",
+    "Had your mobile 11 months or more? U R entitled to Update to the latest colour mobiles with camera for Free! Call The Mobile Update Co FREE on 08002986030",
+    "SIX chances to win CASH! From 100 to 20,000 pounds txt> CSH11 and send to 87575. Cost 150p/day, 6days, 16+ TsandCs apply Reply HL 4 info",
+    "Congratulations ur awarded 500 of CD vouchers or 125gift guaranteed & Free entry 2 100 wkly draw txt MUSIC to 87066",
+    "You have 1 new voicemail. Please call 08719181513 now to retrieve it.",
+    "Your credit card has been suspended. Reply with your account details to restore access immediately.",
+    "Congrats! You've won an iPhone 15. Claim your gift at the link before it expires tonight",
+    "Get cheap insurance quotes now! Text STOP to opt out. Msg&data rates may apply",
+    "Private! Your 2003 Account Statement for shows 800 un-redeemed S. I. M. points. Call 08715203694 Identifier Code: 40533 Expires 31/10/04",
+    "Dear customer, your mobile number has won £2000 cash. To claim call our customer service on 09066364589",
+    "FREE MSG: We billed your mobile number by mistake. Call 0800 to get your money back now",
+    "Hey, are we still on for lunch tomorrow?",
+    "I'm gonna be home soon and i don't want to talk about this stuff anymore tonight, k? I've cried enough today.",
+    "Ok lar... Joking wif u oni...",
+    "Nah I don't think he goes to usf, he lives around here though",
+    "Even my brother is not like to speak with me. They treat me like aids patent.",
+    "I HAVE A DATE ON SUNDAY WITH WILL!!",
+    "Oh k...i'm watching here:)",
+    "Eh u remember how 2 spell his name... Yes i did. He v naughty make until i v wet.",
+    "Fine if thats the way u feel. Thats the way its gota b",
+    "Is that seriously how you spell his name?",
+    "Can you pick up some milk on the way back? Thanks!",
+    "Sorry, I'll call later in the meeting",
+    "Did you catch the bus ? Are you frying an egg ? Did you make a tea? Are you eating your mom's left over dinner ? Do you feel my Love ?",
+    "Just forced myself to eat a slice. I'm really not hungry tho. This sucks. Mark is getting worried.",
+    "Happy birthday! Hope you have a great day, see you at the party tonight",
+    "Lol your always so convincing.",
+    "What time do you finish work? I'll pick you up",
+]
+
+
+def load_pickles():
+    with open(os.path.join(ROOT, 'nb_model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    with open(os.path.join(ROOT, 'tfidf_vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+    return vectorizer, model
+
+
+def synthetic_messages(vectorizer, count, seed=0):
+    # Random messages drawn from the model vocabulary mixed with noise tokens
+    rng = random.Random(seed)
+    vocabulary = sorted(vectorizer.vocabulary_)
+    noise = ['FREE!!!', '£1000', '0800-123-456', 'www.example.com', "don't", 'txt', 'u', '2', ':)', 'Ünïcödé']
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(vocabulary) if rng.random() < 0.8 else rng.choice(noise)
+                 for _ in range(rng.randint(1, 30))]
+        messages.append(' '.join(w.upper() if rng.random() < 0.1 else w for w in words))
+    return messages
+
+
+def labeled_corpus(vectorizer, model, count, seed=0, sharpness=2):
+    # Stand-in for a labelled dataset: (message, label) pairs whose words are
+    # drawn from the model's own per-class word distributions, with labels in
+    # proportion to its class priors. The smoothed distributions overlap by
+    # about 70%, far more than real spam and ham; raising them to `sharpness`
+    # brings that down (to about 25% at 2).
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    terms = np.array(sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get))
+    priors = np.exp(model.class_log_prior_)
+    word_probs = np.exp(model.feature_log_prob_ * sharpness)
+    word_probs /= word_probs.sum(axis=1, keepdims=True)
+    pairs = []
+    for label_index in rng.choice(len(priors), size=count, p=priors / priors.sum()):
+        words = rng.choice(terms, size=rng.integers(3, 25), p=word_probs[label_index])
+        pairs.append((' '.join(words), str(model.classes_[label_index])))
+    return pairs
+
+
+def corpus(vectorizer, count, seed=0):
+    # Sampled messages followed by synthetic ones, `count` in total
+    messages = SAMPLE_MESSAGES[:count]
+    return messages + synthetic_messages(vectorizer, count - len(messages), seed)
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    ordered = sorted(samples)
+    return {f'p{p}': ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+def time_each(func, items, repeat=1):
+    # Per-call latencies in microseconds
+    timings = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def report(name, timings):
+    stats = percentiles(timings)
+    total = sum(timings)
+    print(f"{name:<28} {len(timings) / (total / 1e6):>12,.0f}/s"
+          f"  p50 {stats['p50']:8.1f}us  p95 {stats['p95']:8.1f}us  p99 {stats['p99']:8.1f}us")
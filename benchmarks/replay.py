@@ -0,0 +1,151 @@
+"""Replay a captured request log as a load test.
+
+    python benchmarks/replay.py logs/requests-*.jsonl* [--mode compiled] [--cache 10000] [--limit N]
+    python benchmarks/replay.py logs/requests-*.jsonl* --port 8000 [--concurrency 16] [--speed 1]
+
+Reads the records written with REQUEST_LOG_PATH (plain or gzipped rotated
+files; the per-worker files are merged in time order) and sends their messages through the scoring path
+again, so benchmarks see real traffic: its message lengths, vocabulary and
+repeats.
+
+Without --port, each message is tokenized and scored one at a time by the
+engine for --mode, as /predict does, optionally behind a --cache entry LRU
+prediction cache to measure the hit rate the traffic would get. It reports
+throughput, latency percentiles and how many verdicts differ from the logged
+ones (expected when the model has changed since the capture).
+
+With --port, the messages are posted to /predict on a running server
+(gunicorn or uvicorn) on localhost by --concurrency clients. --speed 0 (the
+default) sends as fast as the clients can; --speed N replays the recorded
+arrival times N times faster, and reports how far the clients fell behind.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from bench_async import post
+from common import ROOT, percentiles, report, time_each
+
+from cache import PredictionCache, cache_key
+from preprocessing import tokenize
+from registry import load_engine
+from requestlog import read_request_log
+
+
+def replay_engine(records, args):
+    engine, _, _ = load_engine(args.mode, args.model_dir)
+    cache = PredictionCache(args.cache) if args.cache else None
+    flipped = 0
+
+    def score(record):
+        nonlocal flipped
+        tokens = tokenize(record['message'])
+        label = None
+        if cache is not None:
+            key = cache_key(tokens)
+            label = cache.get(key)
+        if label is None:
+            label = str(engine.score_one(tokens).label)
+            if cache is not None:
+                cache.set(key, label)
+        if label != record.get('prediction', label):
+            flipped += 1
+
+    score(records[0])  # warm up
+    flipped = 0
+    timings = time_each(score, records)
+    report(f'{args.mode} engine', timings)
+    if cache is not None:
+        print(f"Cache hit rate: {cache.stats()['hit_rate']:.1%}")
+    versions = sorted({record.get('model_version') for record in records} - {None})
+    print(f"Verdicts differing from the log: {flipped:,} of {len(records):,} "
+          f"(logged by model {', '.join(versions) or 'unknown'})")
+
+
+async def replay_http(records, args):
+    pending = asyncio.Queue(args.concurrency * 4)
+    latencies = []
+    lag = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        connection = None
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            body, due = item
+            start = time.perf_counter()
+            if due is not None:
+                lag.append(max(0.0, start - due) * 1000)
+            try:
+                status, connection = await post(connection, args.port, body)
+            except (OSError, asyncio.IncompleteReadError):
+                errors += 1
+                connection = None
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors += 1
+
+    clients = [asyncio.create_task(client()) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    first = records[0].get('time', 0)
+    for record in records:
+        due = None
+        if args.speed:
+            due = start + (record.get('time', first) - first) / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await pending.put((json.dumps({'message': record['message']}).encode(), due))
+    for _ in clients:
+        await pending.put(None)
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+
+    stats = percentiles(latencies)
+    print(f"{len(latencies) / elapsed:>8,.0f} req/s  p50 {stats['p50']:7.2f}ms  p95 {stats['p95']:7.2f}ms"
+          f"  p99 {stats['p99']:7.2f}ms  errors {errors}")
+    if lag:
+        stats = percentiles(lag)
+        print(f"Behind schedule: p50 {stats['p50']:.1f}ms  p99 {stats['p99']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('logs', nargs='+', help='request log files, plain or .gz')
+    parser.add_argument('--limit', type=int, help='replay at most this many records')
+    parser.add_argument('--mode', choices=['sklearn', 'compiled', 'mapped'], default='sklearn')
+    parser.add_argument('--model-dir', default=ROOT, help='model directory (the artifacts directory for mapped)')
+    parser.add_argument('--cache', type=int, default=0, help='prediction cache entries (0 disables it)')
+    parser.add_argument('--port', type=int, help='replay over HTTP against a server on this local port')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--speed', type=float, default=0, help='replay the recorded timing N times faster (0: no pacing)')
+    args = parser.parse_args()
+
+    records = []
+    for record in read_request_log(args.logs):
+        if isinstance(record.get('message'), str) and record['message']:
+            records.append(record)
+            if len(records) == args.limit:
+                break
+    # Workers log to separate files
+    records.sort(key=lambda record: record.get('time', 0))
+    if not records:
+        print('No records with a message in the given logs', file=sys.stderr)
+        return 1
+    span = records[-1].get('time', 0) - records[0].get('time', 0)
+    print(f"Replaying {len(records):,} records captured over {span:,.0f}s")
+    if args.port:
+        asyncio.run(replay_http(records, args))
+    else:
+        replay_engine(records, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Benchmark suite for the prediction pipeline, stage by stage.
+
+    python benchmarks/suite.py [--count 2000] [--save baseline.json] [--compare baseline.json]
+
+Runs every stage of a /predict call separately over a sampled plus synthetic
+SMS corpus: preprocess_text, tokenize, vectorizer.transform, model.predict,
+model.predict_proba, the scoring engine the app uses, indicator extraction,
+response encoding as the app does it (codec.encode, as JSON and, when msgpack
+is installed, msgpack), and end to end through the Flask test client (with the
+prediction cache disabled). For each stage it reports throughput, p50/p95/p99
+latency and, from a separate tracemalloc pass, the allocation peak per call
+and the bytes still allocated when it returns (its result included).
+
+--save writes the results as a JSON baseline. --compare reads one and flags
+every stage whose p50, p99 or allocation peak got worse by more than
+--threshold (default 0.2, i.e. 20%); the exit status is 1 if any did.
+Baselines are only comparable on the same machine and settings.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from common import ROOT, corpus, load_pickles, percentiles, time_each
+
+import codec
+
+METRICS = ('p50', 'p99', 'alloc_peak_bytes')
+
+
+def allocations(func, items):
+    # Mean transient allocation peak and net retained bytes per call
+    tracemalloc.start()
+    peak = retained = 0
+    try:
+        for item in items:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = func(item)
+            current, top = tracemalloc.get_traced_memory()
+            peak += top - before
+            retained += current - before
+            del result
+    finally:
+        tracemalloc.stop()
+    return peak / len(items), retained / len(items)
+
+
+def measure(func, items, repeat, alloc_items):
+    func(items[0])  # warm up lazily initialized state
+    timings = time_each(func, items, repeat)
+    stats = percentiles(timings, (50, 95, 99))
+    peak, retained = allocations(func, items[:alloc_items])
+    return {
+        'calls_per_sec': round(len(timings) / (sum(timings) / 1e6), 1),
+        'p50': round(stats['p50'], 2),
+        'p95': round(stats['p95'], 2),
+        'p99': round(stats['p99'], 2),
+        'alloc_peak_bytes': round(peak),
+        'retained_bytes': round(retained),
+    }
+
+
+def stages(messages):
+    # (name, function, inputs) for each stage, with inputs precomputed from
+    # the previous stages so each one is timed on its own
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    import app
+    from indicators import find_spam_indicators
+    from preprocessing import preprocess_text, tokenize
+
+    vectorizer, model = load_pickles()
+    engine = app.registry.current.engine
+    texts = [preprocess_text(message) for message in messages]
+    token_lists = [tokenize(message) for message in messages]
+    vectors = [vectorizer.transform([text]) for text in texts]
+    results = [
+        {
+            'message': message,
+            'prediction': str(score.label),
+            'spam_probability': round(float(score.spam_probability) * 100, 2),
+            'spam_indicators': find_spam_indicators(tokens),
+            'model_version': app.registry.current.version,
+        }
+        for message, tokens, score in zip(messages, token_lists, engine.score(token_lists))
+    ]
+    client = app.app.test_client()
+    encoders = [('codec.encode json', lambda result: codec.encode(result, codec.JSON))]
+    if codec.msgpack is not None:
+        encoders.append(('codec.encode msgpack', lambda result: codec.encode(result, codec.MSGPACK)))
+
+    return [
+        ('preprocess_text', preprocess_text, messages),
+        ('tokenize', tokenize, messages),
+        ('vectorizer.transform', lambda text: vectorizer.transform([text]), texts),
+        ('model.predict', model.predict, vectors),
+        ('model.predict_proba', model.predict_proba, vectors),
+        (f'engine.score_one ({app.SCORING_MODE})', engine.score_one, token_lists),
+        ('find_spam_indicators', find_spam_indicators, token_lists),
+        *((name, encode, results) for name, encode in encoders),
+        ('POST /predict', lambda message: client.post('/predict', json={'message': message}), messages),
+    ]
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\nagainst baseline from {baseline['meta'].get('created', '?')} (threshold {threshold:.0%}):")
+    for name, current in results.items():
+        previous = baseline['stages'].get(name)
+        if previous is None:
+            print(f"  {name:<32} new stage")
+            continue
+        changes = []
+        for metric in METRICS:
+            if not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            flag = change > threshold
+            changes.append(f"{metric} {change:+7.1%}{' !' if flag else '  '}")
+            if flag:
+                regressions.append((name, metric, change))
+        print(f"  {name:<32} " + '  '.join(changes))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for name, metric, change in regressions:
+            print(f"  {name}: {metric} {change:+.1%}")
+    else:
+        print("\nno regressions")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--alloc-count', type=int, default=200, help='calls per stage traced for allocations')
+    parser.add_argument('--only', nargs='+', help='run only stages whose name contains one of these strings')
+    parser.add_argument('--save', help='write results to this JSON baseline')
+    parser.add_argument('--compare', help='compare against this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    vectorizer, _ = load_pickles()
+    messages = corpus(vectorizer, args.count)
+
+    results = {}
+    print(f"{'stage':<32} {'calls/s':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'peak KiB':>9} {'kept B':>7}")
+    for name, func, items in stages(messages):
+        if args.only and not any(part in name for part in args.only):
+            continue
+        stats = measure(func, items, args.repeat, args.alloc_count)
+        results[name] = stats
+        print(f"{name:<32} {stats['calls_per_sec']:>10,.0f} {stats['p50']:>7.1f}us {stats['p95']:>7.1f}us"
+              f" {stats['p99']:>7.1f}us {stats['alloc_peak_bytes'] / 1024:>9.1f} {stats['retained_bytes']:>7}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'revision': git_revision(),
+                    'python': platform.python_version(),
+                    'machine': platform.platform(),
+                    'count': args.count,
+                    'repeat': args.repeat,
+                    'scoring_mode': os.environ.get('SCORING_MODE', 'sklearn'),
+                    'json_encoder': 'orjson' if codec.orjson is not None else 'json',
+                },
+                'stages': results,
+            }, f, indent=2)
+        print(f"\nsaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Score a dump of messages from the command line.
+
+    python bulk_score.py messages.csv -o scored.csv [--column message]
+    python bulk_score.py - < messages.ndjson > scored.ndjson --workers 4
+    python bulk_score.py messages.csv -o scored.csv --offset 1200000   # resume
+
+Input is CSV (with a header row; the text is in --column) or NDJSON (one
+string or {"message": ...} object per line), read from a file or stdin
+('-'). Records flow through a generator pipeline in --chunk-size chunks, so
+memory stays bounded whatever the input size, and each scored chunk is
+written and flushed before the next is read. Output has the same format as
+the input: CSV gains prediction, spam_probability, spam_indicators and error
+columns; NDJSON lines are the /predict/batch result objects.
+
+--offset N skips the first N records; with -o the results are appended to the
+existing file, so an interrupted run resumes from the offset it reported.
+--workers N scores chunks in a ProcessPoolScorer (parallel.py) whose forked
+workers inherit the loaded model.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from indicators import find_spam_indicators
+from parallel import ProcessPoolScorer
+from preprocessing import tokenize
+from registry import load_engine
+
+RESULT_FIELDS = ['prediction', 'spam_probability', 'spam_indicators', 'error']
+
+# Set before the worker processes fork, so they inherit it instead of having
+# it pickled to them
+engine = None
+
+
+def read_ndjson(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        yield item, item.get('message', '') if isinstance(item, dict) else item
+
+
+def read_csv(stream, column):
+    csv.field_size_limit(sys.maxsize)
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None or column not in reader.fieldnames:
+        raise SystemExit(f"CSV input has no {column!r} column (use --column)")
+    return reader.fieldnames, ((row, row[column]) for row in reader)
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Score one chunk of messages; invalid ones get the same errors as /predict/batch
+def score_messages(messages):
+    results = [None] * len(messages)
+    token_lists = []
+    positions = []
+    for i, message in enumerate(messages):
+        if not isinstance(message, str):
+            results[i] = {'error': 'Invalid message'}
+        elif not message:
+            results[i] = {'error': 'No message provided'}
+        else:
+            token_lists.append(tokenize(message))
+            positions.append(i)
+    if token_lists:
+        for i, tokens, score in zip(positions, token_lists, engine.score(token_lists)):
+            results[i] = {
+                'prediction': str(score.label),
+                'spam_probability': round(float(score.spam_probability) * 100, 2),
+                'spam_indicators': find_spam_indicators(tokens),
+            }
+    return results
+
+
+def scored_chunks(chunks, scorer):
+    # Yields (chunk, results) in input order, scoring whole chunks (tokenizing
+    # included) in the scorer's worker processes
+    pending = deque()
+
+    def messages():
+        for chunk in chunks:
+            pending.append(chunk)
+            yield [message for _, message in chunk]
+
+    for results in scorer.imap(score_messages, messages()):
+        yield pending.popleft(), results
+
+
+class CsvWriter:
+    def __init__(self, stream, fieldnames, header):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames + [f for f in RESULT_FIELDS if f not in fieldnames],
+                                     extrasaction='ignore')
+        if header:
+            self.writer.writeheader()
+
+    def write(self, record, result):
+        row = dict(record)
+        row.update(result)
+        if 'spam_indicators' in result:
+            row['spam_indicators'] = ' '.join(result['spam_indicators'])
+        self.writer.writerow(row)
+
+
+class NdjsonWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record, result):
+        message = record.get('message') if isinstance(record, dict) else record
+        item = {'message': message, **result} if isinstance(message, str) and message else result
+        self.stream.write(json.dumps(item) + '\n')
+
+
+def main():
+    global engine
+
+    parser = argparse.ArgumentParser(description='Score a CSV or NDJSON dump of messages.')
+    parser.add_argument('input', help="input file, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file, or '-' for stdout (default)")
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='input format (default: from the file name, else ndjson)')
+    parser.add_argument('--column', default='message', help='CSV column holding the message text')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--offset', type=int, default=0, help='number of records to skip (to resume a run)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mode', choices=['sklearn', 'compiled', 'mapped'],
+                        default=os.environ.get('SCORING_MODE', 'sklearn'))
+    parser.add_argument('--model-dir', help='model directory (default: MODEL_DIR, or MODEL_ARTIFACT_DIR in mapped mode)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'ndjson')
+    model_dir = args.model_dir or (os.environ.get('MODEL_ARTIFACT_DIR', 'model_artifacts') if args.mode == 'mapped'
+                                   else os.environ.get('MODEL_DIR', '.'))
+    engine = load_engine(args.mode, model_dir)[0]
+    scorer = ProcessPoolScorer(engine, args.workers)
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='' if fmt == 'csv' else None, encoding='utf-8')
+    appending = args.offset > 0 and args.output != '-' and os.path.exists(args.output)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'a' if appending else 'w', newline='', encoding='utf-8')
+
+    if fmt == 'csv':
+        fieldnames, records = read_csv(source, args.column)
+        writer = CsvWriter(sink, fieldnames, header=not appending)
+    else:
+        records = read_ndjson(source)
+        writer = NdjsonWriter(sink)
+
+    offset = args.offset
+    rows = 0
+    start = time.perf_counter()
+    try:
+        for chunk, results in scored_chunks(chunked(islice(records, args.offset, None), args.chunk_size), scorer):
+            for (record, _), result in zip(chunk, results):
+                writer.write(record, result)
+            sink.flush()
+            rows += len(chunk)
+            offset += len(chunk)
+    except KeyboardInterrupt:
+        print(f"Interrupted; resume with --offset {offset}", file=sys.stderr)
+        return 130
+    except BrokenPipeError:
+        # The reader of stdout went away (e.g. `| head`); silence the final flush
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        elapsed = time.perf_counter() - start
+        print(f"Scored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s); "
+              f"next offset {offset}", file=sys.stderr)
+        scorer.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+# Cache key for a tokenized message: a digest of its preprocess_text form,
+# namespaced by model version so results of different models never mix
+def cache_key(tokens, namespace=''):
+    return hashlib.blake2b(f"{namespace}\0{' '.join(tokens)}".encode(), digest_size=16).digest()
+
+
+class PredictionCache:
+    """Bounded in-process LRU cache of prediction results.
+
+    Entries older than ``ttl`` seconds are treated as misses (``ttl=None``
+    keeps them until evicted). When ``capacity`` is reached the least
+    recently used entry is evicted.
+    """
+
+    def __init__(self, capacity=10000, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        # Drop every entry, e.g. because the model changed
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+class SharedMemoryCache:
+    """Prediction cache shared by every worker process on a host.
+
+    The table lives in a memory-mapped file (under /dev/shm when available),
+    so a result stored by one gunicorn worker is a hit in all the others. It
+    is an open-addressed hash table of fixed-size slots holding the key, an
+    expiry time and the JSON-encoded result. The table has twice ``capacity``
+    slots to keep probe runs short; a key probes up to ``PROBES`` slots and a
+    full neighbourhood overwrites its first slot. Every operation holds a
+    POSIX record lock on the file (per process, so it also works after fork)
+    plus a thread lock. Hit/miss counters live in the file header and are
+    shared too. Results too large for a slot are not cached, and counted.
+
+    A file laid out differently (another capacity, say, during a rolling
+    restart) is never resized in place, since workers still running have it
+    mapped: a new table is built beside it and renamed over it, and those
+    workers keep the old one until they restart.
+    """
+
+    MAGIC = b'SPAMCAC2'
+    # magic, slot count, slot size, then the counters: hits, misses, sets,
+    # evictions, invalidations, oversized
+    HEADER = struct.Struct('<8sIIQQQQQQ')
+    HEADER_SIZE = 64
+    COUNTERS = struct.Struct('<6Q')
+    COUNTERS_OFFSET = 16
+    # key, expiry (0 = never), payload length
+    SLOT = struct.Struct('<16sdH')
+    SLOT_SIZE = 256
+    EMPTY = bytes(16)
+    PROBES = 16
+
+    def __init__(self, path=None, capacity=65536, ttl=None):
+        if path is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            path = os.path.join(directory, 'spam-detector-cache')
+        self.path = path
+        self.capacity = capacity
+        self.slots = capacity * 2
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        size = self.HEADER_SIZE + self.slots * self.SLOT_SIZE
+        while True:
+            file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+            fd = file.fileno()
+            fcntl.lockf(file, fcntl.LOCK_EX)
+            try:
+                stat = os.fstat(fd)
+                try:
+                    current = os.stat(self.path)
+                except FileNotFoundError:
+                    current = None
+                if current is None or not os.path.samestat(stat, current):
+                    continue  # replaced while we waited for the lock
+                header = os.pread(fd, self.HEADER.size, 0)
+                if stat.st_size == 0:
+                    # A new file, which nobody can have mapped yet
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, self._empty_header(), 0)
+                elif (stat.st_size != size or len(header) < self.HEADER.size
+                        or self.HEADER.unpack(header)[:3] != (self.MAGIC, self.slots, self.SLOT_SIZE)):
+                    self._replace(size)
+                    continue
+                self._map = mmap.mmap(fd, size)
+                self._file = file
+                return
+            finally:
+                fcntl.lockf(file, fcntl.LOCK_UN)
+                if getattr(self, '_file', None) is not file:
+                    file.close()
+
+    def _empty_header(self):
+        return self.HEADER.pack(self.MAGIC, self.slots, self.SLOT_SIZE, 0, 0, 0, 0, 0, 0)
+
+    def _replace(self, size):
+        # Put an empty table with this layout in place of the current file
+        fd, temporary = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.',
+                                         dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, self._empty_header(), 0)
+            os.replace(temporary, self.path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+        finally:
+            os.close(fd)
+
+    def _locked(self):
+        # Record locks belong to the process rather than the file descriptor,
+        # so workers forked after the cache was opened still exclude each other
+        return _FileLock(self._lock, self._file)
+
+    def _counter(self, index, amount=1):
+        offset = self.COUNTERS_OFFSET + 8 * index
+        value, = struct.unpack_from('<Q', self._map, offset)
+        struct.pack_into('<Q', self._map, offset, value + amount)
+
+    def _slot_offsets(self, key):
+        start = int.from_bytes(key[:8], 'little') % self.slots
+        for probe in range(self.PROBES):
+            yield self.HEADER_SIZE + ((start + probe) % self.slots) * self.SLOT_SIZE
+
+    def get(self, key):
+        with self._locked():
+            now = time.time()
+            for offset in self._slot_offsets(key):
+                slot_key, expires, length = self.SLOT.unpack_from(self._map, offset)
+                if slot_key == self.EMPTY:
+                    break
+                if slot_key != key:
+                    continue
+                if expires and expires < now:
+                    break
+                payload = self._map[offset + self.SLOT.size:offset + self.SLOT.size + length]
+                self._counter(0)
+                return json.loads(payload)
+            self._counter(1)
+            return None
+
+    def set(self, key, value):
+        payload = json.dumps(value, separators=(',', ':')).encode()
+        if len(payload) > self.SLOT_SIZE - self.SLOT.size:
+            with self._locked():
+                self._counter(5)
+            return
+        expires = time.time() + self.ttl if self.ttl else 0.0
+        with self._locked():
+            now = time.time()
+            target = None
+            for offset in self._slot_offsets(key):
+                slot_key, slot_expires, _ = self.SLOT.unpack_from(self._map, offset)
+                if slot_key == key or slot_key == self.EMPTY or (slot_expires and slot_expires < now):
+                    target = offset
+                    break
+            if target is None:
+                target = next(self._slot_offsets(key))
+                self._counter(3)
+            self.SLOT.pack_into(self._map, target, key, expires, len(payload))
+            self._map[target + self.SLOT.size:target + self.SLOT.size + len(payload)] = payload
+            self._counter(2)
+
+    def invalidate(self):
+        with self._locked():
+            self._map[self.HEADER_SIZE:] = bytes(len(self._map) - self.HEADER_SIZE)
+            self._counter(4)
+
+    def stats(self):
+        with self._locked():
+            hits, misses, sets, evictions, invalidations, oversized = self.COUNTERS.unpack_from(
+                self._map, self.COUNTERS_OFFSET)
+        lookups = hits + misses
+        return {
+            'backend': 'shared',
+            'path': self.path,
+            'capacity': self.capacity,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'sets': sets,
+            'evictions': evictions,
+            'invalidations': invalidations,
+            'oversized': oversized,
+        }
+
+
+class _FileLock:
+    def __init__(self, thread_lock, file):
+        self.thread_lock = thread_lock
+        self.file = file
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.lockf(self.file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self.file, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+class RedisCache:
+    """Prediction cache stored in Redis (or anything speaking its API).
+
+    ``client`` only needs ``get``, ``set(name, value, ex=None)``,
+    ``scan_iter(match=...)`` and ``delete``, so a local stand-in can be passed
+    instead of a ``redis.Redis`` connection. Hit/miss counters are per process.
+    A failed ``get`` (Redis down, timeout) counts as an error and a miss, and
+    a failed ``set`` is skipped, so requests are scored without the cache.
+    """
+
+    def __init__(self, client, prefix='spam-detector:', ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        try:
+            from redis import RedisError
+            self.client_errors = (RedisError, OSError)
+        except ImportError:
+            self.client_errors = (OSError,)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        try:
+            payload = self.client.get(self.prefix + key.hex())
+        except self.client_errors:
+            with self._lock:
+                self.errors += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(payload)
+
+    def set(self, key, value):
+        payload = json.dumps(value, separators=(',', ':'))
+        try:
+            self.client.set(self.prefix + key.hex(), payload, ex=max(1, int(self.ttl)) if self.ttl else None)
+        except self.client_errors:
+            with self._lock:
+                self.errors += 1
+
+    def invalidate(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'redis',
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'errors': self.errors,
+                'invalidations': self.invalidations,
+            }
+
+
+def create_cache(backend='memory', capacity=10000, ttl=None, path=None, redis_url=None):
+    if backend == 'shared':
+        return SharedMemoryCache(path, capacity, ttl)
+    if backend == 'redis':
+        return RedisCache.from_url(redis_url or 'redis://localhost:6379/0', ttl=ttl)
+    if backend == 'memory':
+        return PredictionCache(capacity, ttl)
+    raise ValueError(f'Unknown cache backend: {backend}')
@@ -0,0 +1,206 @@
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Near-duplicate campaign detection.
+#
+# Spam campaigns send many light mutations of one template. Each message's
+# set of preprocessed tokens is summarized by a MinHash signature of num_perm
+# 32-bit minimums, whose fraction of equal positions estimates the Jaccard
+# similarity of two messages' token sets. (Word bigrams are the textbook
+# shingle, but SMS are so short that a single changed word breaks a third of
+# them; token sets keep mutated copies above the threshold.)
+#
+# The first bands * rows minimums are cut into `bands` bands of `rows`, and
+# each band is hashed into a bucket table (LSH), so similar messages collide
+# in at least one band with high probability and a lookup costs `bands` dict
+# probes, whatever the number of indexed messages. Short bands find
+# mutated copies; the false candidates they let through are weeded out by
+# comparing the whole signature with that of the message they came from. The
+# best candidate at or above `threshold` puts the new message in its campaign.
+
+#
+# The index remembers the last `max_messages` messages seen within `window`
+# seconds. Signatures, band keys and campaign references live in
+# preallocated ring buffers, so memory is fixed apart from the bucket dicts
+# (at most max_messages * bands entries) and the campaigns, which are only
+# created once a second message joins. Messages are evicted oldest first,
+# and a campaign is forgotten with its last message. With the defaults an
+# indexed message takes about 600 bytes.
+
+
+class Campaign:
+    __slots__ = ('id', 'size', 'live', 'first_seen', 'last_seen', 'verdict')
+
+    def __init__(self, id, now):
+        self.id = id
+        self.size = 0
+        self.live = 0
+        self.first_seen = now
+        self.last_seen = now
+        # (model version, result) of a message scored in this campaign
+        self.verdict = None
+
+    def describe(self):
+        return {'id': self.id, 'size': self.size, 'first_seen': self.first_seen, 'last_seen': self.last_seen}
+
+
+class CampaignIndex:
+    def __init__(self, num_perm=64, bands=8, rows=2, threshold=0.5, window=3600.0, max_messages=100000, seed=1):
+        if bands * rows > num_perm:
+            raise ValueError('bands * rows must not exceed num_perm')
+        rng = np.random.RandomState(seed)
+        # Multiply-shift hash family: the top 32 bits of a * x + b (mod 2**64)
+        # for random odd a, with numpy's wrapping uint64 arithmetic
+        self.a = rng.randint(0, 1 << 63, num_perm, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+        self.b = rng.randint(0, 1 << 63, num_perm, dtype=np.int64).astype(np.uint64)
+        self.rows = rows
+        # Multipliers that fold a band's rows into one bucket key
+        self.band_mix = rng.randint(0, 1 << 63, self.rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+        self.bands = bands
+        self.threshold = threshold
+        self.window = window
+        self.capacity = max_messages
+        self.buckets = [{} for _ in range(bands)]
+        # Only the low 16 bits of each minimum are kept for verification:
+        # unequal minimums then look equal with probability 2**-16
+        self.stored_signatures = np.zeros((max_messages, num_perm), dtype=np.uint16)
+        self.stored_keys = np.zeros((max_messages, bands), dtype=np.uint32)
+        self.times = np.zeros(max_messages)
+        # A message's Campaign, or None until a second message joins it
+        self.campaign_of = [None] * max_messages
+        self.campaigns = {}
+        # Messages ever added; the ring holds sequence numbers
+        # [oldest, next) at positions seq % capacity
+        self.next = 0
+        self.oldest = 0
+        self.matched = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def signatures(self, token_lists):
+        # MinHash signatures of non-empty token lists, computed for the whole
+        # batch at once: (n, num_perm) uint32
+        sets = [set(tokens) for tokens in token_lists]
+        x = np.fromiter((zlib.crc32(token.encode()) for tokens in sets for token in tokens), np.uint64)
+        # One row per hash function, so each message's minimum is taken over
+        # a contiguous run
+        hashed = self.a[:, None] * x
+        hashed += self.b[:, None]
+        hashed >>= np.uint64(32)
+        if len(sets) == 1:
+            return hashed.min(axis=1)[None, :].astype(np.uint32)
+        starts = np.zeros(len(sets), dtype=np.intp)
+        np.cumsum([len(tokens) for tokens in sets[:-1]], out=starts[1:])
+        return np.ascontiguousarray(np.minimum.reduceat(hashed, starts, axis=1).T, dtype=np.uint32)
+
+    def band_keys(self, signatures):
+        # 30-bit keys are the smallest Python ints; two messages sharing a key
+        # by accident only cost a rejected candidate or an overwritten bucket
+        rows = signatures[:, :self.bands * self.rows].reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = (rows * self.band_mix).sum(axis=2, dtype=np.uint64) >> np.uint64(34)
+        return keys.astype(np.uint32)
+
+    def _evict(self, now):
+        cutoff = now - self.window
+        while self.oldest < self.next and (self.next - self.oldest >= self.capacity
+                                           or self.times[self.oldest % self.capacity] < cutoff):
+            seq = self.oldest
+            slot = seq % self.capacity
+            for bucket, key in zip(self.buckets, self.stored_keys[slot].tolist()):
+                # Later messages may have taken over the bucket
+                if bucket.get(key) == seq:
+                    del bucket[key]
+            campaign = self.campaign_of[slot]
+            self.campaign_of[slot] = None
+            if campaign is not None:
+                campaign.live -= 1
+                if not campaign.live:
+                    del self.campaigns[campaign.id]
+            self.oldest += 1
+            self.evicted += 1
+
+    def observe(self, tokens, now=None):
+        return self.observe_many([tokens], now)[0]
+
+    def observe_many(self, token_lists, now=None):
+        # Add messages in order; returns the campaign each one joined, or
+        # None for messages unlike any other in the window
+        campaigns = [None] * len(token_lists)
+        positions = [i for i, tokens in enumerate(token_lists) if tokens]
+        if not positions:
+            return campaigns
+        signatures = self.signatures([token_lists[i] for i in positions])
+        keys = self.band_keys(signatures)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            for i, signature, message_keys in zip(positions, signatures, keys):
+                campaigns[i] = self._add(signature, message_keys, now)
+        return campaigns
+
+    def _add(self, signature, keys, now):
+        if self.next - self.oldest >= self.capacity:
+            self._evict(now)
+        key_list = keys.tolist()
+        stored = signature.astype(np.uint16)
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for bucket, key in zip(self.buckets, key_list):
+            seq = bucket.get(key)
+            if seq is None or seq in seen:
+                continue
+            seen.add(seq)
+            similarity = np.count_nonzero(self.stored_signatures[seq % self.capacity] == stored) / len(stored)
+            if similarity >= best_similarity:
+                best, best_similarity = seq, similarity
+
+        campaign = None
+        if best is not None:
+            self.matched += 1
+            founder = best % self.capacity
+            campaign = self.campaign_of[founder]
+            if campaign is None:
+                campaign = self._found(founder)
+
+        seq = self.next
+        slot = seq % self.capacity
+        self.stored_signatures[slot] = stored
+        self.stored_keys[slot] = keys
+        self.times[slot] = now
+        self.campaign_of[slot] = campaign
+        for bucket, key in zip(self.buckets, key_list):
+            bucket[key] = seq
+        self.next += 1
+        if campaign is not None:
+            campaign.size += 1
+            campaign.live += 1
+            campaign.last_seen = now
+        return campaign
+
+    def _found(self, slot):
+        # Named after the first message's band keys, so the same template
+        # founds the same id in every process
+        campaign = Campaign(''.join(f"{key:08x}" for key in self.stored_keys[slot, :2].tolist()), self.times[slot])
+        while campaign.id in self.campaigns:
+            campaign.id += '+'
+        self.campaigns[campaign.id] = campaign
+        self.campaign_of[slot] = campaign
+        campaign.size = campaign.live = 1
+        return campaign
+
+    def stats(self, top=10):
+        with self._lock:
+            largest = sorted(self.campaigns.values(), key=lambda c: c.size, reverse=True)[:top]
+            return {
+                'messages': self.next - self.oldest,
+                'campaigns': len(self.campaigns),
+                'observed': self.next,
+                'matched': self.matched,
+                'evicted': self.evicted,
+                'window': self.window,
+                'max_messages': self.capacity,
+                'largest': [campaign.describe() for campaign in largest],
+            }
@@ -0,0 +1,76 @@
+import json
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+# Request and response encodings for the scoring endpoints.
+#
+# JSON is encoded and decoded with orjson when it is installed, which is
+# several times faster than the json module, and with json otherwise. Keys
+# are sorted either way, as jsonify sorts them. orjson writes non-ASCII text
+# as UTF-8 rather than \u escapes, which is the same JSON.
+#
+# msgpack is used when the msgpack package is installed and the client asks
+# for it. A msgpack request body is answered in msgpack unless Accept says
+# otherwise, and Accept: application/msgpack gets a msgpack response to a
+# JSON request.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+
+def dumps_json(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def loads_json(body):
+    # Raises ValueError on malformed input, from either parser
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def is_msgpack(mimetype):
+    return mimetype in MSGPACK_TYPES
+
+
+def decode(mimetype, body):
+    # Parsed body of a JSON or msgpack request; raises ValueError if it
+    # cannot be parsed
+    if is_msgpack(mimetype):
+        if msgpack is None:
+            raise ValueError('msgpack is not installed')
+        try:
+            return msgpack.unpackb(body)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack body: {e}") from e
+    return loads_json(body)
+
+
+def negotiate(accept, request_mimetype=None):
+    # Response mimetype for an Accept header and the request's own type
+    preferred = MSGPACK if msgpack is not None and is_msgpack(request_mimetype) else JSON
+    if not accept or accept == '*/*' or msgpack is None:
+        return preferred
+    offers = [preferred, MSGPACK if preferred == JSON else JSON, 'application/x-msgpack']
+    match = parse_accept_header(accept, MIMEAccept).best_match(offers, default=JSON)
+    return MSGPACK if is_msgpack(match) else JSON
+
+
+def encode(data, mimetype):
+    if mimetype == MSGPACK:
+        return msgpack.packb(data)
+    return dumps_json(data)
@@ -0,0 +1,30 @@
+import csv
+
+# Labelled message files for training and evaluation. Two layouts are read:
+#
+# - the UCI SMS Spam Collection: one "label<TAB>message" pair per line
+# - CSV with a header row, taking the label and message from the named
+#   columns ("label"/"message" by default; the Kaggle spam.csv uses v1/v2)
+#
+# The dataset's "ham" label is mapped to "valid", the model's name for it.
+
+LABELS = {'ham': 'valid', 'spam': 'spam', 'valid': 'valid'}
+
+
+def read_labeled_messages(path, label_column='label', message_column='message', encoding='utf-8'):
+    # Yields (message, label) pairs; rows with unknown labels are skipped
+    with open(path, newline='', encoding=encoding, errors='replace') as f:
+        first = f.readline()
+        f.seek(0)
+        if '\t' in first and ',' not in first.split('\t', 1)[0]:
+            rows = (line.rstrip('\r\n').split('\t', 1) for line in f)
+            pairs = ((row[1], row[0]) for row in rows if len(row) == 2)
+        else:
+            reader = csv.DictReader(f)
+            if label_column not in reader.fieldnames and {'v1', 'v2'} <= set(reader.fieldnames):
+                label_column, message_column = 'v1', 'v2'
+            pairs = ((row[message_column], row[label_column]) for row in reader)
+        for message, label in pairs:
+            label = LABELS.get(label.strip().lower())
+            if label is not None:
+                yield message, label
@@ -0,0 +1,234 @@
+import copy
+import json
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+
+from dataset import LABELS
+from preprocessing import preprocess_text
+
+# Online learning from labelled feedback.
+#
+# /feedback appends each correction as one NDJSON line to a journal file that
+# every worker shares. A background thread in each worker reads the journal in
+# batches, applies them with MultinomialNB.partial_fit to a copy of the active
+# model (the shadow), checks the shadow against the canary messages and
+# promotes it through the registry, so requests never see a half-updated
+# model. Every worker applies the same lines in the same order from the same
+# base model, so they all converge on the same model and version
+# ("<base>+fb<lines>") without coordinating.
+#
+# A batch is promoted with a compare-and-swap on the model it was applied to:
+# if a reload or rollback replaced that model in the meantime, the shadow is
+# dropped and the batch is applied again on top of the new model. A rollback
+# pins the learner: rolling back means the operator wants that model, so no
+# feedback is applied to it (which would bring back what was rolled back)
+# until another model is loaded.
+#
+# The vectorizer is never refitted: its vocabulary and IDF stay as trained,
+# since adding a term would change every message's vector and invalidate the
+# counts the model has accumulated. Tokens outside the vocabulary are
+# therefore ignored by the update and counted instead (the most frequent
+# show up in status() as candidates for the next train.py run). A message
+# with no in-vocabulary tokens would only shift the class counts, so it is
+# skipped. Hashing vectorizers have no vocabulary, so every token counts.
+#
+# The journal is the only thing written: one append per feedback item, and
+# never a rewrite of the model. It is also what makes feedback survive
+# restarts: a worker replays it from the start onto the model it loads, so
+# fold it into the training data and move it aside when retraining. It stops
+# accepting items at max_bytes. Memory is bounded by the batch size, the
+# active, previous and shadow models, and max_new_tokens counters.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class JournalFull(Exception):
+    pass
+
+
+class FeedbackLearner:
+    def __init__(self, registry, path, build, batch_size=1000, interval=30.0, weight=1.0,
+                 update_prior=False, max_bytes=DEFAULT_MAX_BYTES, max_new_tokens=10000):
+        # build(version, vectorizer, model) returns a ModelVersion
+        self.registry = registry
+        self.path = path
+        self.build = build
+        self.batch_size = batch_size
+        self.interval = interval
+        self.weight = weight
+        self.update_prior = update_prior
+        self.max_bytes = max_bytes
+        self.max_new_tokens = max_new_tokens
+        self.base = None
+        self.promoted = None
+        self.pinned = False
+        self.offset = 0
+        self.lines = 0
+        self.counts = Counter()
+        self.new_tokens = Counter()
+        self.last_error = None
+        self._fd = None
+        self._fd_pid = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, message, label):
+        label = LABELS.get(str(label).strip().lower())
+        if label is None:
+            raise ValueError('label must be "spam" or "valid"')
+        line = json.dumps({'message': message, 'label': label, 'time': round(time.time(), 3)}) + '\n'
+        with self._lock:
+            if self._fd_pid != os.getpid():
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._fd_pid = os.getpid()
+            if os.fstat(self._fd).st_size >= self.max_bytes:
+                raise JournalFull(f"Feedback journal {self.path} is full")
+            # One write per line; O_APPEND keeps lines from different
+            # workers whole
+            os.write(self._fd, line.encode())
+        return label
+
+    def start(self):
+        # Idempotent per process, like ModelRegistry.watch
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='feedback-learner', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                # Catch up in back-to-back batches, then wait for more
+                while self.step():
+                    pass
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Feedback update failed: {self.last_error}")
+                traceback.print_exc()
+            time.sleep(self.interval)
+
+    def _rebase(self, current):
+        # A model the learner did not just promote is active. Models it has
+        # followed before are marked, and only a rollback can bring one back:
+        # pin to it. Anything else was loaded (startup or reload), so the
+        # journal is replayed onto it from the start.
+        self.promoted = current
+        if getattr(current, 'feedback_followed', False):
+            self.pinned = True
+            print(f"Feedback learner pinned to rolled-back model {current.version}")
+            return
+        current.feedback_followed = True
+        self.pinned = False
+        self.base = current
+        self.offset = self.lines = 0
+        print(f"Feedback learner following model {current.version} from the start of the journal")
+
+    def read_batch(self):
+        # Up to batch_size complete lines from the current offset
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self.offset:
+                    # Truncated or replaced: what was applied stays applied
+                    self.offset = 0
+                f.seek(self.offset)
+                lines = []
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    lines.append(line)
+                    if len(lines) == self.batch_size:
+                        break
+        except FileNotFoundError:
+            return [], self.offset
+        return lines, self.offset + sum(map(len, lines))
+
+    def prepare(self, lines, vectorizer):
+        analyze = vectorizer.build_analyzer()
+        vocabulary = getattr(vectorizer, 'vocabulary_', None)
+        texts, labels = [], []
+        for line in lines:
+            try:
+                item = json.loads(line)
+                text = preprocess_text(item['message'])
+                label = LABELS[item['label']]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.counts['invalid'] += 1
+                continue
+            terms = analyze(text)
+            if vocabulary is not None:
+                unknown = [term for term in terms if term not in vocabulary]
+                for term in unknown:
+                    if term in self.new_tokens or len(self.new_tokens) < self.max_new_tokens:
+                        self.new_tokens[term] += 1
+                known = len(terms) - len(unknown)
+            else:
+                known = len(terms)
+            if not known:
+                self.counts['no_known_tokens'] += 1
+                continue
+            texts.append(text)
+            labels.append(label)
+        return texts, labels
+
+    def step(self):
+        # Apply one batch; returns whether there may be more to read
+        current = self.registry.current
+        if current is None or current.model is None:
+            return False
+        if current is not self.promoted:
+            self._rebase(current)
+        if self.pinned:
+            return False
+        lines, offset = self.read_batch()
+        if not lines:
+            return False
+
+        start = time.perf_counter()
+        vectorizer = current.vectorizer
+        texts, labels = self.prepare(lines, vectorizer)
+        position = self.lines + len(lines)
+        if texts:
+            shadow = copy.deepcopy(current.model)
+            shadow.partial_fit(vectorizer.transform(texts), labels, sample_weight=[self.weight] * len(texts))
+            if not self.update_prior:
+                # Feedback is a biased sample (mostly missed spam), so by
+                # default only the word distributions learn from it
+                shadow.class_log_prior_ = self.base.model.class_log_prior_.copy()
+            version = self.build(f"{self.base.version}+fb{position}", vectorizer, shadow)
+            version.feedback_followed = True
+            version.load_seconds = time.perf_counter() - start
+            try:
+                self.registry.check_canary(version)
+            except ValueError as e:
+                # Skip the batch everywhere: every worker reaches the same verdict
+                self.counts['rejected'] += len(texts)
+                self.last_error = str(e)
+                print(f"Feedback batch rejected: {e}")
+            else:
+                if not self.registry.activate(version, expected=current):
+                    # Lost the race with a reload or rollback; the next step
+                    # rebases and applies the batch again if it can
+                    print(f"Feedback batch not promoted: model {current.version} is no longer active")
+                    return True
+                self.promoted = version
+                self.counts['applied'] += len(texts)
+        self.offset, self.lines = offset, position
+        return len(lines) == self.batch_size
+
+    def status(self):
+        return {
+            'journal': self.path,
+            'base_version': self.base.version if self.base else None,
+            'version': self.promoted.version if self.promoted else None,
+            'pinned': self.pinned,
+            'lines_read': self.lines,
+            'offset': self.offset,
+            'items': dict(self.counts),
+            'new_tokens': dict(self.new_tokens.most_common(20)),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,27 @@
+import os
+
+# Gunicorn picks this file up automatically when started from the repo root
+# (the Procfile runs `gunicorn app:app`).
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+# Import app.py (and load the model) once in the master before forking, so
+# workers share one physical copy of it instead of each loading their own.
+# Combined with SCORING_MODE=mapped the model arrays are file-backed pages
+# shared through the page cache.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Connections waiting for a worker to accept them. A sync worker serves them
+# in arrival order however long they have waited, so a shorter backlog bounds
+# queueing delay; past it the kernel refuses new connections. See
+# ADMISSION_MAX_QUEUE_MS in app.py for shedding requests that queued too long.
+backlog = int(os.environ.get('GUNICORN_BACKLOG', '2048'))
+
+
+# Warm each worker up after it has loaded the app and before it accepts
+# connections, so its first requests are not the slow ones (see warmup.py).
+# /readyz reports when that is done.
+def post_worker_init(worker):
+    import app
+    app.warm_up()
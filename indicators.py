@@ -0,0 +1,66 @@
+import heapq
+
+
+# Words commonly found in spam, in the order they are reported
+COMMON_SPAM_WORDS = (
+    "free", "call", "text", "prize", "win", "claim", "urgent",
+    "cash", "offer", "mobile", "service", "customer", "please",
+    "contact", "msg", "reply", "stop", "send", "credit", "gift", "iphone", "phone", "money", "congratulation", "insurance", "congrats"
+)
+SPAM_INDICATORS = frozenset(COMMON_SPAM_WORDS)
+_INDICATOR_ORDER = {word: i for i, word in enumerate(COMMON_SPAM_WORDS)}
+
+
+# Find common spam indicators with a single set intersection
+def find_spam_indicators(tokens):
+    found = SPAM_INDICATORS.intersection(tokens)
+    if not found:
+        return []
+    return sorted(found, key=_INDICATOR_ORDER.__getitem__)
+
+
+class ModelIndicators:
+    """Reports the tokens that contribute most to a message's spam score.
+
+    A token's contribution to the log-odds is its TF-IDF weight times the
+    difference between its spam and non-spam log-probabilities. The L2 norm is
+    shared by all tokens of a message, so ranking by ``count * idf * diff`` is
+    enough; ``idf * diff`` is precomputed for every term that favours spam.
+    """
+
+    def __init__(self, terms, idf, log_prob, spam_idx, top_k=5):
+        self.top_k = top_k
+        self.weights = {}
+        for term, term_idf, term_log_prob in zip(terms, idf.tolist(), log_prob.tolist()):
+            spam = term_log_prob[spam_idx]
+            other = max(p for i, p in enumerate(term_log_prob) if i != spam_idx)
+            weight = term_idf * (spam - other)
+            if weight > 0:
+                self.weights[term] = weight
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, model, top_k=5, spam_label='spam'):
+        if not hasattr(vectorizer, 'vocabulary_'):
+            raise ValueError('Model indicators need a vocabulary; use INDICATOR_MODE=words with hashing vectorizers')
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, column in vectorizer.vocabulary_.items():
+            terms[column] = term
+        classes = list(model.classes_)
+        spam_idx = classes.index(spam_label) if spam_label in classes else 1
+        return cls(terms, vectorizer.idf_, model.feature_log_prob_.T, spam_idx, top_k)
+
+    @classmethod
+    def from_scorer(cls, scorer, top_k=5):
+        # Build from a CompiledScorer or MappedScorer
+        idf, log_prob = scorer.float_arrays()
+        return cls(scorer.terms, idf, log_prob, scorer.spam_idx, top_k)
+
+    def find(self, tokens):
+        weights = self.weights
+        counts = {}
+        for token in tokens:
+            if token in weights:
+                counts[token] = counts.get(token, 0) + 1
+        if len(counts) <= self.top_k:
+            return sorted(counts, key=lambda token: counts[token] * weights[token], reverse=True)
+        return heapq.nlargest(self.top_k, counts, key=lambda token: counts[token] * weights[token])
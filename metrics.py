@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms kept in
+# this process and rendered in the text exposition format for /metrics.
+# Each gunicorn worker has its own values; Prometheus sees whichever worker
+# answers the scrape, so run one worker per scrape target or aggregate by
+# instance when that matters.
+
+# Latency buckets in seconds, from 50us to 2.5s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_NULL_TIMER = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self.values.items())
+        return [(self.name, self.labels, values, value) for values, value in items]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, either set directly or read at scrape
+    time from ``func`` (a number, or a dict of label-value tuples to numbers)."""
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), func=None, type=None):
+        super().__init__(name, help, labels)
+        self.func = func
+        if type is not None:
+            self.type = type
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        if self.func is None:
+            return super().samples()
+        value = self.func()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [(self.name, self.labels, values, v) for values, v in value.items()]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(values, list(counts), total) for values, (counts, total) in self.values.items()]
+        samples = []
+        for values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', self.labels + ('le',), values + (_format_value(bound),), cumulative))
+            samples.append((f'{self.name}_sum', self.labels, values, total))
+            samples.append((f'{self.name}_count', self.labels, values, cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class Metrics:
+    """Registry of metrics with an off switch.
+
+    When disabled, ``timer`` returns a shared no-op context manager and
+    ``inc``/``observe`` return immediately, so instrumented code costs a
+    method call per hook and nothing else.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), func=None, type=None):
+        return self._add(Gauge(name, help, labels, func, type))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def timer(self, histogram, *label_values):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(histogram, label_values)
+
+    def inc(self, counter, *label_values, amount=1):
+        if self.enabled:
+            counter.inc(*label_values, amount=amount)
+
+    def observe(self, histogram, value, *label_values):
+        if self.enabled:
+            histogram.observe(value, *label_values)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,116 @@
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+
+# Engines by id, filled in before the pool forks so workers inherit them
+# through copy-on-write memory instead of receiving a pickled copy per task
+_engines = {}
+
+
+def _score(key, token_lists):
+    return _engines[key].score(token_lists)
+
+
+class ProcessPoolScorer:
+    """Spreads large batches over a pool of forked worker processes.
+
+    Wraps any scoring engine (``ScoringEngine``, ``CompiledScorer``,
+    ``MappedScorer``) and has the same ``score``/``score_one`` interface.
+    Batches smaller than ``min_batch_size`` are scored in the calling process,
+    where the inter-process round trip would cost more than it saves; larger
+    ones are split into one slice per worker. Only the token lists and scores
+    cross the process boundary: the pool is forked after the engine is
+    loaded, so workers share its arrays with the parent.
+
+    The pool is started on first use in each process, which keeps it out of
+    a gunicorn master that preloads the app, and ``close`` stops it. Batches
+    already waiting on the pool when ``close`` is called finish first: the
+    pool is stopped once the last of them returns.
+    Attributes not defined here are read from the wrapped engine.
+    """
+
+    def __init__(self, engine, workers=None, min_batch_size=256):
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch_size = min_batch_size
+        self._pool = None
+        self._pid = None
+        self._active = 0
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only reached for attributes missing on the wrapper (terms, classes, ...)
+        if name == 'engine':
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    @property
+    def pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            _engines[id(self)] = self.engine
+            self._pool = multiprocessing.get_context('fork').Pool(self.workers)
+            self._pid = os.getpid()
+            self._active = 0
+            self._closing = False
+        return self._pool
+
+    def score(self, token_lists):
+        if self.workers <= 1 or len(token_lists) < self.min_batch_size:
+            return self.engine.score(token_lists)
+        size = math.ceil(len(token_lists) / self.workers)
+        parts = [token_lists[i:i + size] for i in range(0, len(token_lists), size)]
+        with self._lock:
+            pending = [self.pool.apply_async(_score, (id(self), part)) for part in parts]
+            self._active += 1
+        try:
+            return [score for result in pending for score in result.get()]
+        finally:
+            with self._lock:
+                self._active -= 1
+                pool = self._release() if self._closing and not self._active else None
+            if pool is not None:
+                # Off the request path; terminate() joins the pool's threads
+                threading.Thread(target=pool.terminate, name='pool-close', daemon=True).start()
+
+    def score_one(self, tokens):
+        return self.engine.score_one(tokens)
+
+    def imap(self, func, items):
+        # Ordered map of a module-level function over the pool. At most two
+        # items per worker are in flight, so a fast producer (e.g. a file
+        # reader) cannot run ahead of the workers and fill memory.
+        if self.workers <= 1:
+            for item in items:
+                yield func(item)
+            return
+        pool = self.pool
+        in_flight = deque()
+        for item in items:
+            in_flight.append(pool.apply_async(func, (item,)))
+            if len(in_flight) >= self.workers * 2:
+                yield in_flight.popleft().get()
+        while in_flight:
+            yield in_flight.popleft().get()
+
+    def _release(self):
+        # Detach the pool (if this process owns it) for the caller to stop;
+        # called with the lock held
+        pool = self._pool if self._pid == os.getpid() else None
+        self._pool = None
+        self._closing = False
+        _engines.pop(id(self), None)
+        return pool
+
+    def close(self):
+        # Stop the pool now, or once the batches in flight have their results
+        with self._lock:
+            if self._active:
+                self._closing = True
+                return
+            pool = self._release()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,49 @@
+import re
+import string
+
+
+# English stopwords, frozen from NLTK's stopwords corpus (3.8.1) so startup
+# needs neither nltk nor a network download
+STOP_WORDS = frozenset([
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "you're",
+    "you've", "you'll", "you'd", "your", "yours", "yourself", "yourselves", "he",
+    "him", "his", "himself", "she", "she's", "her", "hers", "herself", "it",
+    "it's", "its", "itself", "they", "them", "their", "theirs", "themselves",
+    "what", "which", "who", "whom", "this", "that", "that'll", "these", "those",
+    "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had",
+    "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if",
+    "or", "because", "as", "until", "while", "of", "at", "by", "for", "with",
+    "about", "against", "between", "into", "through", "during", "before",
+    "after", "above", "below", "to", "from", "up", "down", "in", "out", "on",
+    "off", "over", "under", "again", "further", "then", "once", "here", "there",
+    "when", "where", "why", "how", "all", "any", "both", "each", "few", "more",
+    "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same",
+    "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "don't",
+    "should", "should've", "now", "d", "ll", "m", "o", "re", "ve", "y", "ain",
+    "aren", "aren't", "couldn", "couldn't", "didn", "didn't", "doesn",
+    "doesn't", "hadn", "hadn't", "hasn", "hasn't", "haven", "haven't", "isn",
+    "isn't", "ma", "mightn", "mightn't", "mustn", "mustn't", "needn", "needn't",
+    "shan", "shan't", "shouldn", "shouldn't", "wasn", "wasn't", "weren",
+    "weren't", "won", "won't", "wouldn", "wouldn't",
+])
+
+# Everything except lowercase letters and whitespace is dropped. ASCII text
+# goes through a str.translate deletion table, anything else through a
+# precompiled regex.
+_ASCII_DELETE = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128)) if c not in string.ascii_lowercase and not c.isspace()
+))
+_NON_LETTERS = re.compile(r'[^a-z\s]+')
+
+# Split a message into lowercase, stopword-free tokens
+def tokenize(text):
+    text = text.lower()
+    if text.isascii():
+        text = text.translate(_ASCII_DELETE)
+    else:
+        text = _NON_LETTERS.sub('', text)
+    return [w for w in text.split() if w not in STOP_WORDS]
+
+# Define preprocessing function
+def preprocess_text(text):
+    return " ".join(tokenize(text))
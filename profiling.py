@@ -0,0 +1,167 @@
+import cProfile
+import io
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# On-demand profiling of a live worker. Two modes:
+#
+# - Stack sampling: a background thread reads sys._current_frames() every
+#   interval for a number of seconds and writes the stacks in the collapsed
+#   format flamegraph tools read ("frame;frame;frame count").
+# - Request profiling: cProfile runs on the next K requests and the combined
+#   stats are written as a .pstats file plus a text summary.
+#
+# Results are written to a directory shared by all workers, so they can be
+# fetched from any worker. Sampling costs one frame walk per thread per
+# interval; cProfile slows only the profiled requests. Both stop on their own
+# after the requested duration or count.
+
+MAX_SECONDS = 60
+MAX_REQUESTS = 1000
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+
+def positive_number(value, name):
+    # A finite number above zero from a request; ValueError for anything else
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return value
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapsed_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler:
+    def __init__(self, directory):
+        self.directory = directory
+        self.sampling = None
+        self.remaining = 0
+        self.profile = None
+        self.profile_name = None
+        self.profiled = 0
+        self._active_thread = None
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, name)
+
+    def _name(self, kind, extension):
+        return f"{kind}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+
+    def start_sampling(self, seconds, interval=0.005, match='predict'):
+        # Raises ValueError for bad arguments; seconds and interval are
+        # clamped to MAX_SECONDS and [MIN_INTERVAL, MAX_INTERVAL]
+        seconds = min(float(positive_number(seconds, 'seconds')), MAX_SECONDS)
+        interval = min(max(float(positive_number(interval, 'interval')), MIN_INTERVAL), MAX_INTERVAL)
+        if not isinstance(match, str):
+            raise ValueError('match must be a string')
+        with self._lock:
+            if self.sampling is not None:
+                raise RuntimeError('A sampling profile is already running in this worker')
+            name = self.sampling = self._name('sample', 'collapsed')
+        threading.Thread(target=self._sample, args=(name, seconds, interval, match),
+                         name='profile-sampler', daemon=True).start()
+        return name
+
+    def _sample(self, name, seconds, interval, match):
+        own = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    stack = collapsed_stack(frame)
+                    # Keep only stacks that pass through a matching function,
+                    # which drops idle threads waiting for work
+                    if not match or any(part.startswith(match) for part in stack.split(';')):
+                        stacks[stack] += 1
+                samples += 1
+                time.sleep(interval)
+            with open(self._path(name), 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            print(f"Wrote {name}: {samples} samples, {sum(stacks.values())} matching stacks")
+        finally:
+            self.sampling = None
+
+    def profile_requests(self, count):
+        if isinstance(count, float) and count.is_integer():
+            count = int(count)
+        if not isinstance(positive_number(count, 'count'), int):
+            raise ValueError('count must be a positive integer')
+        with self._lock:
+            if self.remaining:
+                raise RuntimeError('Request profiling is already armed in this worker')
+            self.profile = cProfile.Profile()
+            self.profile_name = self._name('requests', 'pstats')
+            self.profiled = 0
+            self.remaining = min(int(count), MAX_REQUESTS)
+        return self.profile_name
+
+    def before_request(self):
+        # Profiles one request at a time; concurrent ones run unprofiled
+        if not self.remaining:
+            return False
+        with self._lock:
+            if not self.remaining or self._active_thread is not None:
+                return False
+            self._active_thread = threading.get_ident()
+        self.profile.enable()
+        return True
+
+    def after_request(self):
+        if self._active_thread != threading.get_ident():
+            return
+        self.profile.disable()
+        with self._lock:
+            self._active_thread = None
+            self.profiled += 1
+            self.remaining -= 1
+            if self.remaining:
+                return
+            profile, name = self.profile, self.profile_name
+            self.profile = None
+        profile.dump_stats(self._path(name))
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(50)
+        with open(self._path(name[:-len('.pstats')] + '.txt'), 'w') as f:
+            f.write(summary.getvalue())
+        print(f"Wrote {name}: {self.profiled} requests")
+
+    def status(self):
+        try:
+            results = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            results = []
+        return {
+            'pid': os.getpid(),
+            'sampling': self.sampling,
+            'requests_remaining': self.remaining,
+            'results': results,
+        }
+
+    def result_path(self, name):
+        # Only names of files in the results directory, never other paths
+        if name in self.status()['results']:
+            return os.path.join(self.directory, name)
+        return None
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import traceback
+
+from artifacts import load_artifacts
+from preprocessing import tokenize
+from scoring import CompiledScorer, ScoringEngine
+
+
+# Clear-cut messages every model must get right before it is activated
+CANARY_MESSAGES = [
+    ("WINNER!! As a valued network customer you have been selected to receive a £900 prize reward! To claim call 09061701461.", 'spam'),
+    ("Free entry in 2 a wkly comp to win FA Cup final tkts 21st May 2005. Text FA to 87121 to receive entry question", 'spam'),
+    ("URGENT! You have won a 1 week FREE membership in our £100,000 Prize Jackpot! Txt the word: CLAIM to No: 81010", 'spam'),
+    ("SIX chances to win CASH! From 100 to 20,000 pounds txt> CSH11 and send to 87575. Cost 150p/day, 6days, 16+ TsandCs apply Reply HL 4 info", 'spam'),
+    ("Congratulations ur awarded 500 of CD vouchers or 125gift guaranteed & Free entry 2 100 wkly draw txt MUSIC to 87066", 'spam'),
+    ("Dear customer, your mobile number has won £2000 cash. To claim call our customer service on 09066364589", 'spam'),
+    ("Hey, are we still on for lunch tomorrow?", 'valid'),
+    ("I'm gonna be home soon and i don't want to talk about this stuff anymore tonight, k? I've cried enough today.", 'valid'),
+    ("Nah I don't think he goes to usf, he lives around here though", 'valid'),
+    ("Can you pick up some milk on the way back? Thanks!", 'valid'),
+    ("Sorry, I'll call later in the meeting", 'valid'),
+    ("Happy birthday! Hope you have a great day, see you at the party tonight", 'valid'),
+]
+
+
+# Optional precompiled table for SCORING_MODE=compiled (see scoring.py)
+COMPILED_MODEL_FILE = 'compiled_model.npz'
+
+
+def load_canary(path):
+    # NDJSON file of {"message": ..., "label": ...} objects
+    with open(path) as f:
+        return [(item['message'], item['label']) for item in map(json.loads, f) if item]
+
+
+def present_files(directory, filenames, optional=()):
+    # The model files plus those optional ones that exist in the directory
+    return list(filenames) + [name for name in optional if os.path.exists(os.path.join(directory, name))]
+
+
+def model_version(directory, filenames, optional=()):
+    # Content hash of the model files, so identical models get the same version
+    digest = hashlib.sha256()
+    for name in sorted(present_files(directory, filenames, optional)):
+        digest.update(name.encode() + b'\0')
+        with open(os.path.join(directory, name), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def load_engine(mode, directory):
+    # Scoring engine for a model directory in the given SCORING_MODE, plus the
+    # pickled vectorizer and model (None in mapped mode, which never loads them)
+    if mode == 'mapped':
+        return load_artifacts(directory), None, None
+    with open(os.path.join(directory, 'nb_model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    with open(os.path.join(directory, 'tfidf_vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+    compiled_path = os.path.join(directory, COMPILED_MODEL_FILE)
+    engine = None
+    if mode == 'compiled' and os.path.exists(compiled_path):
+        engine = CompiledScorer.load(compiled_path)
+        if not engine.matches(vectorizer, model):
+            # Left over from an earlier model; the pickles are authoritative
+            print(f"Ignoring {compiled_path}: it was not compiled from the pickles next to it")
+            engine = None
+    if engine is None:
+        engine = make_engine(mode, vectorizer, model)
+    return engine, vectorizer, model
+
+
+def make_engine(mode, vectorizer, model):
+    # Scoring engine for an in-memory vectorizer and model
+    if mode == 'compiled':
+        return CompiledScorer.from_sklearn(vectorizer, model)
+    return ScoringEngine(vectorizer, model)
+
+
+def files_signature(directory, filenames, optional=()):
+    signature = []
+    for name in sorted(present_files(directory, filenames, optional)):
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            return None
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ModelVersion:
+    """A loaded model: its scoring engine, indicator finder and provenance."""
+
+    def __init__(self, version, source, engine, find_indicators, vectorizer=None, model=None, load_seconds=0.0):
+        self.version = version
+        self.source = source
+        self.engine = engine
+        self.find_indicators = find_indicators
+        self.vectorizer = vectorizer
+        self.model = model
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 4),
+        }
+
+
+class ModelRegistry:
+    """Holds the active model and swaps in new ones without stopping traffic.
+
+    ``loader(directory)`` returns a ``ModelVersion``. New models are loaded
+    and checked against the canary set (in a background thread for
+    ``reload``), then activated with a single reference assignment, so a
+    request that has already read ``registry.current`` finishes on the model
+    it started with. The previous model is kept for ``rollback``.
+    ``warm(version)``, if given, is run on checked models before they are
+    activated, so the first requests on a new model are not slow.
+    """
+
+    def __init__(self, loader, canary=None, min_canary_accuracy=1.0, on_swap=None, warm=None):
+        self.loader = loader
+        self.canary = canary if canary is not None else CANARY_MESSAGES
+        self.min_canary_accuracy = min_canary_accuracy
+        self.on_swap = on_swap
+        self.warm = warm
+        self.current = None
+        self.previous = None
+        self.loading = False
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._watch_pid = None
+
+    def check_canary(self, version):
+        if not self.canary:
+            return 1.0
+        scores = version.engine.score([tokenize(message) for message, _ in self.canary])
+        correct = sum(str(score.label) == label for score, (_, label) in zip(scores, self.canary))
+        accuracy = correct / len(self.canary)
+        if accuracy < self.min_canary_accuracy:
+            raise ValueError(f"Model {version.version} failed the canary check: "
+                             f"{correct}/{len(self.canary)} correct")
+        return accuracy
+
+    def load(self, source, check=True):
+        start = time.perf_counter()
+        version = self.loader(source)
+        version.load_seconds = time.perf_counter() - start
+        if check:
+            self.check_canary(version)
+            if self.warm is not None:
+                self.warm(version)
+        return version
+
+    def activate(self, version, expected=None):
+        # With `expected`, a compare-and-swap: `version` only replaces that
+        # model, and nothing happens if another one became active meanwhile
+        with self._lock:
+            if expected is not None and self.current is not expected:
+                return False
+            if self.current is not None and self.current.version == version.version:
+                return False
+            self.previous, self.current = self.current, version
+        if self.on_swap is not None:
+            self.on_swap(version)
+        print(f"Activated model {version.version} from {version.source}")
+        return True
+
+    def _start_loading(self):
+        with self._lock:
+            if self.loading:
+                return False
+            self.loading = True
+            return True
+
+    def _reload(self, source):
+        # Returns None once the model loaded, passed its checks and is
+        # active, else the exception that stopped it
+        try:
+            self.activate(self.load(source))
+            self.last_error = None
+            return None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Model reload from {source} failed: {self.last_error}")
+            traceback.print_exc()
+            return e
+        finally:
+            self.loading = False
+
+    def reload(self, source, background=True):
+        if not self._start_loading():
+            return False
+        if background:
+            threading.Thread(target=self._reload, args=(source,), name='model-reload', daemon=True).start()
+            return True
+        return self._reload(source) is None
+
+    def rollback(self):
+        with self._lock:
+            if self.previous is None:
+                return False
+            self.current, self.previous = self.previous, self.current
+            version = self.current
+        if self.on_swap is not None:
+            self.on_swap(version)
+        print(f"Rolled back to model {version.version}")
+        return True
+
+    def watch(self, source, filenames, interval, optional=()):
+        # Poll the model files and reload when they change. Idempotent per
+        # process, so it can be called after a fork (e.g. gunicorn preload).
+        # A change that is loaded, or rejected by the canary check or the
+        # loader, is marked as seen and not tried again until the files
+        # change. A reload skipped because another one is in progress, or
+        # stopped by an OSError (files replaced while being read), is tried
+        # again on the next poll.
+        with self._lock:
+            if self._watch_pid == os.getpid():
+                return
+            self._watch_pid = os.getpid()
+
+        def poll():
+            seen = files_signature(source, filenames, optional)
+            while True:
+                time.sleep(interval)
+                signature = files_signature(source, filenames, optional)
+                if signature is None or signature == seen:
+                    continue
+                try:
+                    version = model_version(source, filenames, optional)
+                except OSError:
+                    continue  # replaced while we read it
+                if version == getattr(self.current, 'version', None):
+                    seen = signature
+                elif self._start_loading() and not isinstance(self._reload(source), OSError):
+                    seen = signature
+
+        threading.Thread(target=poll, name='model-watch', daemon=True).start()
+
+    def status(self):
+        return {
+            'current': self.current.describe() if self.current else None,
+            'previous': self.previous.describe() if self.previous else None,
+            'loading': self.loading,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,176 @@
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+# Buffered request log: one JSON line per scored message.
+#
+# Request handlers only put a record on a bounded in-memory queue. A
+# background thread takes records off it in batches and writes each batch
+# with a single write call (plus an fsync when asked), so disk latency never
+# lands on a request. When the writer falls behind and the queue is full,
+# the "drop" policy discards new records and counts them, and "block" makes
+# the request wait for room, up to block_timeout seconds, before dropping.
+#
+# The file is rotated when it reaches max_bytes or is older than
+# rotate_seconds: it is renamed to "<path>.<timestamp>", optionally gzipped,
+# and only the newest `backups` rotated files are kept (0 keeps them all). A
+# "{pid}" in the path is replaced by the process id, so every worker writes
+# its own file. With rotation on, the path must contain it: a worker renaming
+# a file that other workers still have open would leave their appends going
+# to the rotated file, where the next rotation or cleanup loses them.
+
+STOP = object()
+
+
+class RequestLogger:
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval=1.0, policy='drop',
+                 block_timeout=1.0, max_bytes=100 * 1024 * 1024, rotate_seconds=0, compress=False,
+                 backups=10, fsync=False):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown request log policy {policy!r} (use drop or block)")
+        if (max_bytes or rotate_seconds) and '{pid}' not in path:
+            raise ValueError(f"Request log path {path!r} needs a {{pid}} placeholder when rotation is on "
+                             f"(or set max_bytes=0 and rotate_seconds=0)")
+        self.path_template = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.backups = backups
+        self.fsync = fsync
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.last_error = None
+        self.queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def log(self, record, block=True):
+        # block=False never waits, whatever the policy: for callers on an
+        # event loop
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            if self.policy == 'block' and block:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        # One queue and writer thread per process, started on first use
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.max_queue)
+            self.path = self.path_template.replace('{pid}', str(os.getpid()))
+            thread = threading.Thread(target=self._run, name='request-log', daemon=True)
+            thread.start()
+            atexit.register(self.close, thread)
+            self._pid = os.getpid()
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, 'ab')
+        opened = time.time()
+        while True:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = STOP in batch
+            records = [record for record in batch if record is not STOP]
+            if records:
+                try:
+                    f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode())
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                    self.written += len(records)
+                except (OSError, TypeError, ValueError) as e:
+                    self.dropped += len(records)
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    print(f"Request log write failed: {self.last_error}")
+            if stop:
+                f.close()
+                return
+            if f.tell() and (f.tell() >= self.max_bytes
+                             or self.rotate_seconds and time.time() - opened >= self.rotate_seconds):
+                f.close()
+                self._rotate()
+                f = open(self.path, 'ab')
+                opened = time.time()
+
+    def _rotate(self):
+        rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        suffix = 0
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz'):
+            suffix += 1
+            rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+        try:
+            os.replace(self.path, rotated)
+            if self.compress:
+                # Records keep queueing while this runs on the writer thread
+                with open(rotated, 'rb') as source, gzip.open(rotated + '.gz', 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(rotated)
+            self.rotations += 1
+            if self.backups:
+                old_files = sorted(glob.glob(glob.escape(self.path) + '.*'), key=os.path.getmtime)
+                for old in old_files[:-self.backups]:
+                    os.remove(old)
+        except OSError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Request log rotation failed: {self.last_error}")
+
+    def close(self, thread=None, timeout=5.0):
+        # Write out what is queued; called at exit
+        if self.queue is None or self._pid != os.getpid():
+            return
+        try:
+            self.queue.put(STOP, timeout=timeout)
+        except queue.Full:
+            return
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            'path': self.path_template,
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'rotations': self.rotations,
+            'last_error': self.last_error,
+        }
+
+
+def read_request_log(paths):
+    # Records from log files (plain or .gz), in the order given
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
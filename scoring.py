@@ -0,0 +1,239 @@
+import copy
+import math
+from collections import namedtuple
+
+import numpy as np
+
+
+# Result of scoring one message: predicted label, spam probability (0-1) and
+# the raw log-odds of spam versus the other classes
+Score = namedtuple('Score', ['label', 'spam_probability', 'log_odds'])
+
+
+def is_plain_word_vectorizer(vectorizer):
+    # Unigram word analyzer with the default token pattern, which on
+    # tokenize() output keeps exactly the tokens of two or more letters
+    return (vectorizer.analyzer == 'word' and vectorizer.ngram_range == (1, 1)
+            and vectorizer.tokenizer is None and vectorizer.preprocessor is None
+            and vectorizer.token_pattern == r'(?u)\b\w\w+\b')
+
+
+def pretokenized_analyzer(tokens):
+    return [token for token in tokens if len(token) > 1]
+
+
+class ScoringEngine:
+    """Scores tokenized messages with a TF-IDF vectorizer and MultinomialNB.
+
+    Everything that does not depend on the input (class order, spam column,
+    log-priors, transposed log-probabilities) is resolved once here, and the
+    joint log-likelihood is computed a single time per message. Labels and
+    probabilities are derived from it the same way ``model.predict`` and
+    ``model.predict_proba`` do, so the numbers are identical.
+
+    Token lists from ``tokenize`` are fed to a copy of the vectorizer whose
+    analyzer accepts them as-is, so the text is not joined and re-tokenized.
+    """
+
+    def __init__(self, vectorizer, model, spam_label='spam'):
+        # Imported here so the compiled and mapped scorers do not pull in scipy
+        from scipy.special import logsumexp
+        self.logsumexp = logsumexp
+        self.vectorizer = vectorizer
+        self.model = model
+        self.classes = model.classes_
+        self.spam_idx = list(self.classes).index(spam_label) if spam_label in self.classes else 1
+        self.other_idx = [i for i in range(len(self.classes)) if i != self.spam_idx]
+        self.class_log_prior = model.class_log_prior_
+        self.feature_log_prob_t = np.ascontiguousarray(model.feature_log_prob_.T)
+        if is_plain_word_vectorizer(vectorizer):
+            self.token_vectorizer = copy.copy(vectorizer)
+            self.token_vectorizer.analyzer = pretokenized_analyzer
+        else:
+            self.token_vectorizer = None
+
+    def vectorize(self, token_lists):
+        if self.token_vectorizer is None:
+            return self.vectorizer.transform([' '.join(tokens) for tokens in token_lists])
+        return self.token_vectorizer.transform(token_lists)
+
+    def joint_log_likelihood(self, message_vectors):
+        # Same computation as MultinomialNB._joint_log_likelihood
+        return message_vectors @ self.feature_log_prob_t + self.class_log_prior
+
+    def score_vectors(self, message_vectors):
+        jll = self.joint_log_likelihood(message_vectors)
+        log_prob_x = self.logsumexp(jll, axis=1)
+        spam_probabilities = np.exp(jll[:, self.spam_idx] - log_prob_x)
+        labels = self.classes[np.argmax(jll, axis=1)]
+        if len(self.other_idx) == 1:
+            log_odds = jll[:, self.spam_idx] - jll[:, self.other_idx[0]]
+        else:
+            log_odds = jll[:, self.spam_idx] - self.logsumexp(jll[:, self.other_idx], axis=1)
+        return [Score(*row) for row in zip(labels, spam_probabilities, log_odds)]
+
+    def score(self, token_lists):
+        return self.score_vectors(self.vectorize(token_lists))
+
+    def score_one(self, tokens):
+        return self.score([tokens])[0]
+
+
+class CompiledScorer:
+    """TF-IDF + MultinomialNB flattened into a per-token lookup table.
+
+    ``table`` maps each vocabulary term to its idf and per-class
+    log-probabilities, so a message is scored with one dict lookup per token
+    and a weighted sum over its own few terms instead of building a sparse
+    matrix. At SMS lengths plain float arithmetic beats gathering rows into
+    NumPy arrays; the arrays are kept for ``export``. Only the plain word
+    analyzer is supported, which is all ``tokenize`` output needs.
+    """
+
+    def __init__(self, terms, idf, log_prob, class_log_prior, classes,
+                 norm='l2', sublinear_tf=False, binary=False, spam_label='spam'):
+        self.terms = list(terms)
+        self.idf = np.ascontiguousarray(idf, dtype=np.float64)
+        self.log_prob = np.ascontiguousarray(log_prob, dtype=np.float64)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.labels = self.classes.tolist()
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self.binary = binary
+        self.spam_idx = list(self.classes).index(spam_label) if spam_label in self.classes else 1
+        self.other_idx = [i for i in range(len(self.classes)) if i != self.spam_idx]
+        self.table = {
+            term: (idf, tuple(log_prob))
+            for term, idf, log_prob in zip(self.terms, self.idf.tolist(), self.log_prob.tolist())
+        }
+        self.prior = self.class_log_prior.tolist()
+        self.fast_path = len(self.prior) == 2 and norm == 'l2' and not sublinear_tf and not binary
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, model, spam_label='spam'):
+        if not hasattr(vectorizer, 'vocabulary_'):
+            raise ValueError('Hashing vectorizers have no vocabulary to compile; use SCORING_MODE=sklearn')
+        if not is_plain_word_vectorizer(vectorizer):
+            raise ValueError('Only unigram word vectorizers with the default token pattern can be compiled')
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, column in vectorizer.vocabulary_.items():
+            terms[column] = term
+        if vectorizer.use_idf:
+            idf = vectorizer.idf_
+        else:
+            idf = np.ones(len(terms))
+        return cls(terms, idf, model.feature_log_prob_.T, model.class_log_prior_, model.classes_,
+                   norm=vectorizer.norm, sublinear_tf=vectorizer.sublinear_tf,
+                   binary=vectorizer.binary, spam_label=spam_label)
+
+    def float_arrays(self):
+        return self.idf, self.log_prob
+
+    def matches(self, vectorizer, model):
+        # Whether this table holds exactly what from_sklearn would build from
+        # the given vectorizer and model
+        vocabulary = getattr(vectorizer, 'vocabulary_', None)
+        if vocabulary is None or len(vocabulary) != len(self.terms):
+            return False
+        if any(vocabulary.get(term) != column for column, term in enumerate(self.terms)):
+            return False
+        idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(self.terms))
+        return (self.norm == vectorizer.norm and self.sublinear_tf == vectorizer.sublinear_tf
+                and self.binary == vectorizer.binary
+                and np.array_equal(self.classes, model.classes_)
+                and np.array_equal(self.idf, idf)
+                and np.array_equal(self.log_prob, model.feature_log_prob_.T)
+                and np.array_equal(self.class_log_prior, model.class_log_prior_))
+
+    def export(self, path):
+        np.savez(path, terms=np.array(self.terms), idf=self.idf, log_prob=self.log_prob,
+                 class_log_prior=self.class_log_prior, classes=self.classes,
+                 options=np.array([str(self.norm), str(self.sublinear_tf), str(self.binary)]))
+
+    @classmethod
+    def load(cls, path, spam_label='spam'):
+        with np.load(path) as data:
+            norm, sublinear_tf, binary = data['options'].tolist()
+            return cls(data['terms'].tolist(), data['idf'], data['log_prob'],
+                       data['class_log_prior'], data['classes'],
+                       norm=None if norm == 'None' else norm,
+                       sublinear_tf=sublinear_tf == 'True', binary=binary == 'True',
+                       spam_label=spam_label)
+
+    def joint_log_likelihood(self, tokens):
+        # Term frequencies of the in-vocabulary tokens
+        table = self.table
+        counts = {}
+        for token in tokens:
+            if token in table:
+                counts[token] = counts.get(token, 0) + 1
+        if not counts:
+            return list(self.prior)
+
+        # Fast path for the default two-class, raw tf, l2-normalised setup
+        if self.fast_path:
+            norm = first_sum = second_sum = 0.0
+            for term, count in counts.items():
+                idf, (first, second) = table[term]
+                weight = count * idf
+                norm += weight * weight
+                first_sum += weight * first
+                second_sum += weight * second
+            norm = math.sqrt(norm)
+            return [self.prior[0] + first_sum / norm, self.prior[1] + second_sum / norm]
+
+        sums = [0.0] * len(self.prior)
+        norm = 0.0
+        for term, count in counts.items():
+            idf, log_prob = table[term]
+            if self.binary:
+                weight = idf
+            elif self.sublinear_tf:
+                weight = (math.log(count) + 1) * idf
+            else:
+                weight = count * idf
+            if self.norm == 'l1':
+                norm += abs(weight)
+            else:
+                norm += weight * weight
+            for k, value in enumerate(log_prob):
+                sums[k] += weight * value
+        if self.norm == 'l2':
+            norm = math.sqrt(norm)
+        elif self.norm is None:
+            norm = 1.0
+        return [prior + total / norm for prior, total in zip(self.prior, sums)]
+
+    def score_tokens(self, tokens):
+        jll = self.joint_log_likelihood(tokens)
+        top = max(jll)
+        log_prob_x = top + math.log(sum(math.exp(value - top) for value in jll))
+        spam_jll = jll[self.spam_idx]
+        others = [jll[i] for i in self.other_idx]
+        if len(others) == 1:
+            log_odds = spam_jll - others[0]
+        else:
+            top_other = max(others)
+            log_odds = spam_jll - (top_other + math.log(sum(math.exp(value - top_other) for value in others)))
+        return Score(self.labels[jll.index(top)], math.exp(spam_jll - log_prob_x), log_odds)
+
+    def score(self, token_lists):
+        return [self.score_tokens(tokens) for tokens in token_lists]
+
+    def score_one(self, tokens):
+        return self.score_tokens(tokens)
+
+
+if __name__ == '__main__':
+    # Export the compiled table: python scoring.py compiled_model.npz
+    import pickle
+    import sys
+
+    with open('nb_model.pkl', 'rb') as f:
+        model = pickle.load(f)
+    with open('tfidf_vectorizer.pkl', 'rb') as f:
+        vectorizer = pickle.load(f)
+    path = sys.argv[1] if len(sys.argv) > 1 else 'compiled_model.npz'
+    CompiledScorer.from_sklearn(vectorizer, model).export(path)
+    print(f"Wrote compiled model to {path}")
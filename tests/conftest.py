@@ -0,0 +1,54 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def pickles():
+    # The shipped vectorizer and model
+    with open(os.path.join(ROOT, 'tfidf_vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+    with open(os.path.join(ROOT, 'nb_model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    return vectorizer, model
+
+
+@pytest.fixture(scope='session')
+def messages(pickles):
+    # Hand-written samples plus seeded random messages over the whole
+    # vocabulary, with noise the preprocessing has to strip
+    import random
+
+    from warmup import SAMPLE_MESSAGES
+
+    vectorizer, _ = pickles
+    rng = random.Random(0)
+    vocabulary = sorted(vectorizer.vocabulary_)
+    noise = ['FREE!!!', '£1000', '0800-123-456', 'www.example.com', "don't", 'the', 'U', ':)', 'Ünïcödé']
+    generated = [' '.join(rng.choice(vocabulary) if rng.random() < 0.8 else rng.choice(noise)
+                          for _ in range(rng.randint(1, 30)))
+                 for _ in range(2000)]
+    return list(SAMPLE_MESSAGES) + ['', '!!!', 'zzzz qqqq'] + generated
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    # app.py loads the model from MODEL_DIR (the repo root) on import
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    assert app.registry.current is not None
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
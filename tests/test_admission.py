@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+
+import pytest
+
+from admission import (DEADLINE_KEY, AdmissionController, AdmissionMiddleware, Deadline, Rejected,
+                       parse_request_start, request_deadline)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1700000000.5', 1700000000.5),
+    ('t=1700000000.5', 1700000000.5),
+    ('1700000000500', 1700000000.5),  # milliseconds (Heroku)
+    ('1700000000500000', 1700000000.5),  # microseconds
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_request_start(value, expected):
+    assert parse_request_start(value) == expected
+
+
+def test_stale_requests_are_rejected():
+    with pytest.raises(Rejected) as e:
+        request_deadline(f't={time.time() - 1:.6f}', max_queue_seconds=0.5)
+    assert (e.value.status, e.value.reason) == (503, 'stale')
+    assert request_deadline(f't={time.time():.6f}', max_queue_seconds=0.5) is None
+
+
+def test_deadline_counts_from_arrival():
+    deadline = request_deadline(f't={time.time() - 0.2:.6f}', deadline_seconds=0.25)
+    assert 0 < deadline.remaining() < 0.06
+    expired = Deadline(time.perf_counter() - 1)
+    assert expired.expired()
+    with pytest.raises(Rejected) as e:
+        expired.check('score')
+    assert (e.value.status, e.value.reason) == (503, 'deadline')
+
+
+def test_controller_queues_then_rejects():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+    controller.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        controller.acquire()
+        admitted.set()
+        controller.release()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while not controller.waiting:
+        time.sleep(0.001)
+    with pytest.raises(Rejected) as e:
+        controller.acquire()  # the queue is full
+    assert (e.value.status, e.value.reason) == (429, 'queue_full')
+    controller.release()
+    thread.join(5)
+    assert admitted.is_set()
+    assert controller.stats()['active'] == 0
+    assert (controller.admitted, controller.rejected) == (2, 1)
+
+
+def test_controller_queue_timeout():
+    controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+    controller.acquire()
+    with pytest.raises(Rejected) as e:
+        controller.acquire()
+    assert (e.value.status, e.value.reason) == (503, 'queue_timeout')
+
+
+def test_middleware():
+    seen = []
+
+    def app(environ, start_response):
+        seen.append(environ.get(DEADLINE_KEY))
+        start_response('200 OK', [])
+        return [b'ok']
+
+    rejections = []
+    middleware = AdmissionMiddleware(app, AdmissionController(), {'/predict': 'predict'}, deadline_seconds=1,
+                                     max_queue_seconds=0.1, on_reject=lambda name, e: rejections.append(name))
+    statuses = []
+
+    def call(path, method='POST', waited=0.0):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': method, 'HTTP_X_REQUEST_START': f't={time.time() - waited:.6f}'}
+        return b''.join(middleware(environ, lambda status, headers: statuses.append((status, dict(headers)))))
+
+    assert call('/predict') == b'ok' and isinstance(seen[-1], Deadline)
+    assert call('/metrics', 'GET') == b'ok' and seen[-1] is None
+    body = call('/predict', waited=1)
+    assert statuses[-1][0].startswith('503') and statuses[-1][1]['Retry-After'] == '1'
+    assert 'waited' in json.loads(body)['error']
+    assert rejections == ['predict']
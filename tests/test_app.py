@@ -0,0 +1,57 @@
+def test_predict(client, app_module):
+    response = client.post('/predict', json={'message': 'WINNER!! Claim your free prize now, call 09061701461'})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['prediction'] == 'spam'
+    assert 0 <= data['spam_probability'] <= 100
+    assert data['model_version'] == app_module.registry.current.version
+    assert data['message'].startswith('WINNER')
+
+
+def test_predict_errors(client):
+    assert client.post('/predict', json={'message': ''}).get_json() == {'error': 'No message provided'}
+    assert client.post('/predict', json={}).get_json() == {'error': 'No message provided'}
+    for body in ({'message': 5}, {'message': None}, {'message': ['free', 'cash']}, ['free cash'], 'free cash'):
+        response = client.post('/predict', json=body)
+        assert response.status_code == 400 and response.get_json() == {'error': 'Invalid message'}
+
+
+def test_batch_error_items(client):
+    items = ['Free entry to win cash, text WIN now', {'message': 'see you at lunch'}, 42, {}, '',
+             None, {'message': ['not', 'text']}]
+    response = client.post('/predict/batch', json=items)
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['count'] == len(items)
+    results = data['results']
+    assert [result.get('error') for result in results] == [
+        None, None, 'Invalid message', 'No message provided', 'No message provided',
+        'Invalid message', 'Invalid message']
+    assert results[0]['message'] == items[0] and results[0]['prediction'] == 'spam'
+    assert results[1]['message'] == 'see you at lunch' and results[1]['prediction'] == 'valid'
+
+
+def test_batch_matches_single_predictions(client):
+    messages = ['Free entry to win cash, text WIN now', 'see you at lunch', 'URGENT! Your prize awaits']
+    batch = client.post('/predict/batch', json={'messages': messages}).get_json()['results']
+    single = [client.post('/predict', json={'message': message}).get_json() for message in messages]
+    for one, many in zip(single, batch):
+        assert {key: one[key] for key in many} == many
+
+
+def test_batch_ndjson_and_request_errors(client, app_module):
+    body = '"free cash prize"\n{"message": "lunch?"}\n{not json\n\n'
+    results = client.post('/predict/batch', data=body, content_type='application/x-ndjson').get_json()['results']
+    assert [result.get('error') for result in results] == [None, None, 'Invalid message']
+    assert client.post('/predict/batch', json=[]).status_code == 400
+    assert client.post('/predict/batch', json={'messages': 'x'}).status_code == 400
+    too_many = ['hi'] * (app_module.MAX_BATCH_SIZE + 1)
+    assert client.post('/predict/batch', json=too_many).status_code == 413
+
+
+def test_message_too_long(client, app_module):
+    too_long = 'a' * (app_module.MAX_MESSAGE_LENGTH + 1)
+    assert client.post('/predict', json={'message': too_long}).status_code == 413
+    results = client.post('/predict/batch', json=['free cash prize', too_long]).get_json()['results']
+    assert results[0]['prediction'] == 'spam'
+    assert results[1] == {'error': f'Message too long (max {app_module.MAX_MESSAGE_LENGTH} characters)'}
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from admission import Deadline, Rejected
+
+
+@pytest.fixture(scope='module')
+def asgi(app_module):
+    import asgi
+    return asgi
+
+
+def test_concurrent_calls_are_batched(asgi):
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = asgi.MicroBatcher(double, max_batch_size=4, max_wait=0.05)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    assert asyncio.run(main()) == [i * 2 for i in range(10)]
+    assert calls == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert batcher.stats()['batches'] == 3 and batcher.stats()['mean_batch_size'] == 3.33
+
+
+def test_errors_and_expired_deadlines(asgi):
+    def fail(items):
+        raise RuntimeError('boom')
+
+    batcher = asgi.MicroBatcher(fail, max_wait=0)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await batcher.submit(1)
+        with pytest.raises(Rejected):
+            await batcher.submit(2, Deadline(time.perf_counter() - 1))
+
+    asyncio.run(main())
+    assert batcher.stats()['expired'] == 1 and batcher.stats()['items'] == 1
+
+
+def call(asgi, path, body=b'', method='POST', headers=()):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+             'headers': [(b'content-type', b'application/json'), *headers]}
+    asyncio.run(asgi.app(scope, receive, send))
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+
+def test_predict_matches_flask(asgi, client):
+    message = 'WINNER!! Claim your free prize now, call 09061701461'
+    status, data = call(asgi, '/predict', json.dumps({'message': message}).encode())
+    assert status == 200 and data == client.post('/predict', json={'message': message}).get_json()
+    # Errors are passed through to Flask
+    status, data = call(asgi, '/predict', b'{"message": ""}')
+    assert (status, data) == (200, {'error': 'No message provided'})
+    status, data = call(asgi, '/predict', b'{"message": 5}')
+    assert (status, data) == (400, {'error': 'Invalid message'})
+    status, data = call(asgi, '/batcher/stats', method='GET')
+    assert status == 200 and data['batches'] >= 1
@@ -0,0 +1,43 @@
+import csv
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def bulk_score(*args, stdin=None):
+    result = subprocess.run([sys.executable, 'bulk_score.py', *map(str, args), '--model-dir', ROOT],
+                            cwd=ROOT, input=stdin, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def test_ndjson_matches_the_batch_endpoint(client):
+    lines = ['"free cash prize"', '{"message": "see you at lunch"}', '{"message": 3}', '{not json', '""']
+    output = bulk_score('-', '--chunk-size', 2, stdin='\n'.join(lines) + '\n')
+    results = [json.loads(line) for line in output.splitlines()]
+    expected = client.post('/predict/batch', json=['free cash prize', 'see you at lunch']).get_json()['results']
+    for result, reference in zip(results, expected):
+        assert result == {key: reference[key] for key in result}
+    assert results[2:] == [{'error': 'Invalid message'}] * 2 + [{'error': 'No message provided'}]
+
+
+def test_csv_resume_and_workers(tmp_path, messages):
+    path = tmp_path / 'messages.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'message'])
+        writer.writerows(enumerate(messages[:300]))
+    bulk_score(path, '-o', tmp_path / 'whole.csv', '--chunk-size', 64)
+    # A run stopped after 100 records, resumed from that offset
+    bulk_score(path, '-o', tmp_path / 'resumed.csv', '--chunk-size', 64)
+    with open(tmp_path / 'resumed.csv') as f:
+        head = f.readlines()[:101]
+    (tmp_path / 'resumed.csv').write_text(''.join(head))
+    bulk_score(path, '-o', tmp_path / 'resumed.csv', '--chunk-size', 64, '--offset', 100)
+    bulk_score(path, '-o', tmp_path / 'parallel.csv', '--chunk-size', 16, '--workers', 2)
+    whole = (tmp_path / 'whole.csv').read_text()
+    assert (tmp_path / 'resumed.csv').read_text() == whole
+    assert (tmp_path / 'parallel.csv').read_text() == whole
+    rows = list(csv.DictReader(whole.splitlines()))
+    assert len(rows) == 300 and rows[0].keys() >= {'id', 'message', 'prediction', 'spam_probability', 'error'}
@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+from cache import PredictionCache, RedisCache, SharedMemoryCache, cache_key
+
+RESULT = {'prediction': 'spam', 'spam_probability': 97.5, 'spam_indicators': ['free', 'win']}
+
+
+def keys(count, namespace='v1'):
+    return [cache_key([f'token{i}'], namespace) for i in range(count)]
+
+
+def test_cache_key_is_namespaced_by_model_version():
+    assert cache_key(['free', 'prize'], 'a') == cache_key(['free', 'prize'], 'a')
+    assert cache_key(['free', 'prize'], 'a') != cache_key(['free', 'prize'], 'b')
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = PredictionCache(capacity=2)
+    a, b, c = keys(3)
+    cache.set(a, 1)
+    cache.set(b, 2)
+    assert cache.get(a) == 1  # b is now the oldest
+    cache.set(c, 3)
+    assert cache.get(b) is None
+    assert cache.get(a) == 1 and cache.get(c) == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_cache_ttl():
+    cache = PredictionCache(capacity=2, ttl=0.05)
+    key, = keys(1)
+    cache.set(key, 1)
+    assert cache.get(key) == 1
+    time.sleep(0.1)
+    assert cache.get(key) is None
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+def test_shared_cache_round_trip_between_instances(path):
+    writer = SharedMemoryCache(path, capacity=64)
+    reader = SharedMemoryCache(path, capacity=64)  # as another worker
+    key, other = keys(2)
+    writer.set(key, RESULT)
+    assert reader.get(key) == RESULT
+    assert reader.get(other) is None
+    stats = writer.stats()
+    assert (stats['hits'], stats['misses'], stats['sets']) == (1, 1, 1)
+
+
+def test_shared_cache_layout(path):
+    cache = SharedMemoryCache(path, capacity=64)
+    assert os.path.getsize(path) == cache.HEADER_SIZE + 128 * cache.SLOT_SIZE
+    assert cache.HEADER.size == cache.HEADER_SIZE
+    assert cache.COUNTERS_OFFSET + cache.COUNTERS.size == cache.HEADER_SIZE
+    assert cache.SLOT.size < cache.SLOT_SIZE
+
+
+def test_shared_cache_overwrites_when_probes_are_full(path):
+    cache = SharedMemoryCache(path, capacity=4)  # 8 slots
+    all_keys = keys(20)
+    for i, key in enumerate(all_keys):
+        cache.set(key, i)
+    stats = cache.stats()
+    assert stats['sets'] == 20
+    assert stats['evictions'] == 12
+    assert cache.get(all_keys[-1]) == 19
+    assert sum(cache.get(key) is not None for key in all_keys) == 8
+
+
+def test_shared_cache_ttl_and_invalidate(path):
+    cache = SharedMemoryCache(path, capacity=16, ttl=0.05)
+    a, b = keys(2)
+    cache.set(a, 1)
+    assert cache.get(a) == 1
+    time.sleep(0.1)
+    assert cache.get(a) is None
+    cache.set(b, 2)
+    cache.invalidate()
+    assert cache.get(b) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_shared_cache_counts_oversized_results(path):
+    cache = SharedMemoryCache(path, capacity=16)
+    key, = keys(1)
+    cache.set(key, {'spam_indicators': ['x' * 300]})
+    assert cache.get(key) is None
+    assert cache.stats()['oversized'] == 1
+    assert cache.stats()['sets'] == 0
+
+
+@pytest.mark.parametrize('capacity', [8, 128])
+def test_shared_cache_layout_change_leaves_mapped_tables_alone(path, capacity):
+    # A rolling restart with another PREDICTION_CACHE_SIZE: old workers keep
+    # a working table, new ones get an empty one with the new layout
+    old = SharedMemoryCache(path, capacity=32)
+    a, b = keys(2)
+    old.set(a, 1)
+    new = SharedMemoryCache(path, capacity=capacity)
+    assert os.path.getsize(path) == new.HEADER_SIZE + capacity * 2 * new.SLOT_SIZE
+    assert new.get(a) is None
+    assert old.get(a) == 1
+    old.set(b, 2)
+    assert old.get(b) == 2 and new.get(b) is None
+    # Workers started later share the new table
+    assert SharedMemoryCache(path, capacity=capacity).stats()['misses'] == 2
+
+
+def test_shared_cache_replaces_files_of_another_format(path):
+    with open(path, 'wb') as f:
+        f.write(b'not a cache' * 100)
+    cache = SharedMemoryCache(path, capacity=16)
+    key, = keys(1)
+    cache.set(key, 1)
+    assert cache.get(key) == 1
+    assert os.listdir(os.path.dirname(path)) == ['cache']
+
+
+class FailingRedis:
+    def get(self, name):
+        raise ConnectionError('Redis is down')
+
+    def set(self, name, value, ex=None):
+        raise TimeoutError('Redis timed out')
+
+
+def test_redis_errors_are_misses():
+    cache = RedisCache(FailingRedis())
+    key = cache_key(['free', 'prize'], 'v1')
+    assert cache.get(key) is None
+    cache.set(key, {'prediction': 'spam'})
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 0 and stats['errors'] == 2
@@ -0,0 +1,50 @@
+import pytest
+
+from campaigns import CampaignIndex
+from preprocessing import tokenize
+
+TEMPLATE = 'Congratulations you have won a free cruise holiday call now to claim your prize before midnight'
+
+
+def mutations(count):
+    return [tokenize(f'{TEMPLATE} ref {i}') for i in range(count)]
+
+
+def test_mutated_copies_join_one_campaign():
+    index = CampaignIndex()
+    first, *rest = index.observe_many(mutations(5), now=0)
+    assert first is None  # a campaign is only created once a second message joins
+    assert all(campaign is rest[0] for campaign in rest)
+    assert rest[0].size == 5 and rest[0].live == 5
+    assert index.observe(tokenize('are we still on for lunch tomorrow'), now=0) is None
+    assert index.observe([], now=0) is None
+    stats = index.stats()
+    assert stats['messages'] == 6 and stats['campaigns'] == 1 and stats['matched'] == 4
+
+
+def test_messages_outside_the_window_are_evicted():
+    index = CampaignIndex(window=10)
+    index.observe_many(mutations(3), now=0)
+    assert index.observe(tokenize(f'{TEMPLATE} ref 99'), now=100) is None
+    stats = index.stats()
+    assert stats['evicted'] == 3 and stats['messages'] == 1 and stats['campaigns'] == 0
+
+
+def test_ring_buffer_wraps_around():
+    index = CampaignIndex(max_messages=4)
+    campaigns = index.observe_many(mutations(10), now=0)
+    assert index.stats()['messages'] == 4 and index.evicted == 6
+    # The campaign lives on in the messages still in the ring
+    assert campaigns[-1] is not None and campaigns[-1].live == 4 and campaigns[-1].size == 10
+    others = ['are we still on for lunch tomorrow', 'running late, start without me',
+              'can you pick up milk on the way home', 'happy birthday mate, have a great one']
+    assert index.observe_many([tokenize(message) for message in others], now=0) == [None] * 4
+    assert not index.campaigns
+    # Every bucket entry points at a message still in the ring
+    for bucket in index.buckets:
+        assert all(index.oldest <= seq < index.next for seq in bucket.values())
+
+
+def test_invalid_banding():
+    with pytest.raises(ValueError):
+        CampaignIndex(num_perm=8, bands=4, rows=4)
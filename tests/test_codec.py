@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import codec
+
+DATA = {'prediction': 'spam', 'spam_probability': 97.5, 'spam_indicators': ['free'], 'message': 'Félicitations €'}
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def json_backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(codec, 'orjson', None)
+    elif codec.orjson is None:
+        pytest.skip('orjson is not installed')
+    return request.param
+
+
+def test_json_round_trip_with_sorted_keys(json_backend):
+    body = codec.encode(DATA, codec.JSON)
+    assert json.loads(body) == DATA
+    assert list(json.loads(body)) == sorted(DATA)
+    assert codec.decode('application/json', body) == DATA
+
+
+def test_malformed_bodies_raise_value_error(json_backend):
+    with pytest.raises(ValueError):
+        codec.decode(codec.JSON, b'{"message": ')
+
+
+@pytest.mark.skipif(codec.msgpack is None, reason='msgpack is not installed')
+def test_msgpack_round_trip():
+    body = codec.encode(DATA, codec.MSGPACK)
+    assert codec.decode(codec.MSGPACK, body) == DATA
+    assert codec.decode('application/x-msgpack', body) == DATA
+    with pytest.raises(ValueError):
+        codec.decode(codec.MSGPACK, b'\xc1')
+
+
+@pytest.mark.skipif(codec.msgpack is None, reason='msgpack is not installed')
+@pytest.mark.parametrize('accept, request_type, expected', [
+    (None, codec.JSON, codec.JSON),
+    (None, codec.MSGPACK, codec.MSGPACK),
+    ('*/*', codec.MSGPACK, codec.MSGPACK),
+    ('application/msgpack', codec.JSON, codec.MSGPACK),
+    ('application/x-msgpack', codec.JSON, codec.MSGPACK),
+    ('application/json', codec.MSGPACK, codec.JSON),
+    ('application/json;q=0.5, application/msgpack', codec.JSON, codec.MSGPACK),
+    ('text/html', codec.JSON, codec.JSON),
+])
+def test_negotiate(accept, request_type, expected):
+    assert codec.negotiate(accept, request_type) == expected
+
+
+def test_negotiate_without_msgpack(monkeypatch):
+    monkeypatch.setattr(codec, 'msgpack', None)
+    assert codec.negotiate('application/msgpack', codec.MSGPACK) == codec.JSON
+    with pytest.raises(ValueError):
+        codec.decode(codec.MSGPACK, b'\x80')
+
+
+def test_request_bodies(client):
+    assert 'message' not in client.post('/predict?echo=0', json={'message': 'see you at lunch'}).get_json()
+    assert client.post('/predict', data='message', content_type='text/plain').status_code == 415
+    assert client.post('/predict', data='{"message": ', content_type='application/json').status_code == 400
+
+
+@pytest.mark.skipif(codec.msgpack is None, reason='msgpack is not installed')
+def test_msgpack_requests(client):
+    body = codec.encode({'messages': ['free cash prize', 3]}, codec.MSGPACK)
+    response = client.post('/predict/batch', data=body, content_type=codec.MSGPACK)
+    assert response.mimetype == codec.MSGPACK
+    results = codec.decode(codec.MSGPACK, response.data)['results']
+    assert results[0]['prediction'] == 'spam' and results[1] == {'error': 'Invalid message'}
+    response = client.post('/predict', json={'message': 'free cash prize'}, headers={'Accept': codec.MSGPACK})
+    assert codec.decode(codec.MSGPACK, response.data)['prediction'] == 'spam'
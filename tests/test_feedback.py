@@ -0,0 +1,95 @@
+import pytest
+
+from feedback import FeedbackLearner, JournalFull
+from indicators import find_spam_indicators
+from preprocessing import tokenize
+from registry import ModelRegistry, ModelVersion
+from scoring import ScoringEngine
+
+MESSAGE = 'Are you around this evening? Call me about the tickets'
+
+
+def build(version, vectorizer, model):
+    return ModelVersion(version, 'feedback', ScoringEngine(vectorizer, model), find_spam_indicators,
+                        vectorizer=vectorizer, model=model)
+
+
+@pytest.fixture
+def registry(pickles):
+    registry = ModelRegistry(None)
+    registry.activate(build('base', *pickles))
+    return registry
+
+
+def spam_probability(registry, message=MESSAGE):
+    return registry.current.engine.score_one(tokenize(message)).spam_probability
+
+
+def test_feedback_is_promoted_as_a_new_version(registry, tmp_path):
+    learner = FeedbackLearner(registry, str(tmp_path / 'feedback.ndjson'), build, batch_size=100)
+    before = spam_probability(registry)
+    for _ in range(20):
+        learner.submit(MESSAGE, 'spam')
+    learner.submit('!!!', 'spam')  # no known tokens
+    with open(learner.path, 'a') as f:
+        f.write('{"message": "no label"}\n')
+    assert not learner.step()  # everything fits in one batch
+    assert registry.current.version == 'base+fb22'
+    assert registry.previous.version == 'base'
+    assert spam_probability(registry) > before
+    assert learner.counts == {'applied': 20, 'no_known_tokens': 1, 'invalid': 1}
+    # The class priors stay as trained
+    assert (registry.current.model.class_log_prior_ == registry.previous.model.class_log_prior_).all()
+
+
+def test_rollback_pins_the_learner(registry, pickles, tmp_path):
+    learner = FeedbackLearner(registry, str(tmp_path / 'feedback.ndjson'), build)
+    learner.submit(MESSAGE, 'spam')
+    learner.step()
+    assert registry.rollback()
+    learner.submit(MESSAGE, 'valid')
+    assert not learner.step()
+    # The rolled-back update is not replayed
+    assert registry.current.version == 'base' and learner.status()['pinned']
+    # A newly loaded model gets the whole journal
+    registry.activate(build('new', *pickles))
+    learner.step()
+    assert registry.current.version == 'new+fb2' and not learner.pinned
+
+
+def test_promotion_is_a_compare_and_swap(registry, pickles, tmp_path):
+    # A reload that lands while a batch is applied wins; the batch is then
+    # applied on top of the new model
+    reloaded = build('reloaded', *pickles)
+
+    def build_during_reload(version, vectorizer, model):
+        if registry.current.version == 'base':
+            registry.activate(reloaded)
+        return build(version, vectorizer, model)
+
+    learner = FeedbackLearner(registry, str(tmp_path / 'feedback.ndjson'), build_during_reload)
+    learner.submit(MESSAGE, 'spam')
+    assert learner.step()
+    assert registry.current is reloaded and learner.counts['applied'] == 0
+    assert not learner.step()
+    assert registry.current.version == 'reloaded+fb1' and registry.previous is reloaded
+
+
+def test_canary_failure_skips_the_batch(registry, tmp_path):
+    learner = FeedbackLearner(registry, str(tmp_path / 'feedback.ndjson'), build, weight=1000)
+    for _ in range(50):
+        learner.submit('Hey, are we still on for lunch tomorrow?', 'spam')
+    learner.step()
+    assert registry.current.version == 'base'
+    assert learner.counts['rejected'] == 50
+    assert 'canary' in learner.last_error
+
+
+def test_submit_validates_labels_and_size(registry, tmp_path):
+    learner = FeedbackLearner(registry, str(tmp_path / 'feedback.ndjson'), build, max_bytes=150)
+    with pytest.raises(ValueError):
+        learner.submit(MESSAGE, 'ham?')
+    assert learner.submit(MESSAGE, 'SPAM') == 'spam'
+    learner.submit(MESSAGE, 'valid')
+    with pytest.raises(JournalFull):
+        learner.submit(MESSAGE, 'valid')
@@ -0,0 +1,37 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+from hashing import hashing_alpha, make_hashing_vectorizer, smooth_idf
+from scoring import ScoringEngine
+
+DOCUMENTS = ['free cash prize call now', 'see you at lunch', 'free entry win cash', 'lunch at noon then call']
+LABELS = ['spam', 'valid', 'spam', 'valid']
+
+
+def test_matches_tfidf_without_collisions():
+    # With many more columns than terms there are no collisions, so the
+    # output is TfidfVectorizer's up to a permutation of the columns
+    hashing = make_hashing_vectorizer(2 ** 20).fit(DOCUMENTS)
+    tfidf = TfidfVectorizer().fit(DOCUMENTS)
+    columns = hashing.transform(tfidf.get_feature_names_out()).indices
+    hashed = hashing.transform(DOCUMENTS).toarray()[:, columns]
+    np.testing.assert_allclose(hashed, tfidf.transform(DOCUMENTS).toarray(), atol=1e-12)
+    np.testing.assert_allclose(np.linalg.norm(hashed, axis=1), 1)
+
+
+def test_smooth_idf():
+    np.testing.assert_allclose(smooth_idf([0, 1, 3], 3), [np.log(4) + 1, np.log(2) + 1, 1])
+
+
+def test_hashing_alpha_and_scoring():
+    vectorizer = make_hashing_vectorizer(2 ** 10)
+    features = vectorizer.fit_transform(DOCUMENTS)
+    used = np.count_nonzero(np.bincount(features.indices, minlength=2 ** 10))
+    assert hashing_alpha(features, alpha=2.0) == 2.0 * used / 2 ** 10
+    model = MultinomialNB(alpha=hashing_alpha(features)).fit(features, LABELS)
+    engine = ScoringEngine(vectorizer, model)
+    result = engine.score_one(['free', 'cash', 'prize'])
+    expected = model.predict_proba(vectorizer.transform(['free cash prize']))[0]
+    assert result.label == 'spam'
+    assert abs(result.spam_probability - expected[list(model.classes_).index('spam')]) < 1e-12
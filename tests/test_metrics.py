@@ -0,0 +1,49 @@
+from metrics import Metrics
+
+
+def test_exposition_format():
+    metrics = Metrics()
+    requests = metrics.counter('requests_total', 'Requests', ['endpoint', 'status'])
+    size = metrics.gauge('cache_size', 'Entries', func=lambda: 7)
+    latency = metrics.histogram('latency_seconds', 'Latency', ['stage'], buckets=(0.1, 1.0))
+    metrics.inc(requests, '/predict', 200)
+    metrics.inc(requests, '/predict', 200, amount=2)
+    metrics.inc(requests, 'say "hi"\n', 500)
+    metrics.observe(latency, 0.05, 'model')
+    metrics.observe(latency, 0.5, 'model')
+    metrics.observe(latency, 5, 'model')
+    assert size.samples() == [('cache_size', (), (), 7)]
+    assert metrics.render() == '\n'.join([
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="/predict",status="200"} 3',
+        'requests_total{endpoint="say \\"hi\\"\\n",status="500"} 1',
+        '# HELP cache_size Entries',
+        '# TYPE cache_size gauge',
+        'cache_size 7',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{stage="model",le="0.1"} 1',
+        'latency_seconds_bucket{stage="model",le="1.0"} 2',
+        'latency_seconds_bucket{stage="model",le="+Inf"} 3',
+        'latency_seconds_sum{stage="model"} 5.55',
+        'latency_seconds_count{stage="model"} 3',
+    ]) + '\n'
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    requests = metrics.counter('requests_total', 'Requests')
+    latency = metrics.histogram('latency_seconds', 'Latency')
+    metrics.inc(requests)
+    metrics.observe(latency, 0.1)
+    with metrics.timer(latency):
+        pass
+    assert requests.samples() == [] and latency.samples() == []
+
+
+def test_metrics_endpoint(client):
+    client.post('/predict', json={'message': 'free cash prize'})
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    assert 'spam_requests_total{endpoint="predict",status="200"}' in response.get_data(as_text=True)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from parallel import ProcessPoolScorer
+
+
+class SlowEngine:
+    # Scores each token list as its length, slowly enough to close the pool
+    # while a batch is in flight
+    def __init__(self, delay):
+        self.delay = delay
+
+    def score(self, token_lists):
+        time.sleep(self.delay)
+        return [len(tokens) for tokens in token_lists]
+
+    def score_one(self, tokens):
+        return len(tokens)
+
+
+def test_small_batches_stay_in_process():
+    scorer = ProcessPoolScorer(SlowEngine(0), workers=2, min_batch_size=10)
+    assert scorer.score([['a'], ['b', 'c']]) == [1, 2]
+    assert scorer._pool is None
+
+
+def test_large_batches_keep_order():
+    scorer = ProcessPoolScorer(SlowEngine(0), workers=2, min_batch_size=1)
+    try:
+        token_lists = [['x'] * n for n in range(50)]
+        assert scorer.score(token_lists) == list(range(50))
+    finally:
+        scorer.close()
+    assert scorer._pool is None
+
+
+def test_close_waits_for_batches_in_flight():
+    scorer = ProcessPoolScorer(SlowEngine(0.5), workers=2, min_batch_size=1)
+    scorer.score([['warm'], ['up']])  # start the pool
+    results = []
+    thread = threading.Thread(target=lambda: results.append(scorer.score([['a'], ['b', 'c'], ['d'], []])))
+    thread.start()
+    time.sleep(0.1)
+    scorer.close()  # as a model swap does
+    thread.join(5)
+    assert not thread.is_alive()
+    assert results == [[1, 2, 1, 0]]
+    assert scorer._pool is None
+
+
+def test_pool_restarts_after_close():
+    # A rollback scores with a closed engine again
+    scorer = ProcessPoolScorer(SlowEngine(0), workers=2, min_batch_size=1)
+    try:
+        scorer.score([['a'], ['b']])
+        scorer.close()
+        assert scorer.score([['a'], ['b', 'c']]) == [1, 2]
+    finally:
+        scorer.close()
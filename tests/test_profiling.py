@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from profiling import MAX_REQUESTS, Profiler
+
+
+@pytest.mark.parametrize('seconds, interval', [
+    ('10', 0.005), (-1, 0.005), (0, 0.005), (float('nan'), 0.005), (True, 0.005), (1, '5'), (1, None), (1, -0.1),
+])
+def test_sampling_rejects_bad_arguments(tmp_path, seconds, interval):
+    profiler = Profiler(str(tmp_path))
+    with pytest.raises(ValueError):
+        profiler.start_sampling(seconds, interval)
+    assert profiler.sampling is None
+
+
+def test_sampling_writes_collapsed_stacks(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    name = profiler.start_sampling(0.05, 0.001, match='')
+    deadline = time.time() + 5
+    while profiler.result_path(name) is None and time.time() < deadline:
+        time.sleep(0.01)
+    with open(profiler.result_path(name)) as f:
+        assert all(line.rsplit(' ', 1)[1].strip().isdigit() for line in f)
+
+
+def test_request_count_is_validated_and_clamped(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    for count in ('5', 0, 2.5, None):
+        with pytest.raises(ValueError):
+            profiler.profile_requests(count)
+    profiler.profile_requests(10 ** 9)
+    assert profiler.remaining == MAX_REQUESTS
@@ -0,0 +1,158 @@
+import copy
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from registry import (COMPILED_MODEL_FILE, ModelRegistry, ModelVersion, files_signature, load_engine,
+                      model_version)
+from preprocessing import tokenize
+from scoring import CompiledScorer
+
+PICKLES = ['nb_model.pkl', 'tfidf_vectorizer.pkl']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stub_version(name):
+    return ModelVersion(name, 'test', None, lambda tokens: [])
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for name in PICKLES:
+        shutil.copy(os.path.join(ROOT, name), tmp_path / name)
+    return str(tmp_path)
+
+
+def test_activate_and_rollback():
+    registry = ModelRegistry(stub_version, canary=[])
+    assert registry.activate(stub_version('a'))
+    assert not registry.activate(stub_version('a'))  # already active
+    assert registry.activate(stub_version('b'))
+    assert registry.current.version == 'b' and registry.previous.version == 'a'
+    assert registry.rollback()
+    assert registry.current.version == 'a' and registry.previous.version == 'b'
+
+
+def test_request_keeps_the_version_it_read():
+    registry = ModelRegistry(stub_version, canary=[])
+    registry.activate(stub_version('a'))
+    current = registry.current
+    registry.activate(stub_version('b'))
+    assert current.version == 'a' and registry.current.version == 'b'
+
+
+def test_failed_reload_keeps_the_active_model():
+    def loader(source):
+        raise FileNotFoundError(source)
+
+    registry = ModelRegistry(loader, canary=[])
+    registry.activate(stub_version('a'))
+    assert not registry.reload('missing', background=False)
+    assert registry.current.version == 'a'
+    assert 'FileNotFoundError' in registry.last_error
+
+
+def test_canary_failure_blocks_activation(model_dir):
+    def loader(directory):
+        engine, _, _ = load_engine('compiled', directory)
+        return ModelVersion('new', directory, engine, lambda tokens: [])
+
+    registry = ModelRegistry(loader, canary=[('Free prize! Call now to claim', 'valid')])
+    registry.activate(stub_version('a'))
+    assert not registry.reload(model_dir, background=False)
+    assert registry.current.version == 'a'
+    assert 'canary' in registry.last_error
+
+
+def test_stale_compiled_table_is_ignored(model_dir, pickles):
+    vectorizer, model = pickles
+    table = CompiledScorer.from_sklearn(vectorizer, model)
+    assert table.matches(vectorizer, model)
+    stale = CompiledScorer(table.terms, table.idf, table.log_prob * 1.01, table.class_log_prior, table.classes)
+    assert not stale.matches(vectorizer, model)
+    stale.export(os.path.join(model_dir, COMPILED_MODEL_FILE))
+    engine, _, _ = load_engine('compiled', model_dir)
+    assert np.array_equal(engine.log_prob, table.log_prob)
+
+
+def test_compiled_table_counts_towards_the_version(model_dir, pickles):
+    vectorizer, model = pickles
+    optional = [COMPILED_MODEL_FILE]
+    without = model_version(model_dir, PICKLES, optional)
+    assert without == model_version(model_dir, PICKLES)
+    CompiledScorer.from_sklearn(vectorizer, model).export(os.path.join(model_dir, COMPILED_MODEL_FILE))
+    assert model_version(model_dir, PICKLES, optional) != without
+    assert len(files_signature(model_dir, PICKLES, optional)) == 3
+
+
+def watch_for(registry, model_dir, condition):
+    registry.watch(model_dir, PICKLES, 0.02)
+    time.sleep(0.1)
+    with open(os.path.join(model_dir, 'nb_model.pkl'), 'ab') as f:
+        f.write(b'\0')  # a new model
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+
+
+def test_watcher_skips_a_rejected_model_until_it_changes(model_dir):
+    attempts = []
+
+    def loader(directory):
+        attempts.append(directory)
+        if len(attempts) == 1:
+            raise ValueError('failed the canary check')
+        return stub_version(model_version(directory, PICKLES))
+
+    registry = ModelRegistry(loader, canary=[])
+    registry.activate(stub_version('old'))
+    watch_for(registry, model_dir, lambda: attempts)
+    time.sleep(0.2)
+    assert len(attempts) == 1 and registry.current.version == 'old'
+    with open(os.path.join(model_dir, 'nb_model.pkl'), 'ab') as f:
+        f.write(b'\0')  # fixed
+    deadline = time.time() + 5
+    while registry.current.version == 'old' and time.time() < deadline:
+        time.sleep(0.02)
+    assert len(attempts) == 2
+    assert registry.current.version == model_version(model_dir, PICKLES)
+
+
+def test_watcher_retries_after_an_os_error(model_dir):
+    attempts = []
+
+    def loader(directory):
+        attempts.append(directory)
+        if len(attempts) < 3:
+            raise FileNotFoundError('replaced while reading')
+        return stub_version(model_version(directory, PICKLES))
+
+    registry = ModelRegistry(loader, canary=[])
+    registry.activate(stub_version('old'))
+    watch_for(registry, model_dir, lambda: registry.current.version != 'old')
+    assert len(attempts) == 3
+    assert registry.current.version == model_version(model_dir, PICKLES)
+
+
+def test_swap_with_request_in_flight(client, app_module):
+    # A request that read the registry before a swap finishes on that model;
+    # the next one gets the new model
+    registry = app_module.registry
+    old = registry.current
+    shadow = copy.deepcopy(old.model)
+    shadow.feature_log_prob_ = shadow.feature_log_prob_[::-1].copy()  # swap the classes' words
+    new = app_module.build_feedback_model(f'{old.version}+test', old.vectorizer, shadow)
+    message = 'WINNER!! Claim your free prize now, call 09061701461'
+    try:
+        registry.activate(new)
+        in_flight, = app_module.score_token_lists(old, [tokenize(message)])
+        assert in_flight['prediction'] == 'spam'
+        data = client.post('/predict', json={'message': message}).get_json()
+        assert data['model_version'] == new.version and data['prediction'] == 'valid'
+    finally:
+        registry.rollback()
+    assert registry.current is old
+    assert client.post('/predict', json={'message': message}).get_json()['prediction'] == 'spam'
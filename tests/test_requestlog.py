@@ -0,0 +1,78 @@
+import glob
+import os
+import queue
+import time
+
+import pytest
+
+from requestlog import RequestLogger, read_request_log
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def log_and_rotate(logger, count):
+    # One record per file: every write reaches max_bytes and rotates
+    for i in range(count):
+        logger.log({'i': i})
+        wait_for(lambda: logger.rotations == i + 1)
+
+
+def rotated_files(path):
+    return glob.glob(glob.escape(path) + '.*')
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_rotation_keeps_the_newest_backups(tmp_path, compress):
+    logger = RequestLogger(str(tmp_path / 'requests-{pid}.jsonl'), flush_interval=0.01, max_bytes=1, backups=3,
+                           compress=compress)
+    log_and_rotate(logger, 8)
+    logger.close()
+    files = sorted(rotated_files(logger.path), key=os.path.getmtime)
+    assert len(files) == 3
+    assert all(name.endswith('.gz') for name in files) == compress
+    assert [record['i'] for record in read_request_log(files)] == [5, 6, 7]
+    assert logger.dropped == 0 and logger.last_error is None
+
+
+def test_zero_backups_keeps_every_rotated_file(tmp_path):
+    logger = RequestLogger(str(tmp_path / 'requests-{pid}.jsonl'), flush_interval=0.01, max_bytes=1, backups=0)
+    log_and_rotate(logger, 10)
+    logger.close()
+    files = sorted(rotated_files(logger.path), key=os.path.getmtime)
+    assert len(files) == 10
+    assert [record['i'] for record in read_request_log(files)] == list(range(10))
+
+
+def test_pid_in_path_and_close_writes_queued_records(tmp_path):
+    logger = RequestLogger(str(tmp_path / 'requests-{pid}.jsonl'), flush_interval=60)
+    for i in range(3):
+        logger.log({'i': i})
+    logger.close()
+    wait_for(lambda: logger.written == 3)
+    path = str(tmp_path / f'requests-{os.getpid()}.jsonl')
+    assert [record['i'] for record in read_request_log([path])] == [0, 1, 2]
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        RequestLogger('requests-{pid}.jsonl', policy='wait')
+    # Workers sharing one file would lose appends when one of them rotates it
+    with pytest.raises(ValueError):
+        RequestLogger('requests.jsonl')
+    RequestLogger('requests.jsonl', max_bytes=0)
+
+
+def test_non_blocking_log_drops_when_full():
+    logger = RequestLogger('requests-{pid}.jsonl', policy='block', block_timeout=60)
+    # A full queue with no writer thread behind it
+    logger.queue = queue.Queue(1)
+    logger.queue.put({'i': 0})
+    logger._pid = os.getpid()
+    start = time.time()
+    logger.log({'i': 1}, block=False)
+    assert time.time() - start < 1 and logger.dropped == 1
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from artifacts import export_artifacts, load_artifacts
+from preprocessing import preprocess_text, tokenize
+from scoring import CompiledScorer, ScoringEngine
+
+
+@pytest.fixture(scope='module')
+def reference(pickles, messages):
+    # What the pickled pipeline says: labels and spam probabilities
+    vectorizer, model = pickles
+    vectors = vectorizer.transform([preprocess_text(message) for message in messages])
+    spam = list(model.classes_).index('spam')
+    return model.predict(vectors).tolist(), model.predict_proba(vectors)[:, spam]
+
+
+@pytest.fixture(scope='module')
+def token_lists(messages):
+    return [tokenize(message) for message in messages]
+
+
+def check(scores, reference, atol):
+    labels, probabilities = reference
+    assert [str(score.label) for score in scores] == labels
+    np.testing.assert_allclose([score.spam_probability for score in scores], probabilities, rtol=0, atol=atol)
+
+
+def test_preprocess_text_joins_tokens(messages):
+    for message in messages[:200]:
+        assert preprocess_text(message) == ' '.join(tokenize(message))
+
+
+def test_scoring_engine_matches_predict_proba(pickles, token_lists, reference):
+    engine = ScoringEngine(*pickles)
+    check(engine.score(token_lists), reference, 1e-12)
+    assert engine.score_one(token_lists[0]) == engine.score(token_lists[:1])[0]
+
+
+def test_compiled_scorer_matches_predict_proba(pickles, token_lists, reference, tmp_path):
+    scorer = CompiledScorer.from_sklearn(*pickles)
+    check(scorer.score(token_lists), reference, 1e-9)
+    # Exported and loaded back, as from compiled_model.npz
+    scorer.export(tmp_path / 'compiled_model.npz')
+    check(CompiledScorer.load(tmp_path / 'compiled_model.npz').score(token_lists), reference, 1e-9)
+
+
+@pytest.mark.parametrize('precision, atol', [('float64', 1e-9), ('float32', 1e-5)])
+def test_mapped_scorer_matches_predict_proba(pickles, token_lists, reference, tmp_path, precision, atol):
+    export_artifacts(*pickles, str(tmp_path), precision=precision)
+    scorer = load_artifacts(str(tmp_path))
+    check(scorer.score(token_lists), reference, atol)
+    assert [score.label for score in map(scorer.score_one, token_lists[:50])] == \
+        [score.label for score in scorer.score(token_lists[:50])]
+
+
+@pytest.mark.parametrize('precision', ['float16', 'int8'])
+def test_quantized_artifacts_stay_close(pickles, token_lists, reference, tmp_path, precision):
+    export_artifacts(*pickles, str(tmp_path), precision=precision)
+    scores = load_artifacts(str(tmp_path)).score(token_lists)
+    labels, probabilities = reference
+    agreement = np.mean([str(score.label) == label for score, label in zip(scores, labels)])
+    drift = np.max(np.abs([score.spam_probability for score in scores] - probabilities))
+    assert agreement >= 0.99
+    assert drift < 0.01
+
+
+def test_mixed_artifact_sets_are_refused(pickles, tmp_path):
+    # An export caught halfway: new arrays next to the previous meta.json
+    vectorizer, model = pickles
+    export_artifacts(vectorizer, model, str(tmp_path))
+    with open(tmp_path / 'meta.json') as f:
+        meta = f.read()
+    export_artifacts(vectorizer, model, str(tmp_path), precision='int8')
+    (tmp_path / 'meta.json').write_text(meta)
+    with pytest.raises(ValueError):
+        load_artifacts(str(tmp_path))
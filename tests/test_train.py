@@ -0,0 +1,69 @@
+import json
+import os
+import pickle
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+import train
+from preprocessing import preprocess_text
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory, pickles, messages):
+    # Generated messages labelled by the shipped model
+    vectorizer, model = pickles
+    texts = [message for message in messages[:600] if '\t' not in message and '\n' not in message]
+    labels = model.predict(vectorizer.transform([preprocess_text(text) for text in texts]))
+    path = tmp_path_factory.mktemp('data') / 'SMSSpamCollection'
+    path.write_text(''.join(f"{'ham' if label == 'valid' else label}\t{text}\n" for text, label in zip(texts, labels)))
+    return str(path)
+
+
+def run(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, 'argv', ['train.py', *argv])
+    assert train.main() == 0
+    return json.loads(capsys.readouterr().out)
+
+
+def load(directory):
+    with open(os.path.join(directory, 'tfidf_vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+    with open(os.path.join(directory, 'nb_model.pkl'), 'rb') as f:
+        return vectorizer, pickle.load(f)
+
+
+def test_matches_fitting_on_the_whole_corpus(corpus, tmp_path, monkeypatch, capsys):
+    metadata = run(monkeypatch, capsys, corpus, str(tmp_path / 'model'), '--chunk-size', '64')
+    vectorizer, model = load(tmp_path / 'model')
+    pairs = [(message, label) for message, label in train.read_labeled_messages(corpus)
+             if not train.is_held_out(message, 0, 0.2)]
+    texts = [preprocess_text(message) for message, _ in pairs]
+    reference = TfidfVectorizer().fit(texts)
+    reference_model = MultinomialNB().fit(reference.transform(texts), [label for _, label in pairs])
+    assert vectorizer.vocabulary_ == reference.vocabulary_
+    np.testing.assert_allclose(vectorizer.idf_, reference.idf_)
+    np.testing.assert_allclose(model.predict_proba(vectorizer.transform(texts)),
+                               reference_model.predict_proba(reference.transform(texts)), atol=1e-9)
+    assert metadata['train_messages'] == len(pairs)
+    assert metadata['test_messages'] > 0 and 'mapped' in metadata['evaluation']
+    with open(tmp_path / 'model' / 'model_artifacts' / 'meta.json') as f:
+        assert json.load(f)['training']['model_version'] == metadata['model_version']
+
+
+def test_builds_are_reproducible(corpus, tmp_path, monkeypatch, capsys):
+    first = run(monkeypatch, capsys, corpus, str(tmp_path / 'a'), '--hashing', '--n-features', '10')
+    second = run(monkeypatch, capsys, corpus, str(tmp_path / 'b'), '--hashing', '--n-features', '10')
+    assert first['model_version'] == second['model_version']
+    assert first['vectorizer'] == 'hashing' and first['n_features'] == 2 ** 10
+
+
+def test_select_vocabulary():
+    document_frequency = Counter({'a': 5, 'b': 3, 'c': 3, 'd': 1})
+    term_frequency = Counter({'a': 9, 'b': 4, 'c': 4, 'd': 1})
+    assert train.select_vocabulary(document_frequency, term_frequency, 5, 2, 1.0, None) == {'a': 0, 'b': 1, 'c': 2}
+    assert train.select_vocabulary(document_frequency, term_frequency, 5, 1, 4, 2) == {'b': 0, 'c': 1}
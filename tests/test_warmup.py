@@ -0,0 +1,33 @@
+import json
+
+from warmup import Warmup, model_arrays
+
+
+def test_warmup_runs_once(app_module):
+    version = app_module.registry.current
+    assert model_arrays(version)
+    calls = []
+    warmup = Warmup(['free cash prize', 'see you at lunch'], rounds=2)
+    assert warmup.state == 'pending' and not warmup.ready
+    warmup.run(version, lambda: calls.append(1))
+    warmup.run(version, lambda: calls.append(1))
+    assert warmup.ready and calls == [1]
+    status = warmup.status()
+    assert status['state'] == 'done' and status['version'] == version.version and status['messages'] == 2
+
+
+def test_disabled_and_failed_warmup(app_module):
+    assert Warmup(rounds=0).ready
+    warmup = Warmup(['free cash prize'])
+    warmup.run(app_module.registry.current, lambda: 1 / 0)
+    assert warmup.state == 'failed' and not warmup.ready
+    assert warmup.status()['error'].startswith('ZeroDivisionError')
+
+
+def test_health_endpoints(client, app_module):
+    health = client.get('/healthz')
+    assert health.status_code == 200 and health.get_json()['model_loaded']
+    app_module.warm_up()
+    ready = client.get('/readyz')
+    assert ready.status_code == 200
+    assert json.loads(ready.data)['warmup']['state'] in ('done', 'disabled')
@@ -0,0 +1,275 @@
+"""Train the spam model from a labelled corpus and write serving artifacts.
+
+    python train.py SMSSpamCollection build/model [--max-features 5000] [--ngram-range 1 2]
+
+Reads labelled messages with dataset.read_labeled_messages, preprocesses them
+with the same preprocess_text the app uses, and fits the vectorizer and
+MultinomialNB out of core, so the corpus never has to fit in memory:
+
+1. one streaming pass counts document frequencies, which give the vocabulary
+   (min_df, max_df and max_features applied as TfidfVectorizer applies them)
+   and the IDF weights;
+2. a second pass transforms the messages chunk by chunk with the fixed
+   vocabulary and feeds each chunk to MultinomialNB.partial_fit.
+
+The result is the same model TfidfVectorizer().fit plus MultinomialNB().fit
+give on the whole corpus. With --hashing, the vocabulary is replaced by a
+HashingTfidfVectorizer of 2**--n-features columns.
+
+A message goes to the held-out set when a seeded hash of its text falls below
+--test-fraction, so the split does not depend on file order or chunking and
+the same input and options (--chunk-size included, as it sets the order of
+the floating-point sums) rebuild a byte-identical model with the same
+version. Duplicates land on the same side of the split.
+
+The output directory gets:
+
+- nb_model.pkl and tfidf_vectorizer.pkl, loadable with MODEL_DIR;
+- model_artifacts/, the memory-mapped artifacts for SCORING_MODE=mapped
+  (vocabulary models with unigrams only), at --precision (float16 or int8
+  quantize them, and the evaluation then includes their agreement with the
+  float64 model);
+- training.json, also merged into model_artifacts/meta.json: the model
+  version (the same content hash the app reports), vocabulary size, options,
+  and the held-out accuracy and scoring latency measured at build time.
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+from artifacts import PRECISIONS, export_artifacts, load_artifacts
+from dataset import read_labeled_messages
+from hashing import make_hashing_vectorizer, smooth_idf
+from preprocessing import preprocess_text, tokenize
+from registry import model_version
+from scoring import ScoringEngine
+
+CLASSES = ['spam', 'valid']
+PICKLES = ('nb_model.pkl', 'tfidf_vectorizer.pkl')
+
+
+def is_held_out(message, seed, test_fraction):
+    return zlib.crc32(f"{seed}\0{message}".encode()) < test_fraction * 2 ** 32
+
+
+def chunks(pairs, size):
+    chunk = []
+    for pair in pairs:
+        chunk.append(pair)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def training_chunks(args):
+    # Preprocessed (texts, labels) chunks of the training split
+    pairs = ((message, label) for message, label in read_labeled_messages(args.data)
+             if not is_held_out(message, args.seed, args.test_fraction))
+    for chunk in chunks(pairs, args.chunk_size):
+        yield [preprocess_text(message) for message, _ in chunk], [label for _, label in chunk]
+
+
+def held_out(args):
+    # The first --max-eval held-out messages, kept raw for evaluation
+    pairs = []
+    for message, label in read_labeled_messages(args.data):
+        if is_held_out(message, args.seed, args.test_fraction):
+            pairs.append((message, label))
+            if len(pairs) == args.max_eval:
+                break
+    return pairs
+
+
+def select_vocabulary(document_frequency, term_frequency, n_documents, min_df, max_df, max_features):
+    # TfidfVectorizer's rules: df bounds first (ints are counts, floats are
+    # fractions), then the max_features most frequent terms. Frequency ties
+    # are broken alphabetically so the vocabulary is reproducible.
+    low = min_df if isinstance(min_df, int) else min_df * n_documents
+    high = max_df if isinstance(max_df, int) else max_df * n_documents
+    terms = [term for term, df in document_frequency.items() if low <= df <= high]
+    if max_features is not None and len(terms) > max_features:
+        terms = sorted(terms, key=lambda term: (-term_frequency[term], term))[:max_features]
+    return {term: column for column, term in enumerate(sorted(terms))}
+
+
+def fit_vocabulary_vectorizer(args):
+    vectorizer = TfidfVectorizer(ngram_range=tuple(args.ngram_range))
+    analyze = vectorizer.build_analyzer()
+    document_frequency = Counter()
+    term_frequency = Counter()
+    n_documents = 0
+    for texts, _ in training_chunks(args):
+        for text in texts:
+            terms = analyze(text)
+            term_frequency.update(terms)
+            document_frequency.update(set(terms))
+        n_documents += len(texts)
+    if not n_documents:
+        raise ValueError(f"No labelled training messages in {args.data}")
+    vocabulary = select_vocabulary(document_frequency, term_frequency, n_documents,
+                                   args.min_df, args.max_df, args.max_features)
+    if not vocabulary:
+        raise ValueError('No terms left after applying min_df, max_df and max_features')
+    # Fitting on the vocabulary itself sets it up as fixed; the IDF from the
+    # streamed counts then replaces the one computed from that dummy text
+    vectorizer.set_params(vocabulary=vocabulary)
+    vectorizer.fit([' '.join(vocabulary)])
+    # ...and clearing the parameter afterwards leaves it pickled once, as a
+    # learned vocabulary_ like TfidfVectorizer.fit produces
+    vectorizer.set_params(vocabulary=None)
+    vectorizer.fixed_vocabulary_ = False
+    df = np.zeros(len(vocabulary))
+    for term, column in vocabulary.items():
+        df[column] = document_frequency[term]
+    vectorizer.idf_ = smooth_idf(df, n_documents)
+    return vectorizer, n_documents, args.alpha, len(vocabulary)
+
+
+def fit_hashing_vectorizer(args):
+    vectorizer = make_hashing_vectorizer(2 ** args.n_features)
+    df = np.zeros(vectorizer.n_features, dtype=np.int64)
+    n_documents = 0
+    for texts, _ in training_chunks(args):
+        df += np.bincount(vectorizer.count(texts).indices, minlength=vectorizer.n_features)
+        n_documents += len(texts)
+    if not n_documents:
+        raise ValueError(f"No labelled training messages in {args.data}")
+    vectorizer.idf_ = smooth_idf(df, n_documents)
+    # Same smoothing mass as alpha over a fitted vocabulary (see hashing_alpha)
+    used = int(np.count_nonzero(df))
+    return vectorizer, n_documents, args.alpha * used / len(df), used
+
+
+def fit_model(vectorizer, alpha, args):
+    model = MultinomialNB(alpha=alpha)
+    for texts, labels in training_chunks(args):
+        model.partial_fit(vectorizer.transform(texts), labels, classes=CLASSES)
+    return model
+
+
+def evaluate(engine, test):
+    token_lists = [tokenize(message) for message, _ in test]
+    truth = [label for _, label in test]
+    predicted = [str(score.label) for score in engine.score(token_lists)]
+    true_spam = sum(p == t == 'spam' for p, t in zip(predicted, truth))
+    predicted_spam = predicted.count('spam')
+    actual_spam = truth.count('spam')
+    timings = []
+    for tokens in token_lists[:2000]:
+        start = time.perf_counter()
+        engine.score_one(tokens)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'accuracy': round(sum(p == t for p, t in zip(predicted, truth)) / len(test), 4),
+        'spam_precision': round(true_spam / predicted_spam if predicted_spam else 0.0, 4),
+        'spam_recall': round(true_spam / actual_spam if actual_spam else 0.0, 4),
+        'p50_us': round(timings[len(timings) // 2] * 1e6, 1),
+        'p99_us': round(timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1e6, 1),
+    }
+
+
+def agreement(engine, reference, test):
+    # Fraction of held-out messages given the same label by both engines
+    token_lists = [tokenize(message) for message, _ in test]
+    pairs = zip(engine.score(token_lists), reference.score(token_lists))
+    return round(sum(str(a.label) == str(b.label) for a, b in pairs) / len(token_lists), 6)
+
+
+def write_pickle(obj, path):
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data', help='labelled messages (SMS Spam Collection TSV or label/message CSV)')
+    parser.add_argument('directory', help='output model directory')
+    parser.add_argument('--max-features', type=int, help='keep only the N most frequent terms')
+    parser.add_argument('--ngram-range', type=int, nargs=2, default=[1, 1], metavar=('MIN', 'MAX'))
+    parser.add_argument('--min-df', type=lambda v: float(v) if '.' in v else int(v), default=1,
+                        help='minimum document frequency (count, or fraction with a decimal point)')
+    parser.add_argument('--max-df', type=lambda v: float(v) if '.' in v else int(v), default=1.0,
+                        help='maximum document frequency (count, or fraction with a decimal point)')
+    parser.add_argument('--alpha', type=float, default=1.0, help='MultinomialNB smoothing')
+    parser.add_argument('--hashing', action='store_true', help='use a HashingTfidfVectorizer instead of a vocabulary')
+    parser.add_argument('--n-features', type=int, default=14, help='hashing columns as a power of two')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--max-eval', type=int, default=20000, help='held-out messages to evaluate on')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--precision', choices=PRECISIONS, default='float64', help='model_artifacts array precision')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.hashing:
+        vectorizer, n_train, alpha, vocabulary_size = fit_hashing_vectorizer(args)
+    else:
+        vectorizer, n_train, alpha, vocabulary_size = fit_vocabulary_vectorizer(args)
+    model = fit_model(vectorizer, alpha, args)
+    train_seconds = time.perf_counter() - start
+    print(f"Trained on {n_train:,} messages in {train_seconds:.1f}s", file=sys.stderr)
+
+    os.makedirs(args.directory, exist_ok=True)
+    write_pickle(model, os.path.join(args.directory, 'nb_model.pkl'))
+    # sklearn caches id(stop_words) on the vectorizer; a memory address that
+    # would make every build's pickle differ
+    vars(vectorizer).pop('_stop_words_id', None)
+    write_pickle(vectorizer, os.path.join(args.directory, 'tfidf_vectorizer.pkl'))
+
+    metadata = {
+        'model_version': model_version(args.directory, PICKLES),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'data': os.path.basename(args.data),
+        'sklearn_version': sklearn.__version__,
+        'vectorizer': 'hashing' if args.hashing else 'vocabulary',
+        'vocabulary_size': vocabulary_size,
+        'n_features': len(vectorizer.idf_),
+        'params': {name: getattr(args, name) for name in
+                   ('max_features', 'ngram_range', 'min_df', 'max_df', 'hashing', 'n_features', 'test_fraction', 'seed',
+                    'precision')},
+        'alpha': model.alpha,
+        'train_messages': n_train,
+        'class_counts': dict(zip(map(str, model.classes_), model.class_count_.astype(int).tolist())),
+        'train_seconds': round(train_seconds, 3),
+    }
+    test = held_out(args)
+    metadata['test_messages'] = len(test)
+    engines = {'sklearn': ScoringEngine(vectorizer, model)}
+    artifact_dir = os.path.join(args.directory, 'model_artifacts')
+    try:
+        # Written without evaluation results first, so they can be measured
+        # on the mapped engine itself; meta.json is rewritten below
+        export_artifacts(vectorizer, model, artifact_dir, precision=args.precision)
+        engines['mapped'] = load_artifacts(artifact_dir)
+    except ValueError as e:
+        print(f"Skipping model_artifacts: {e}", file=sys.stderr)
+        artifact_dir = None
+    if test:
+        metadata['evaluation'] = {name: evaluate(engine, test) for name, engine in engines.items()}
+        if 'mapped' in engines and args.precision != 'float64':
+            metadata['evaluation']['mapped']['agreement'] = agreement(engines['mapped'], engines['sklearn'], test)
+    if artifact_dir:
+        export_artifacts(vectorizer, model, artifact_dir, metadata={'training': metadata}, precision=args.precision)
+
+    with open(os.path.join(args.directory, 'training.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(json.dumps(metadata, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
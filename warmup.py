@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from preprocessing import tokenize
+from registry import CANARY_MESSAGES
+
+# Worker warmup.
+#
+# A freshly started or forked worker is slow on its first requests: pages of
+# the model arrays have not been faulted in yet (memory-mapped artifacts
+# especially), NumPy, SciPy and sklearn code paths and their caches are
+# touched for the first time, and Flask builds its routing on the first
+# request. Warmup pays those costs before the worker takes traffic: it reads
+# every page of the model's arrays, then scores a sample set one message at a
+# time and as one batch, `rounds` times over.
+#
+# The state is per process and starts over in a forked child, so a worker
+# forked from a preloaded master is not ready until it has warmed itself.
+
+# Sample messages beyond the canary set: non-ASCII text, no known tokens,
+# and a long message
+SAMPLE_MESSAGES = [message for message, _ in CANARY_MESSAGES] + [
+    "Félicitations ! Vous avez gagné un iPhone, répondez OUI au 36111 ✨",
+    "?? !! 123 :-)",
+    "ok",
+    " ".join(["Call now to claim your free prize, reply STOP to opt out of these offers."] * 20),
+]
+
+
+def load_samples(path):
+    # NDJSON file of {"message": ...} objects, like MODEL_CANARY_PATH
+    with open(path) as f:
+        return [item['message'] for item in map(json.loads, f) if item]
+
+
+def model_arrays(version):
+    # The numeric arrays a model version scores with
+    engine = getattr(version.engine, 'engine', version.engine)  # unwrap ProcessPoolScorer
+    arrays = [getattr(version.vectorizer, 'idf_', None)]
+    for owner in (version.model, engine):
+        if owner is not None:
+            arrays.extend(vars(owner).values())
+    return [array for array in arrays if isinstance(array, np.ndarray) and array.dtype.kind in 'biuf']
+
+
+class Warmup:
+    def __init__(self, messages=SAMPLE_MESSAGES, rounds=3):
+        # rounds=0 disables warmup; the worker is then ready as soon as a
+        # model is loaded
+        self.messages = list(messages)
+        self.rounds = rounds
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.state = 'pending' if self.rounds else 'disabled'
+        self.version = None
+        self.seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state in ('done', 'disabled')
+
+    def warm(self, version):
+        # Warm one model version up; returns the seconds it took
+        start = time.perf_counter()
+        for array in model_arrays(version):
+            array.sum()  # reads every page
+        token_lists = [tokenize(message) for message in self.messages]
+        for _ in range(self.rounds):
+            for tokens in token_lists:
+                version.engine.score_one(tokens)
+                version.find_indicators(tokens)
+            version.engine.score(token_lists)
+        return time.perf_counter() - start
+
+    def run(self, version, extra=None):
+        # Warm the active model up in this process, once. extra() warms the
+        # rest of the request path.
+        with self._lock:
+            if self.state != 'pending' or version is None:
+                return
+            self.state = 'running'
+        try:
+            start = time.perf_counter()
+            self.warm(version)
+            if extra is not None:
+                extra()
+            self.seconds = time.perf_counter() - start
+            self.version = version.version
+            self.state = 'done'
+            print(f"Warmed up model {version.version} in {self.seconds * 1000:.0f}ms (pid {os.getpid()})")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = 'failed'
+            print(f"Warmup failed: {self.error}")
+            traceback.print_exc()
+
+    def start(self, version, extra=None):
+        # Run in the background, for servers that have no startup hook
+        if self.state == 'pending' and version is not None:
+            threading.Thread(target=self.run, args=(version, extra), name='warmup', daemon=True).start()
+
+    def status(self):
+        return {
+            'state': self.state,
+            'version': self.version,
+            'seconds': round(self.seconds, 4) if self.seconds is not None else None,
+            'rounds': self.rounds,
+            'messages': len(self.messages),
+            'error': self.error,
+        }